@@ -1,71 +1,130 @@
 import psutil
 import threading
 import time
-from collections import deque
 import socket
 import json
 import os
+from datetime import datetime
+from sampler import resource_sampler, MAX_BACKOFF
+from timeseries import TieredHistory, covered_seconds, parse_duration, summarize
+from metrics_store import MetricsStore
+from process_table import process_table
+from disk_latency import DiskLatencyMonitor
+from gpu import GPU_HISTORY_COLUMNS, gpu_history_row
+import alerts
+from cgroups import CgroupMonitor
+from rates import round_rates
+from instrumentation import self_stats
+from port_scanner import PortScanner, ScanHostError, ScanLimitError, LOCAL_HOSTS, DEFAULT_PORTS, DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT
 
 class AdvancedMonitoring:
     def __init__(self):
-        self.resource_history = {
-            'cpu': deque(maxlen=100),
-            'memory': deque(maxlen=100),
-            'disk': deque(maxlen=100),
-            'network': deque(maxlen=100)
-        }
-        self.monitoring_thread = None
+        self.resource_history = TieredHistory(raw_resolution=resource_sampler.interval)
+        self.metrics_store = MetricsStore()
+        # Per-GPU history, created as devices show up in snapshots
+        self.gpu_history = {}
+        self.gpu_stores = {}
+        self.process_table = process_table
+        self.disk_latency = DiskLatencyMonitor()
+        self.alerts = alerts.alert_engine
+        self.cgroups = CgroupMonitor()
+        self._last_compaction_hour = None
+        self.sampler = resource_sampler
+        self.port_scanner = PortScanner()
         self.is_monitoring = False
 
     def start_resource_monitoring(self):
         if not self.is_monitoring:
             self.is_monitoring = True
-            self.monitoring_thread = threading.Thread(target=self._monitor_resources)
-            self.monitoring_thread.daemon = True
-            self.monitoring_thread.start()
-
-    def _monitor_resources(self):
-        while self.is_monitoring:
-            try:
-                # CPU Usage
-                cpu_percent = psutil.cpu_percent(interval=1)
-                self.resource_history['cpu'].append({
-                    'timestamp': time.time(),
-                    'value': cpu_percent
-                })
+            self._restore_history()
+            self.sampler.add_listener(self._record_snapshot)
+            self.process_table.attach(self.sampler)
+            self.disk_latency.attach(self.sampler)
+            self.alerts.attach(self.sampler)
+            self.cgroups.attach(self.sampler)
+            self.sampler.start()
 
-                # Memory Usage
-                memory = psutil.virtual_memory()
-                self.resource_history['memory'].append({
-                    'timestamp': time.time(),
-                    'value': memory.percent
-                })
+    def stop_resource_monitoring(self):
+        self.is_monitoring = False
+        self.sampler.remove_listener(self._record_snapshot)
+        self.process_table.detach(self.sampler)
+        self.disk_latency.detach(self.sampler)
+        self.alerts.detach(self.sampler)
+        self.cgroups.detach(self.sampler)
+        self.metrics_store.close()
+        for store in list(self.gpu_stores.values()):
+            store.close()
 
-                # Disk Usage
-                disk = psutil.disk_usage('/')
-                self.resource_history['disk'].append({
-                    'timestamp': time.time(),
-                    'value': disk.percent
-                })
+    def _restore_history(self):
+        # Reload the in-memory window from disk after a restart
+        try:
+            since = time.time() - self.resource_history.raw.capacity * self.sampler.interval
+            rows = self.metrics_store.read(start=since)
+            for values in zip(*(rows[name] for name in self.resource_history.columns)):
+                self.resource_history.append(values)
+        except Exception as e:
+            print(f"Error restoring resource history: {str(e)}")
 
-                # Network Usage
-                net_io = psutil.net_io_counters()
-                self.resource_history['network'].append({
-                    'timestamp': time.time(),
-                    'value': {
-                        'bytes_sent': net_io.bytes_sent,
-                        'bytes_recv': net_io.bytes_recv
-                    }
-                })
+    def _compact_store(self):
+        try:
+            self.metrics_store.compact()
+            for store in list(self.gpu_stores.values()):
+                store.compact()
+        except Exception as e:
+            print(f"Error compacting metrics store: {str(e)}")
+
+    def _record_snapshot(self, snapshot):
+        # Called by the shared sampler on every tick. Groups that were not
+        # collected on this tick carry old values and are not recorded
+        # again; the resource row follows the cpu group, and its disk
+        # column holds the last partitions sample between collections.
+        if 'cpu' in snapshot.fresh:
+            net_tx = net_rx = 0.0
+            net_rates = snapshot.net_rates['total']
+            if net_rates:
+                net_tx = net_rates['per_second']['bytes_sent']
+                net_rx = net_rates['per_second']['bytes_recv']
+
+            row = (
+                snapshot.timestamp,
+                snapshot.cpu_percent,
+                snapshot.memory.percent,
+                snapshot.disk_usage.percent if snapshot.disk_usage else 0.0,
+                net_tx,
+                net_rx
+            )
+            self.resource_history.append(row)
+            self.metrics_store.append(row)
+        if 'gpu' in snapshot.fresh:
+            for gpu in snapshot.gpus:
+                self._record_gpu(snapshot.timestamp, gpu)
 
-                time.sleep(1)
-            except Exception as e:
-                print(f"Error in resource monitoring: {str(e)}")
-                time.sleep(1)
+        # Compact and apply retention once an hour, off the sampler thread
+        hour = int(snapshot.timestamp // 3600)
+        if hour != self._last_compaction_hour:
+            self._last_compaction_hour = hour
+            compaction = threading.Thread(target=self._compact_store, name='metrics-compaction')
+            compaction.daemon = True
+            compaction.start()
 
+    def _record_gpu(self, timestamp, gpu):
+        history = self.gpu_history.get(gpu.index)
+        if history is None:
+            history = TieredHistory(GPU_HISTORY_COLUMNS, raw_resolution=self.sampler.interval)
+            self.gpu_stores[gpu.index] = MetricsStore(
+                os.path.join(self.metrics_store.directory, 'gpu', str(gpu.index)), GPU_HISTORY_COLUMNS
+            )
+            self.gpu_history[gpu.index] = history
+        row = gpu_history_row(timestamp, gpu)
+        history.append(row)
+        self.gpu_stores[gpu.index].append(row)
+
+    @self_stats.timed
     def get_network_packet_stats(self):
         try:
-            net_io = psutil.net_io_counters()
+            snapshot = self.sampler.get_snapshot()
+            net_io = snapshot.net_io
+            rates = snapshot.net_rates
             return {
                 'bytes_sent': net_io.bytes_sent,
                 'bytes_recv': net_io.bytes_recv,
@@ -74,38 +133,81 @@ class AdvancedMonitoring:
                 'errin': net_io.errin,
                 'errout': net_io.errout,
                 'dropin': net_io.dropin,
-                'dropout': net_io.dropout
+                'dropout': net_io.dropout,
+                'rates': round_rates(rates['total']) if rates['total'] else None,
+                'interfaces': {name: round_rates(value) for name, value in rates['devices'].items()}
             }
         except Exception as e:
             return {'error': str(e)}
 
-    def get_port_scan(self):
+    @self_stats.timed
+    def get_port_scan(self, host='127.0.0.1', ports=DEFAULT_PORTS, mode='listening',
+                      concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
         try:
-            open_ports = []
-            for port in range(1, 1025):
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(0.1)
-                result = sock.connect_ex(('127.0.0.1', port))
-                if result == 0:
-                    open_ports.append(port)
-                sock.close()
-            return {'open_ports': open_ports}
+            # Local listeners come straight from the socket table
+            if mode == 'listening' and host in LOCAL_HOSTS:
+                return {
+                    'mode': 'listening',
+                    'open_ports': self.port_scanner.get_local_open_ports(ports)
+                }
+            # Anything else is probed by a background scan job
+            job = self.port_scanner.start_scan(host, ports, concurrency, timeout)
+            job['mode'] = 'scan'
+            return job
+        except ScanLimitError as e:
+            return {'error': str(e), 'busy': True}
+        except ScanHostError as e:
+            return {'error': str(e), 'forbidden': True}
         except Exception as e:
             return {'error': str(e)}
 
-    def get_process_tree(self):
+    @self_stats.timed
+    def get_port_scan_job(self, job_id):
         try:
-            processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'username', 'memory_percent', 'cpu_percent']):
-                try:
-                    pinfo = proc.info
-                    processes.append(pinfo)
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    pass
-            return {'processes': processes}
+            job = self.port_scanner.get_job(job_id)
+            if job is None:
+                return {'error': f'Unknown scan job: {job_id}'}
+            return job
         except Exception as e:
             return {'error': str(e)}
 
+    @self_stats.timed
+    def get_listening_ports(self):
+        try:
+            return {'listening': self.port_scanner.get_listening_ports()}
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
+    def get_process_tree(self, sort='cpu', limit=None, offset=0, name=None, user=None, min_cpu=None,
+                         descending=True):
+        try:
+            return self.process_table.query(
+                sort=sort, limit=limit, offset=offset,
+                name=name, user=user, min_cpu=min_cpu, descending=descending
+            )
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
+    def get_process_hierarchy(self, root=None, depth=None):
+        try:
+            return {'tree': self.process_table.tree(root=root, depth=depth)}
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
+    def get_top_processes(self, n=5):
+        try:
+            return {
+                'cpu': self.process_table.top('cpu', n),
+                'rss': self.process_table.top('rss', n),
+                'io': self.process_table.top('io', n)
+            }
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
     def get_security_status(self):
         try:
             return {
@@ -117,27 +219,54 @@ class AdvancedMonitoring:
         except Exception as e:
             return {'error': str(e)}
 
+    @self_stats.timed
     def get_disk_health(self):
         try:
             disk_info = []
-            for partition in psutil.disk_partitions():
-                try:
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    disk_info.append({
-                        'device': partition.device,
-                        'mountpoint': partition.mountpoint,
-                        'fstype': partition.fstype,
-                        'total': usage.total,
-                        'used': usage.used,
-                        'free': usage.free,
-                        'percent': usage.percent
-                    })
-                except:
-                    continue
+            for usage in self.sampler.get_snapshot().partitions:
+                disk_info.append({
+                    'device': usage.device,
+                    'mountpoint': usage.mountpoint,
+                    'fstype': usage.fstype,
+                    'total': usage.total,
+                    'used': usage.used,
+                    'free': usage.free,
+                    'percent': usage.percent,
+                    'io': self._disk_io_summary(usage.device)
+                })
             return {'disks': disk_info}
         except Exception as e:
             return {'error': str(e)}
 
+    def _disk_io_summary(self, device):
+        io = self.disk_latency.get_device(device)
+        if io is None:
+            return None
+        return {
+            'status': io['status'],
+            'utilization': io['utilization'],
+            'read_latency_ms': io['read_latency_ms'],
+            'write_latency_ms': io['write_latency_ms'],
+            'in_flight': io['in_flight']
+        }
+
+    @self_stats.timed
+    def get_disk_io(self, device=None, include_idle=False):
+        try:
+            if device:
+                io = self.disk_latency.get_device(device)
+                if io is None:
+                    return {'error': f"Unknown disk: {device}"}
+                return {'devices': {os.path.basename(device): io}}
+            devices = self.disk_latency.get_devices(include_idle=include_idle)
+            return {
+                'devices': devices,
+                'saturated': sorted(name for name, io in devices.items() if io['status'] == 'Saturated')
+            }
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
     def get_fan_speed(self):
         try:
             # This is a placeholder as fan speed monitoring requires specific hardware access
@@ -145,28 +274,31 @@ class AdvancedMonitoring:
         except Exception as e:
             return {'error': str(e)}
 
+    @self_stats.timed
     def get_cpu_profile(self):
         try:
+            snapshot = self.sampler.get_snapshot()
             return {
-                'cpu_percent': psutil.cpu_percent(percpu=True),
-                'cpu_freq': psutil.cpu_freq()._asdict(),
-                'cpu_count': psutil.cpu_count(),
-                'cpu_stats': psutil.cpu_stats()._asdict()
+                'cpu_percent': list(snapshot.cpu_per_core),
+                'cpu_freq': snapshot.cpu_freq._asdict(),
+                'cpu_count': len(snapshot.cpu_per_core),
+                'cpu_stats': snapshot.cpu_stats._asdict()
             }
         except Exception as e:
             return {'error': str(e)}
 
+    @self_stats.timed
     def get_memory_profile(self):
         try:
-            memory = psutil.virtual_memory()
-            swap = psutil.swap_memory()
+            snapshot = self.sampler.get_snapshot()
             return {
-                'virtual_memory': memory._asdict(),
-                'swap_memory': swap._asdict()
+                'virtual_memory': snapshot.memory._asdict(),
+                'swap_memory': snapshot.swap._asdict()
             }
         except Exception as e:
             return {'error': str(e)}
 
+    @self_stats.timed
     def get_startup_programs(self):
         try:
             # This is a placeholder as startup program detection varies by OS
@@ -174,34 +306,145 @@ class AdvancedMonitoring:
         except Exception as e:
             return {'error': str(e)}
 
+    @self_stats.timed
+    def get_cgroups(self, path=None, sort='cpu', limit=None):
+        try:
+            if path:
+                cgroup = self.cgroups.get_cgroup(path)
+                if cgroup is None:
+                    return {'error': f"Unknown cgroup: {path}"}
+                return {'cgroups': [cgroup]}
+            return {
+                'own': self.cgroups.get_own(),
+                'cgroups': self.cgroups.get_cgroups(sort=sort, limit=limit),
+                'system_pressure': self.cgroups.get_system_pressure()
+            }
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
+    def get_alerts(self, severity=None, limit=50):
+        try:
+            active = self.alerts.active(severity)
+            return {
+                'firing': sum(1 for alert in active if alert['state'] == 'firing'),
+                'pending': sum(1 for alert in active if alert['state'] == 'pending'),
+                'active': active,
+                'recent': self.alerts.events(limit)
+            }
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
+    def get_alert_rules(self):
+        return self.alerts.rule_list()
+
+    @self_stats.timed
     def get_optimization_tips(self):
         try:
+            # Advice comes from the alert rules that carry a tip
             tips = []
-            # CPU Usage Check
-            if psutil.cpu_percent() > 80:
-                tips.append("High CPU usage detected. Consider closing unnecessary applications.")
-            
-            # Memory Usage Check
-            memory = psutil.virtual_memory()
-            if memory.percent > 80:
-                tips.append("High memory usage detected. Consider freeing up some memory.")
-            
-            # Disk Usage Check
-            disk = psutil.disk_usage('/')
-            if disk.percent > 80:
-                tips.append("Low disk space. Consider cleaning up unnecessary files.")
-            
+            for alert in self.alerts.active():
+                if alert['state'] == 'firing' and alert.get('tip') and alert['tip'] not in tips:
+                    tips.append(alert['tip'])
             return {'tips': tips}
         except Exception as e:
             return {'error': str(e)}
 
-    def get_resource_history(self):
-        try:
-            return {
-                'cpu': list(self.resource_history['cpu']),
-                'memory': list(self.resource_history['memory']),
-                'disk': list(self.resource_history['disk']),
-                'network': list(self.resource_history['network'])
+    @self_stats.timed
+    def build_historical_report(self, start=None, end=None, window=None):
+        """
+        Report over [start, end]. Without start the window is the given
+        duration ("1h", "1d", "1w", ...) before end, an hour by default.
+        Statistics come from the raw samples in memory, or from the on-disk
+        store when the window is older than the in-memory history.
+        """
+        end = time.time() if end is None else end
+        if start is None:
+            start = end - parse_duration(window or '1h')
+        if start >= end:
+            raise ValueError("Report window must end after it starts")
+
+        oldest = self.resource_history.raw.first_timestamp()
+        if oldest is not None and oldest <= start:
+            data = self.resource_history.range(start, end)
+            source = 'memory'
+        else:
+            data = self.metrics_store.read(start, end)
+            source = 'disk'
+
+        metrics = self.resource_history.metrics
+        samples = len(data['timestamp'])
+        # Gaps of up to two fully backed-off ticks count as covered
+        covered = covered_seconds(data['timestamp'], 2 * MAX_BACKOFF * self.sampler.interval)
+        units = {'cpu': 'percent', 'mem': 'percent', 'disk': 'percent', 'net_tx': 'bytes/s', 'net_rx': 'bytes/s'}
+        summary = summarize(data, metrics)
+        for name, stats in summary.items():
+            stats['unit'] = units.get(name)
+
+        history = self.process_table.history
+        return {
+            'type': 'historical',
+            'generated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'from': start,
+            'to': end,
+            'window_seconds': end - start,
+            'source': source,
+            'samples': samples,
+            'coverage_percent': round(min(covered / (end - start) * 100, 100.0), 1),
+            'metrics': summary,
+            'top_processes': {
+                'cpu': history.top(start, end, 'cpu'),
+                'memory': history.top(start, end, 'memory')
             }
+        }
+
+    @self_stats.timed
+    def get_historical_report(self, start=None, end=None, window=None):
+        try:
+            return self.build_historical_report(start, end, window)
         except Exception as e:
-            return {'error': str(e)} 
\ No newline at end of file
+            return {'error': str(e)}
+
+    @self_stats.timed
+    def get_gpu_history(self, index=0, start=None, end=None, max_points=None):
+        try:
+            history = self.gpu_history.get(index)
+            if history is None:
+                return {'error': f"Unknown GPU: {index}"}
+            oldest = history.oldest_timestamp()
+            if start is not None and (oldest is None or start < oldest):
+                result = self.gpu_stores[index].query(start, end, max_points)
+                result['source'] = 'disk'
+            else:
+                result = history.query(start, end, max_points)
+                result['source'] = 'memory'
+            result.update({
+                'gpu': index,
+                'from': start,
+                'to': end,
+                'count': len(result['columns']['timestamp'])
+            })
+            return result
+        except Exception as e:
+            return {'error': str(e)}
+
+    @self_stats.timed
+    def get_resource_history(self, start=None, end=None, max_points=None):
+        try:
+            # Windows older than what is held in memory are read from disk
+            oldest = self.resource_history.oldest_timestamp()
+            if start is not None and (oldest is None or start < oldest):
+                result = self.metrics_store.query(start, end, max_points)
+                result['source'] = 'disk'
+            else:
+                result = self.resource_history.query(start, end, max_points)
+                result['source'] = 'memory'
+            result.update({
+                'from': start,
+                'to': end,
+                'count': len(result['columns']['timestamp'])
+            })
+            return result
+        except Exception as e:
+            return {'error': str(e)}
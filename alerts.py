@@ -0,0 +1,413 @@
+import fnmatch
+import math
+import operator
+import threading
+from collections import deque
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+RULE_TYPES = ('threshold', 'rate', 'zscore')
+SEVERITIES = ('info', 'warning', 'critical')
+# State transitions kept for /api/alerts
+MAX_EVENTS = 200
+# A threshold rule's metric within this fraction of the threshold, or any
+# alert pending or firing, has the sampler collect it on every tick
+NEAR_THRESHOLD = 0.1
+# First part of a metric name -> sampler metric group it is collected in
+METRIC_GROUPS = {
+    'cpu': 'cpu', 'load': 'cpu', 'memory': 'memory', 'swap': 'memory', 'net': 'net',
+    'disk': 'partitions', 'partition': 'partitions', 'gpu': 'gpu', 'temperature': 'sensors',
+    'pressure': 'cgroup', 'container': 'cgroup',
+}
+
+# Declarative rules evaluated on every sampler tick. Metric names may use
+# shell-style wildcards ("gpu.*.temperature"); each matching metric is
+# tracked as its own alert. "clear" and "clear_for" give hysteresis: a
+# firing alert only resolves once the value is back past "clear" for
+# "clear_for" seconds. "window" is in seconds for rate and zscore rules.
+# "tip" is advice shown by /api/optimization/tips while the alert fires;
+# "boost": False keeps an advisory rule from speeding up the sampler.
+DEFAULT_RULES = (
+    {'name': 'cpu_high', 'type': 'threshold', 'metric': 'cpu.percent', 'op': '>', 'value': 90,
+     'for': 60, 'clear': 80, 'clear_for': 30, 'severity': 'warning',
+     'message': 'CPU usage above 90% for a minute'},
+    {'name': 'memory_high', 'type': 'threshold', 'metric': 'memory.percent', 'op': '>', 'value': 90,
+     'for': 60, 'clear': 85, 'clear_for': 30, 'severity': 'warning',
+     'message': 'Memory usage above 90% for a minute'},
+    {'name': 'swap_high', 'type': 'threshold', 'metric': 'swap.percent', 'op': '>', 'value': 80,
+     'for': 120, 'clear': 70, 'severity': 'warning',
+     'message': 'Swap usage above 80%'},
+    {'name': 'disk_full', 'type': 'threshold', 'metric': 'disk.percent', 'op': '>', 'value': 90,
+     'for': 0, 'clear': 88, 'severity': 'critical',
+     'message': 'Disk more than 90% full'},
+    {'name': 'gpu_hot', 'type': 'threshold', 'metric': 'gpu.*.temperature', 'op': '>', 'value': 80,
+     'for': 30, 'clear': 75, 'clear_for': 30, 'severity': 'warning',
+     'message': 'GPU temperature above 80 °C'},
+    {'name': 'sensor_hot', 'type': 'threshold', 'metric': 'temperature.*', 'op': '>', 'value': 85,
+     'for': 30, 'clear': 80, 'clear_for': 30, 'severity': 'critical',
+     'message': 'Hardware temperature above 85 °C'},
+    {'name': 'memory_pressure', 'type': 'threshold', 'metric': 'pressure.memory.full', 'op': '>', 'value': 10,
+     'for': 30, 'clear': 2, 'clear_for': 30, 'severity': 'warning',
+     'message': 'Tasks stalled on memory more than 10% of the time'},
+    {'name': 'container_memory_high', 'type': 'threshold', 'metric': 'container.memory.percent', 'op': '>',
+     'value': 90, 'for': 60, 'clear': 85, 'clear_for': 30, 'severity': 'warning',
+     'message': 'Container memory above 90% of its limit'},
+    {'name': 'memory_climbing', 'type': 'rate', 'metric': 'memory.percent', 'op': '>', 'value': 0.5,
+     'window': 60, 'for': 30, 'clear': 0.1, 'clear_for': 30, 'severity': 'warning',
+     'message': 'Memory usage growing faster than 0.5 points per second'},
+    {'name': 'cpu_anomaly', 'type': 'zscore', 'metric': 'cpu.percent', 'op': '>', 'value': 4,
+     'window': 300, 'min_samples': 30, 'for': 0, 'clear': 2, 'clear_for': 10, 'severity': 'info',
+     'message': 'CPU usage far above its recent level'},
+    {'name': 'net_tx_anomaly', 'type': 'zscore', 'metric': 'net.tx_bytes_per_sec', 'op': '>', 'value': 4,
+     'window': 300, 'min_samples': 30, 'for': 5, 'clear': 2, 'clear_for': 10, 'severity': 'info',
+     'message': 'Outbound traffic far above its recent level'},
+    # Advisory states read by the tips, GPU status and health reports
+    {'name': 'cpu_busy', 'type': 'threshold', 'metric': 'cpu.percent', 'op': '>', 'value': 80,
+     'for': 0, 'clear': 75, 'severity': 'info', 'boost': False,
+     'message': 'CPU usage above 80%',
+     'tip': 'High CPU usage detected. Consider closing unnecessary applications.'},
+    {'name': 'memory_busy', 'type': 'threshold', 'metric': 'memory.percent', 'op': '>', 'value': 80,
+     'for': 0, 'clear': 75, 'severity': 'info', 'boost': False,
+     'message': 'Memory usage above 80%',
+     'tip': 'High memory usage detected. Consider freeing up some memory.'},
+    {'name': 'disk_low', 'type': 'threshold', 'metric': 'disk.percent', 'op': '>', 'value': 80,
+     'for': 0, 'clear': 78, 'severity': 'info', 'boost': False,
+     'message': 'Disk more than 80% full',
+     'tip': 'Low disk space. Consider cleaning up unnecessary files.'},
+    {'name': 'partition_filling', 'type': 'threshold', 'metric': 'partition.*.percent', 'op': '>', 'value': 80,
+     'for': 0, 'clear': 78, 'severity': 'warning', 'boost': False,
+     'message': 'Partition more than 80% full'},
+    {'name': 'partition_full', 'type': 'threshold', 'metric': 'partition.*.percent', 'op': '>', 'value': 90,
+     'for': 0, 'clear': 88, 'severity': 'critical',
+     'message': 'Partition more than 90% full'},
+    {'name': 'gpu_memory_high', 'type': 'threshold', 'metric': 'gpu.*.memory_percent', 'op': '>', 'value': 90,
+     'for': 0, 'clear': 85, 'severity': 'warning',
+     'message': 'GPU memory more than 90% used'},
+    {'name': 'gpu_busy', 'type': 'threshold', 'metric': 'gpu.*.utilization', 'op': '>', 'value': 90,
+     'for': 0, 'clear': 85, 'severity': 'info', 'boost': False,
+     'message': 'GPU utilisation above 90%'},
+)
+
+
+def snapshot_metrics(snapshot):
+    # Flat {metric: value} view of a snapshot that rules refer to
+    metrics = {
+        'cpu.percent': snapshot.cpu_percent,
+        'memory.percent': snapshot.memory.percent,
+        'swap.percent': snapshot.swap.percent,
+    }
+    if snapshot.disk_usage:
+        metrics['disk.percent'] = snapshot.disk_usage.percent
+    if snapshot.load_avg:
+        metrics['load.1m'] = snapshot.load_avg[0]
+    net_rates = snapshot.net_rates['total']
+    if net_rates:
+        metrics['net.tx_bytes_per_sec'] = net_rates['per_second']['bytes_sent']
+        metrics['net.rx_bytes_per_sec'] = net_rates['per_second']['bytes_recv']
+    for partition in snapshot.partitions:
+        metrics[f'partition.{partition.mountpoint}.percent'] = partition.percent
+    for gpu in snapshot.gpus:
+        for field in ('utilization', 'temperature', 'power_draw'):
+            value = getattr(gpu, field)
+            if value is not None:
+                metrics[f'gpu.{gpu.index}.{field}'] = value
+        if gpu.memory_total and gpu.memory_used is not None:
+            metrics[f'gpu.{gpu.index}.memory_percent'] = gpu.memory_used / gpu.memory_total * 100
+    for sensor, entries in (snapshot.temperatures or {}).items():
+        readings = [entry.current for entry in entries if entry.current is not None]
+        if readings:
+            metrics[f'temperature.{sensor}'] = max(readings)
+    for resource, stalls in (snapshot.pressure or {}).items():
+        for kind, psi in stalls.items():
+            metrics[f'pressure.{resource}.{kind}'] = psi.avg10
+    cgroup = snapshot.cgroup
+    if cgroup and cgroup.memory_max and cgroup.memory_current is not None:
+        metrics['container.memory.percent'] = cgroup.memory_current / cgroup.memory_max * 100
+    return metrics
+
+
+def metric_group(metric):
+    # Sampler metric group a metric is collected in, None if unknown
+    return METRIC_GROUPS.get(metric.split('.', 1)[0])
+
+
+class Rule:
+    def __init__(self, spec):
+        self.name = spec['name']
+        self.type = spec.get('type', 'threshold')
+        self.metric = spec['metric']
+        self.op = spec.get('op', '>')
+        self.value = float(spec['value'])
+        self.duration = float(spec.get('for', 0))
+        self.clear = float(spec.get('clear', self.value))
+        self.clear_for = float(spec.get('clear_for', 0))
+        self.window = float(spec.get('window', 300 if self.type == 'zscore' else 60))
+        self.min_samples = int(spec.get('min_samples', 30))
+        self.severity = spec.get('severity', 'warning')
+        self.message = spec.get('message', f"{self.metric} {self.op} {spec['value']}")
+        self.tip = spec.get('tip')
+        self.boost = bool(spec.get('boost', True))
+        if self.type not in RULE_TYPES:
+            raise ValueError(f"Unknown rule type: {self.type}")
+        if self.op not in OPERATORS:
+            raise ValueError(f"Unknown operator: {self.op}")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Unknown severity: {self.severity}")
+        self.compare = OPERATORS[self.op]
+        self._matches = {}
+
+    def near(self, value):
+        # Within NEAR_THRESHOLD of breaching (boosting threshold rules only)
+        if self.type != 'threshold' or not self.boost:
+            return False
+        margin = abs(self.value) * NEAR_THRESHOLD
+        if self.op in ('>', '>='):
+            return value >= self.value - margin
+        return value <= self.value + margin
+
+    def matches(self, metric):
+        # Metric names are stable between ticks, so the pattern match is cached
+        matched = self._matches.get(metric)
+        if matched is None:
+            matched = self._matches[metric] = fnmatch.fnmatchcase(metric, self.metric)
+        return matched
+
+    def to_dict(self):
+        return {
+            'name': self.name, 'type': self.type, 'metric': self.metric, 'op': self.op,
+            'value': self.value, 'for': self.duration, 'clear': self.clear, 'clear_for': self.clear_for,
+            'window': self.window if self.type != 'threshold' else None,
+            'severity': self.severity, 'message': self.message, 'tip': self.tip, 'boost': self.boost
+        }
+
+
+class _AlertState:
+    def __init__(self, rule, metric):
+        self.rule = rule
+        self.metric = metric
+        self.state = 'ok'
+        self.since = None
+        self.clear_since = None
+        self.started_at = None
+        self.value = None
+        self.observed = None
+        self.breaches = 0
+        # (timestamp, value) pairs. zscore keeps the window's mean and sum
+        # of squared deviations (Welford), which stay accurate for large
+        # values where sum-of-squares formulas cancel
+        self.samples = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Removals since the statistics were last recomputed from the window
+        self.removed = 0
+
+    def observe(self, timestamp, value):
+        # Returns (observed, breaching, cleared) for this sample
+        rule = self.rule
+        if rule.type == 'threshold':
+            observed = value
+        elif rule.type == 'rate':
+            self.samples.append((timestamp, value))
+            while timestamp - self.samples[0][0] > rule.window:
+                self.samples.popleft()
+            first_time, first_value = self.samples[0]
+            observed = (value - first_value) / (timestamp - first_time) if timestamp > first_time else None
+        else:
+            observed = None
+            count = len(self.samples)
+            if count >= rule.min_samples:
+                variance = max(self.m2 / count, 0.0)
+                if variance > 0:
+                    observed = (value - self.mean) / math.sqrt(variance)
+            self.samples.append((timestamp, value))
+            count += 1
+            delta = value - self.mean
+            self.mean += delta / count
+            self.m2 += delta * (value - self.mean)
+            # The window is in seconds, like the rate rule's; the tick
+            # period varies, so samples are pruned by age
+            while timestamp - self.samples[0][0] > rule.window:
+                _, old = self.samples.popleft()
+                count -= 1
+                delta = old - self.mean
+                self.mean -= delta / count
+                self.m2 -= delta * (old - self.mean)
+                self.removed += 1
+            # Removal still accumulates rounding error; once the window has
+            # turned over, recompute from it (amortised O(1) per sample)
+            if self.removed >= count:
+                self._recompute()
+
+        if observed is None:
+            return None, False, True
+        return observed, rule.compare(observed, rule.value), not rule.compare(observed, rule.clear)
+
+    def _recompute(self):
+        values = [value for _, value in self.samples]
+        self.mean = math.fsum(values) / len(values)
+        self.m2 = math.fsum((value - self.mean) ** 2 for value in values)
+        self.removed = 0
+
+    def to_dict(self):
+        return {
+            'rule': self.rule.name,
+            'metric': self.metric,
+            'severity': self.rule.severity,
+            'state': self.state,
+            'message': self.rule.message,
+            'tip': self.rule.tip,
+            'value': self.value,
+            'observed': round(self.observed, 3) if self.observed is not None else None,
+            'since': self.since,
+            'started_at': self.started_at,
+            'breaches': self.breaches
+        }
+
+
+class AlertEngine:
+    """
+    Evaluates rules incrementally on each sampler snapshot. Every (rule,
+    metric) pair has one alert that moves ok -> pending -> firing -> ok, so
+    a condition that persists is reported once rather than on every tick.
+    Readers get the state published by the last evaluation.
+    """
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = [Rule(spec) for spec in rules]
+        self._states = {}
+        self._active = []
+        self._events = deque(maxlen=MAX_EVENTS)
+        # Metrics close to or past a threshold after the last evaluation
+        self._near = set()
+        self._sampler = None
+        self._lock = threading.Lock()
+
+    def attach(self, sampler):
+        self._sampler = sampler
+        sampler.add_listener(self.update)
+
+    def detach(self, sampler):
+        sampler.remove_listener(self.update)
+        self._sampler = None
+
+    def add_rule(self, spec):
+        rule = Rule(spec)
+        with self._lock:
+            if any(existing.name == rule.name for existing in self.rules):
+                raise ValueError(f"Duplicate rule: {rule.name}")
+            self.rules.append(rule)
+        return rule
+
+    def update(self, snapshot):
+        self.evaluate(snapshot.timestamp, snapshot_metrics(snapshot), snapshot.fresh)
+        # Watch whatever is about to alert more closely
+        sampler = self._sampler
+        if sampler is not None:
+            for group in self.near_groups():
+                sampler.boost(group)
+
+    def near_groups(self):
+        return {metric_group(metric) for metric in self._near} - {None}
+
+    def evaluate(self, timestamp, metrics, fresh=None):
+        # fresh is the set of metric groups sampled for this evaluation;
+        # metrics of other groups hold old values and keep their state
+        with self._lock:
+            seen = set()
+            near = set()
+            for rule in self.rules:
+                for metric, value in metrics.items():
+                    if value is None or not rule.matches(metric):
+                        continue
+                    key = (rule.name, metric)
+                    seen.add(key)
+                    if fresh is not None and metric_group(metric) not in fresh | {None}:
+                        if metric in self._near:
+                            near.add(metric)
+                        continue
+                    alert = self._states.get(key)
+                    if alert is None:
+                        alert = self._states[key] = _AlertState(rule, metric)
+                    self._step(alert, timestamp, value)
+                    if rule.boost and (alert.state != 'ok' or rule.near(value)):
+                        near.add(metric)
+
+            # Metrics that vanished (e.g. a removed device) resolve their alerts
+            for key in list(self._states):
+                if key not in seen:
+                    alert = self._states.pop(key)
+                    if alert.state == 'firing':
+                        self._record(alert, 'resolved', timestamp)
+
+            self._near = near
+            self._active = [
+                alert.to_dict() for alert in self._states.values() if alert.state != 'ok'
+            ]
+
+    def _step(self, alert, timestamp, value):
+        observed, breaching, cleared = alert.observe(timestamp, value)
+        alert.value = value
+        alert.observed = observed
+        rule = alert.rule
+
+        if alert.state == 'firing':
+            if breaching:
+                alert.breaches += 1
+            if cleared:
+                if alert.clear_since is None:
+                    alert.clear_since = timestamp
+                if timestamp - alert.clear_since >= rule.clear_for:
+                    alert.state = 'ok'
+                    self._record(alert, 'resolved', timestamp)
+                    alert.since = alert.started_at = alert.clear_since = None
+            else:
+                alert.clear_since = None
+            return
+
+        if not breaching:
+            alert.state = 'ok'
+            alert.since = None
+            return
+        if alert.state == 'ok':
+            alert.state = 'pending'
+            alert.since = timestamp
+            alert.breaches = 0
+        alert.breaches += 1
+        if timestamp - alert.since >= rule.duration:
+            alert.state = 'firing'
+            alert.started_at = timestamp
+            self._record(alert, 'firing', timestamp)
+
+    def _record(self, alert, state, timestamp):
+        event = alert.to_dict()
+        event['state'] = state
+        event['timestamp'] = timestamp
+        self._events.append(event)
+
+    def active(self, severity=None):
+        alerts = self._active
+        if severity:
+            alerts = [alert for alert in alerts if alert['severity'] == severity]
+        return alerts
+
+    def events(self, limit=None):
+        with self._lock:
+            events = list(self._events)
+        events.reverse()
+        return events[:limit] if limit else events
+
+    def rule_list(self):
+        return [rule.to_dict() for rule in self.rules]
+
+
+# Shared instance evaluated by the collector; workers swap in a proxy
+alert_engine = AlertEngine()
+
+
+def use_alert_engine(engine):
+    global alert_engine
+    alert_engine = engine
+
+
+def firing_alerts():
+    # (rule, metric) pairs currently firing
+    return {(alert['rule'], alert['metric']) for alert in alert_engine.active() if alert['state'] == 'firing'}
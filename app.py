@@ -1,108 +1,370 @@
-from flask import Flask, render_template, jsonify, send_file
+from flask import Flask, render_template, jsonify, send_from_directory, request, Response
 import os
 from hardware_info import (
     get_cpu_info, get_gpu_info, get_memory_info,
     get_disk_info, get_network_info, get_system_info,
     get_system_health, get_power_info, get_performance_report
 )
-import json
-from datetime import datetime
 import psutil
-from advanced_monitoring import AdvancedMonitoring
+from sampler import resource_sampler, use_sampler
+from process_table import use_process_table
+from alerts import use_alert_engine
+from static_info import static_facts
+from stream import SnapshotStream
+from reports import REPORTS_DIR, ReportLimitError, report_mimetype
+from prometheus import PrometheusExporter, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from collector import COLLECTOR_SOCKET_ENV, SNAPSHOT_SHM_ENV, FLEET_LISTEN_ENV, CollectorClient, build_monitoring
+from shared_snapshot import SharedSnapshotSampler
+from response_cache import ResponseCache
+from instrumentation import self_stats
+import json_provider
 import threading
+import time
 
 app = Flask(__name__)
-advanced_monitor = AdvancedMonitoring()
+# orjson when installed, the json module otherwise; both encode numpy arrays
+json_provider.init_app(app)
+# Call counts, durations, errors and bytes of every route (/api/self/stats)
+self_stats.init_app(app)
 
-# Start resource monitoring in background
-advanced_monitor.start_resource_monitoring()
+if os.environ.get(COLLECTOR_SOCKET_ENV):
+    # Worker started by serve.py: snapshots come from the collector's shared
+    # memory and stateful calls go to the collector over its Unix socket
+    collector = CollectorClient(os.environ[COLLECTOR_SOCKET_ENV])
+    resource_sampler = SharedSnapshotSampler(os.environ[SNAPSHOT_SHM_ENV])
+    use_sampler(resource_sampler)
+    use_process_table(collector.proxy('process_table'))
+    use_alert_engine(collector.proxy('alerts'))
+    monitoring = {
+        name: collector.proxy(name)
+        for name in ('monitor', 'process_table', 'alerts', 'reports', 'self_stats', 'sampler')
+    }
+    if os.environ.get(FLEET_LISTEN_ENV):
+        monitoring['fleet'] = collector.proxy('fleet')
+    static_facts.warm()
+    resource_sampler.start()
+else:
+    # Single process (dev server): collect in-process
+    monitoring = build_monitoring()
+
+advanced_monitor = monitoring['monitor']
+report_jobs = monitoring['reports']
+# Rollups of the agents reporting to this instance (None unless enabled)
+fleet = monitoring.get('fleet')
+
+# Serialized /api responses, shared by every client until the next tick
+# (or the endpoint's TTL for slow, near-static sections)
+response_cache = ResponseCache(resource_sampler)
+response_cache.init_app(app)
+
+# /metrics renders from the same snapshot, once per tick at most
+metrics_exporter = PrometheusExporter(
+    resource_sampler, monitoring['process_table'], monitoring['alerts'], static_facts
+)
+
+# Seconds between telling the collector's sampler that clients are watching
+# (an RPC under serve.py); well below sampler.IDLE_AFTER
+TOUCH_INTERVAL = 5.0
+last_touch = 0.0
+
+def keep_sampling():
+    # Requests and stream subscribers keep the sampler from backing off
+    global last_touch
+    now = time.monotonic()
+    if now - last_touch < TOUCH_INTERVAL:
+        return
+    last_touch = now
+    try:
+        monitoring['sampler'].touch()
+    except Exception as e:
+        print(f"Error waking the sampler: {str(e)}")
+
+app.before_request(keep_sampling)
+
+# Sections available on /api/stream, built once per sampler tick
+snapshot_stream = SnapshotStream({
+    "system": get_system_info,
+    "cpu": get_cpu_info,
+    "gpu": get_gpu_info,
+    "memory": get_memory_info,
+    "disk": get_disk_info,
+    "network": get_network_info,
+    "power": get_power_info,
+    "health": get_system_health,
+    "packets": advanced_monitor.get_network_packet_stats,
+    "process": advanced_monitor.get_process_tree,
+    "security": advanced_monitor.get_security_status,
+    "disk_health": advanced_monitor.get_disk_health,
+    "fan_speed": advanced_monitor.get_fan_speed,
+    "cpu_profile": advanced_monitor.get_cpu_profile,
+    "memory_profile": advanced_monitor.get_memory_profile,
+    "startup": advanced_monitor.get_startup_programs,
+    "optimization": advanced_monitor.get_optimization_tips,
+    "alerts": advanced_monitor.get_alerts
+}, sampler=resource_sampler, on_activity=keep_sampling)
+
+def list_response(result, status=200):
+    # ?format=columnar sends each list of rows as {field: [values]}
+    if request.args.get('format') == 'columnar':
+        result = json_provider.to_columnar(result)
+    return jsonify(result), status
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_exporter.render(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/system')
+@response_cache.cached()
 def system_info():
     return jsonify(get_system_info())
 
+@app.route('/api/system/refresh-static', methods=['POST'])
+def refresh_static_info():
+    static_facts.invalidate()
+    response_cache.clear()
+    return jsonify({"status": "success", "message": "Static hardware facts will be re-collected"})
+
 @app.route('/api/cpu')
+@response_cache.cached()
 def cpu_info():
     return jsonify(get_cpu_info())
 
 @app.route('/api/gpu')
+@response_cache.cached()
 def gpu_info():
     return jsonify(get_gpu_info())
 
+@app.route('/api/gpu/history')
+@response_cache.cached()
+def gpu_history():
+    result = advanced_monitor.get_gpu_history(
+        index=request.args.get('index', 0, type=int),
+        start=request.args.get('from', type=float),
+        end=request.args.get('to', type=float),
+        max_points=request.args.get('max_points', type=int)
+    )
+    return jsonify(result), 404 if result.get('error', '').startswith('Unknown GPU') else 200
+
 @app.route('/api/memory')
+@response_cache.cached()
 def memory_info():
     return jsonify(get_memory_info())
 
 @app.route('/api/disk')
+@response_cache.cached()
 def disk_info():
     return jsonify(get_disk_info())
 
 @app.route('/api/network')
+@response_cache.cached()
 def network_info():
     return jsonify(get_network_info())
 
 @app.route('/api/health')
+@response_cache.cached()
 def system_health():
     return jsonify(get_system_health())
 
 @app.route('/api/power')
+@response_cache.cached()
 def power_info():
     return jsonify(get_power_info())
 
 @app.route('/api/performance')
+@response_cache.cached()
 def performance_report():
     return jsonify(get_performance_report())
 
 # New endpoints for advanced monitoring
 @app.route('/api/network/packets')
+@response_cache.cached()
 def network_packets():
     return jsonify(advanced_monitor.get_network_packet_stats())
 
 @app.route('/api/network/ports')
 def network_ports():
-    return jsonify(advanced_monitor.get_port_scan())
+    result = advanced_monitor.get_port_scan(
+        host=request.args.get('host', '127.0.0.1'),
+        ports=request.args.get('ports', '1-1024'),
+        mode=request.args.get('mode', 'listening'),
+        concurrency=request.args.get('concurrency', 256, type=int),
+        timeout=request.args.get('timeout', 0.5, type=float)
+    )
+    if result.get('error'):
+        if result.get('forbidden'):
+            return jsonify(result), 403
+        return jsonify(result), 429 if result.get('busy') else 400
+    return jsonify(result), 202 if result.get('status') == 'running' else 200
+
+@app.route('/api/network/ports/jobs/<job_id>')
+def network_port_job(job_id):
+    result = advanced_monitor.get_port_scan_job(job_id)
+    return jsonify(result), 404 if result.get('error') else 200
+
+@app.route('/api/network/listening')
+@response_cache.cached(ttl=5)
+def network_listening():
+    return list_response(advanced_monitor.get_listening_ports())
 
 @app.route('/api/process/tree')
+@response_cache.cached()
 def process_tree():
-    return jsonify(advanced_monitor.get_process_tree())
+    if request.args.get('view') == 'tree':
+        result = advanced_monitor.get_process_hierarchy(
+            root=request.args.get('root', type=int),
+            depth=request.args.get('depth', type=int)
+        )
+        return jsonify(result), 400 if 'error' in result else 200
+
+    result = advanced_monitor.get_process_tree(
+        sort=request.args.get('sort', 'cpu'),
+        limit=request.args.get('limit', type=int),
+        offset=request.args.get('offset', 0, type=int),
+        name=request.args.get('name'),
+        user=request.args.get('user'),
+        min_cpu=request.args.get('min_cpu', type=float),
+        descending=request.args.get('order', 'desc') != 'asc'
+    )
+    return list_response(result, 400 if 'error' in result else 200)
+
+@app.route('/api/process/top')
+@response_cache.cached()
+def process_top():
+    return list_response(advanced_monitor.get_top_processes(request.args.get('n', 5, type=int)))
 
 @app.route('/api/security/status')
+@response_cache.cached(ttl=60)
 def security_status():
     return jsonify(advanced_monitor.get_security_status())
 
 @app.route('/api/hardware/disk-health')
+@response_cache.cached()
 def disk_health():
-    return jsonify(advanced_monitor.get_disk_health())
+    return list_response(advanced_monitor.get_disk_health())
+
+@app.route('/api/disk/io')
+@response_cache.cached()
+def disk_io():
+    return jsonify(advanced_monitor.get_disk_io(
+        device=request.args.get('device'),
+        include_idle=request.args.get('all', '0') in ('1', 'true')
+    ))
 
 @app.route('/api/hardware/fan-speed')
+@response_cache.cached(ttl=60)
 def fan_speed():
     return jsonify(advanced_monitor.get_fan_speed())
 
 @app.route('/api/performance/cpu-profile')
+@response_cache.cached()
 def cpu_profile():
     return jsonify(advanced_monitor.get_cpu_profile())
 
 @app.route('/api/performance/memory-profile')
+@response_cache.cached()
 def memory_profile():
     return jsonify(advanced_monitor.get_memory_profile())
 
 @app.route('/api/system/startup')
+@response_cache.cached(ttl=300)
 def startup_programs():
     return jsonify(advanced_monitor.get_startup_programs())
 
 @app.route('/api/system/optimization')
+@response_cache.cached()
 def optimization_tips():
     return jsonify(advanced_monitor.get_optimization_tips())
 
+@app.route('/api/cgroups')
+@response_cache.cached()
+def cgroups():
+    result = advanced_monitor.get_cgroups(
+        path=request.args.get('path'),
+        sort=request.args.get('sort', 'cpu'),
+        limit=request.args.get('limit', type=int)
+    )
+    if result.get('error'):
+        return jsonify(result), 404 if result['error'].startswith('Unknown cgroup') else 400
+    return list_response(result)
+
+@app.route('/api/alerts')
+@response_cache.cached()
+def alerts():
+    return list_response(advanced_monitor.get_alerts(
+        severity=request.args.get('severity'),
+        limit=request.args.get('limit', 50, type=int)
+    ))
+
+@app.route('/api/alerts/rules')
+@response_cache.cached(ttl=60)
+def alert_rules():
+    return jsonify({"rules": advanced_monitor.get_alert_rules()})
+
+def fleet_response(result):
+    if fleet is None:
+        return jsonify({"status": "error", "message": f"Fleet mode is off; set {FLEET_LISTEN_ENV} to enable it"}), 404
+    if result.get('error'):
+        return jsonify(result), 404 if result['error'].startswith('Unknown fleet host') else 400
+    return list_response(result)
+
+@app.route('/api/fleet/hosts')
+@response_cache.cached()
+def fleet_hosts():
+    return fleet_response(fleet.get_hosts() if fleet else None)
+
+@app.route('/api/fleet/top')
+@response_cache.cached()
+def fleet_top():
+    return fleet_response(fleet.get_top_hosts(
+        by=request.args.get('by', 'cpu'),
+        n=request.args.get('n', 5, type=int)
+    ) if fleet else None)
+
+@app.route('/api/fleet/throughput')
+@response_cache.cached()
+def fleet_throughput():
+    return fleet_response(fleet.get_throughput() if fleet else None)
+
+@app.route('/api/fleet/hosts/<host>/history')
+@response_cache.cached()
+def fleet_host_history(host):
+    return fleet_response(fleet.get_host_history(
+        host,
+        start=request.args.get('from', type=float),
+        end=request.args.get('to', type=float),
+        max_points=request.args.get('max_points', type=int)
+    ) if fleet else None)
+
+@app.route('/api/self/stats')
+def monitor_self_stats():
+    # What the monitor itself costs; not cached so every call is current
+    result = self_stats.get_stats()
+    result['response_cache'] = response_cache.stats()
+    result['sampling'] = monitoring['sampler'].get_schedule()
+    if monitoring['self_stats'] is not self_stats:
+        # Worker: sampling, listeners and most collectors run in the
+        # collector process, so report its numbers alongside this worker's
+        try:
+            result['collector'] = monitoring['self_stats'].get_stats()
+        except Exception as e:
+            result['collector'] = {'error': str(e)}
+    return jsonify(result)
+
 @app.route('/api/system/resource-history')
+@response_cache.cached()
 def resource_history():
-    return jsonify(advanced_monitor.get_resource_history())
+    return jsonify(advanced_monitor.get_resource_history(
+        start=request.args.get('from', type=float),
+        end=request.args.get('to', type=float),
+        max_points=request.args.get('max_points', type=int)
+    ))
 
 @app.route('/api/hardware_info')
+@response_cache.cached()
 def hardware_info():
     return jsonify({
         "cpu": get_cpu_info(),
@@ -114,35 +376,70 @@ def hardware_info():
         "power": get_power_info()
     })
 
-@app.route('/api/generate_report')
+@app.route('/api/stream')
+def stream():
+    sections = [name for name in request.args.get('sections', '').split(',') if name]
+    try:
+        subscriber = snapshot_stream.subscribe(sections)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return Response(
+        snapshot_stream.events(subscriber),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/generate_report', methods=['POST'])
 def generate_report():
-    report = get_performance_report()
-    
-    # Create reports directory if it doesn't exist
-    os.makedirs('reports', exist_ok=True)
-    
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"performance_report_{timestamp}.json"
-    filepath = os.path.join('reports', filename)
-    
-    # Save report to file
-    with open(filepath, 'w') as f:
-        json.dump(report, f, indent=4)
-    
-    return jsonify({
-        "status": "success",
-        "message": "Report generated successfully",
-        "filename": filename,
-        "report": report
-    })
+    # Built on a background thread; poll the job until it is done
+    compression = request.args.get('compress', 'none')
+    try:
+        if request.args.get('window') or request.args.get('from'):
+            job = report_jobs.start(
+                'historical',
+                compression=compression,
+                start=request.args.get('from', type=float),
+                end=request.args.get('to', type=float),
+                window=request.args.get('window')
+            )
+        else:
+            job = report_jobs.start('performance', compression=compression)
+    except ReportLimitError as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(job), 202
+
+@app.route('/api/reports/historical')
+@response_cache.cached(ttl=30)
+def historical_report():
+    result = advanced_monitor.get_historical_report(
+        start=request.args.get('from', type=float),
+        end=request.args.get('to', type=float),
+        window=request.args.get('window')
+    )
+    return jsonify(result), 400 if result.get('error') else 200
+
+@app.route('/api/reports/jobs/<job_id>')
+def report_job(job_id):
+    job = report_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown report job: {job_id}"}), 404
+    return jsonify(job)
 
 @app.route('/api/download_report/<filename>')
 def download_report(filename):
-    return send_file(
-        os.path.join('reports', filename),
+    # Finished reports never change, so they are served with ETag /
+    # Last-Modified validation and byte range support
+    return send_from_directory(
+        REPORTS_DIR,
+        filename,
+        mimetype=report_mimetype(filename),
         as_attachment=True,
-        download_name=filename
+        download_name=filename,
+        conditional=True,
+        etag=True,
+        max_age=3600
     )
 
 def get_disk_health():
@@ -181,7 +478,7 @@ if __name__ == '__main__':
     # Make sure templates and static directories exist
     os.makedirs('templates', exist_ok=True)
     os.makedirs('static/js', exist_ok=True)
-    os.makedirs('reports', exist_ok=True)
+    os.makedirs(REPORTS_DIR, exist_ok=True)
     
     # Create template file if it doesn't exist
     template_path = os.path.join('templates', 'index.html')
@@ -195,5 +492,6 @@ if __name__ == '__main__':
         with open(script_path, 'w') as f:
             f.write(SCRIPT_JS)
     
-    print("Starting Hardware Monitor on http://127.0.0.1:5000")
-    app.run(debug=True)
\ No newline at end of file
+    print("Starting Hardware Monitor on http://127.0.0.1:5000 (use serve.py for production)")
+    # The reloader would import this module twice and start a second collector
+    app.run(debug=True, use_reloader=False)
\ No newline at end of file
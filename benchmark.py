@@ -0,0 +1,620 @@
+"""
+Benchmarks for the collectors, the Flask routes and end-to-end dashboard
+throughput.
+
+    # Record this machine once (psutil, GPUtil, py-cpuinfo, cgroup/PSI)
+    python benchmark.py record fixtures.json
+    # Replay it anywhere, offline and reproducibly
+    python benchmark.py run --fixture fixtures.json --output results.json
+    # Fail (exit 1) when p50 latencies regressed by more than 20%
+    python benchmark.py run --fixture fixtures.json --compare results.json
+
+Without --fixture the live machine is measured. Runs happen in a
+temporary directory so the metrics store and reports are thrown away.
+"""
+import argparse
+import contextlib
+import enum
+import importlib
+import inspect
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+from collections.abc import Mapping
+from types import SimpleNamespace
+
+import psutil
+
+DEFAULT_ITERATIONS = 200
+DEFAULT_WARMUP = 10
+# Calls traced for allocations (tracemalloc slows every call down)
+ALLOCATION_ITERATIONS = 20
+DEFAULT_CLIENTS = 8
+DEFAULT_DURATION = 10.0
+DEFAULT_THRESHOLD = 0.2
+PERCENTILES = (50, 90, 99)
+# Latencies this small are timer noise and never count as regressions
+MIN_COMPARED_US = 5.0
+
+# What the dashboard polls (static/js/script.js), plus the scrape endpoint
+DASHBOARD_ENDPOINTS = ('/api/hardware_info', '/api/system/resource-history', '/metrics')
+# Routes with side effects or unbounded responses
+SKIPPED_ROUTES = ('/api/stream', '/api/generate_report', '/api/network/ports')
+# AdvancedMonitoring getters that start work instead of reading state
+SKIPPED_METHODS = ('get_port_scan',)
+HARDWARE_COLLECTORS = (
+    'get_cpu_info', 'get_gpu_info', 'get_memory_info', 'get_disk_info', 'get_network_info',
+    'get_system_info', 'get_system_health', 'get_power_info', 'get_performance_report'
+)
+# psutil readings that are cumulative counters; replay extrapolates them
+# from two recorded frames so every tick sees plausible rates
+COUNTERS = (
+    'cpu_times', 'cpu_times_percpu', 'cpu_stats', 'net_io', 'net_io_pernic', 'disk_io', 'disk_io_perdisk'
+)
+PROCESS_ATTRIBUTES = (
+    'create_time', 'ppid', 'name', 'status', 'cpu_percent', 'username',
+    'memory_info', 'num_threads', 'num_fds', 'io_counters'
+)
+
+
+def encode(value):
+    # JSON-safe form of psutil results that keeps namedtuples and enums
+    if isinstance(value, enum.Enum):
+        return {'__enum__': f'{type(value).__module__}:{type(value).__qualname__}', 'name': value.name}
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        return {'__namedtuple__': type(value).__name__, 'fields': list(value._fields),
+                'values': [encode(item) for item in value]}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, Mapping):
+        return {str(key): encode(item) for key, item in value.items()}
+    return value
+
+
+_TYPES = {}
+
+
+def decode(value):
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if '__namedtuple__' in value:
+        key = (value['__namedtuple__'], tuple(value['fields']))
+        cls = _TYPES.get(key)
+        if cls is None:
+            cls = _TYPES[key] = namedtuple(*key)
+        return cls(*(decode(item) for item in value['values']))
+    if '__enum__' in value:
+        module, _, qualname = value['__enum__'].partition(':')
+        cls = importlib.import_module(module)
+        for part in qualname.split('.'):
+            cls = getattr(cls, part)
+        return cls[value['name']]
+    return {key: decode(item) for key, item in value.items()}
+
+
+def _call(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        return {'__error__': type(e).__name__}
+
+
+def _counters():
+    return {
+        'cpu_times': psutil.cpu_times(),
+        'cpu_times_percpu': psutil.cpu_times(percpu=True),
+        'cpu_stats': psutil.cpu_stats(),
+        'net_io': psutil.net_io_counters(),
+        'net_io_pernic': psutil.net_io_counters(pernic=True),
+        'disk_io': psutil.disk_io_counters(),
+        'disk_io_perdisk': psutil.disk_io_counters(perdisk=True)
+    }
+
+
+def record(path, gap=1.0):
+    """Capture everything the collectors read from this machine."""
+    import GPUtil
+    import cpuinfo
+    from cgroups import read_own_cgroup, read_system_pressure
+    from gpu import create_gpu_backend
+
+    processes = {}
+    for proc in psutil.process_iter():
+        _call(proc.cpu_percent, None)
+    first = _counters()
+    time.sleep(gap)
+    second = _counters()
+    for proc in psutil.process_iter():
+        with proc.oneshot():
+            info = {name: _call(getattr(proc, name)) for name in PROCESS_ATTRIBUTES if name != 'cpu_percent'}
+            info['cpu_percent'] = _call(proc.cpu_percent, None)
+        processes[str(proc.pid)] = info
+
+    partitions = psutil.disk_partitions()
+    usage = {'/': _call(psutil.disk_usage, '/')}
+    for partition in partitions:
+        usage[partition.mountpoint] = _call(psutil.disk_usage, partition.mountpoint)
+
+    gpu_backend = create_gpu_backend()
+    gpus = _call(gpu_backend.sample)
+    gpu_backend.close()
+    fixture = {
+        'recorded_at': time.time(),
+        'machine': platform.node(),
+        'gap': gap,
+        'counters': [first, second],
+        'getloadavg': _call(psutil.getloadavg),
+        'virtual_memory': psutil.virtual_memory(),
+        'swap_memory': psutil.swap_memory(),
+        'cpu_freq': _call(psutil.cpu_freq),
+        'cpu_count': {'logical': psutil.cpu_count(), 'physical': psutil.cpu_count(logical=False)},
+        'boot_time': psutil.boot_time(),
+        'disk_partitions': partitions,
+        'disk_usage': usage,
+        'sensors_temperatures': _call(getattr(psutil, 'sensors_temperatures', dict)),
+        'sensors_fans': _call(getattr(psutil, 'sensors_fans', dict)),
+        'sensors_battery': _call(getattr(psutil, 'sensors_battery', lambda: None)),
+        'net_if_addrs': psutil.net_if_addrs(),
+        'net_connections': _call(psutil.net_connections, kind='tcp'),
+        'processes': processes,
+        'gpus': gpus,
+        'gputil': [
+            {'id': gpu.id, 'name': gpu.name, 'driver': gpu.driver}
+            for gpu in (_call(GPUtil.getGPUs) or []) if hasattr(gpu, 'id')
+        ],
+        'cpuinfo': _call(cpuinfo.get_cpu_info),
+        'cgroup': _call(read_own_cgroup),
+        'pressure': _call(read_system_pressure),
+    }
+    with open(path, 'w') as f:
+        json.dump(encode(fixture), f)
+    return fixture
+
+
+def _advance(first, second, step):
+    # Linear extrapolation of a counter reading: first + step * (second - first)
+    if isinstance(first, tuple) and hasattr(first, '_fields'):
+        return type(first)(*(
+            value + step * (later - value) if isinstance(value, (int, float)) else value
+            for value, later in zip(first, second)
+        ))
+    if isinstance(first, dict):
+        return {key: _advance(value, second[key], step) for key, value in first.items() if key in second}
+    if isinstance(first, list):
+        return [_advance(value, later, step) for value, later in zip(first, second)]
+    return first
+
+
+def _result(value, pid=None):
+    if isinstance(value, dict) and '__error__' in value:
+        error = getattr(psutil, value['__error__'], None)
+        if isinstance(error, type) and issubclass(error, psutil.Error):
+            raise error(pid) if pid is not None else error()
+        raise OSError(value['__error__'])
+    return value
+
+
+class ReplayProcess:
+    def __init__(self, pid, info):
+        self.pid = pid
+        self._info = info
+
+    def __getattr__(self, name):
+        if name not in PROCESS_ATTRIBUTES:
+            raise AttributeError(name)
+        value = self._info.get(name)
+        return lambda *args, **kwargs: _result(value, self.pid)
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def is_running(self):
+        return True
+
+
+class ReplayGpuBackend:
+    name = 'replay'
+
+    def __init__(self, gpus):
+        self.gpus = tuple(gpus or ())
+
+    def sample(self):
+        return self.gpus
+
+    def close(self):
+        pass
+
+
+class Replay:
+    """
+    Installs a recorded fixture in place of psutil, GPUtil, py-cpuinfo and
+    the cgroup/PSI readers. Counters advance by the recorded delta on
+    every sampler tick; everything else reads the same on every call.
+    """
+
+    def __init__(self, fixture):
+        self.fixture = fixture
+        self.tick = 0
+        self._saved = []
+
+    def install(self):
+        import GPUtil
+        import cpuinfo
+        import cgroups
+        import sampler
+
+        fixture = self.fixture
+        processes = {int(pid): info for pid, info in fixture['processes'].items()}
+
+        def cpu_times(percpu=False):
+            if not percpu:
+                self.tick += 1
+            return self._counter('cpu_times_percpu' if percpu else 'cpu_times')
+
+        real_process = psutil.Process
+
+        def process(pid=None):
+            # psutil.Process() is the benchmark itself (e.g. /api/self/stats)
+            if pid is None:
+                return real_process()
+            if pid not in processes:
+                raise psutil.NoSuchProcess(pid)
+            return ReplayProcess(pid, processes[pid])
+
+        def disk_usage(path):
+            if path not in fixture['disk_usage']:
+                raise FileNotFoundError(path)
+            return _result(fixture['disk_usage'][path])
+
+        patches = [
+            (psutil, 'cpu_times', cpu_times),
+            (psutil, 'cpu_stats', lambda: self._counter('cpu_stats')),
+            (psutil, 'net_io_counters', lambda pernic=False: self._counter('net_io_pernic' if pernic else 'net_io')),
+            (psutil, 'disk_io_counters',
+             lambda perdisk=False: self._counter('disk_io_perdisk' if perdisk else 'disk_io')),
+            (psutil, 'getloadavg', lambda: _result(fixture['getloadavg'])),
+            (psutil, 'virtual_memory', lambda: fixture['virtual_memory']),
+            (psutil, 'swap_memory', lambda: fixture['swap_memory']),
+            (psutil, 'cpu_freq', lambda percpu=False: _result(fixture['cpu_freq'])),
+            (psutil, 'cpu_count', lambda logical=True: fixture['cpu_count']['logical' if logical else 'physical']),
+            (psutil, 'boot_time', lambda: fixture['boot_time']),
+            (psutil, 'disk_partitions', lambda all=False: fixture['disk_partitions']),
+            (psutil, 'disk_usage', disk_usage),
+            (psutil, 'sensors_temperatures', lambda fahrenheit=False: _result(fixture['sensors_temperatures'])),
+            (psutil, 'sensors_fans', lambda: _result(fixture['sensors_fans'])),
+            (psutil, 'sensors_battery', lambda: _result(fixture['sensors_battery'])),
+            (psutil, 'net_if_addrs', lambda: fixture['net_if_addrs']),
+            (psutil, 'net_connections', lambda kind='inet': _result(fixture['net_connections'])),
+            (psutil, 'pids', lambda: sorted(processes)),
+            (psutil, 'Process', process),
+            (GPUtil, 'getGPUs', lambda: [SimpleNamespace(**gpu) for gpu in fixture['gputil']]),
+            (cpuinfo, 'get_cpu_info', lambda: _result(fixture['cpuinfo'])),
+            (sampler, 'read_own_cgroup', lambda: _result(fixture['cgroup'])),
+            (sampler, 'read_system_pressure', lambda: _result(fixture['pressure'])),
+            # The cgroup tree is not recorded; an empty root disables the walk
+            (cgroups, '_root', ''),
+        ]
+        for module, name, value in patches:
+            self._saved.append((module, name, getattr(module, name, None)))
+            setattr(module, name, value)
+
+    def uninstall(self):
+        for module, name, value in reversed(self._saved):
+            setattr(module, name, value)
+        self._saved = []
+
+    def _counter(self, name):
+        first, second = self.fixture['counters']
+        return _advance(first[name], second[name], self.tick)
+
+
+def load_fixture(path):
+    with open(path) as f:
+        return decode(json.load(f))
+
+
+def summarize(timings_ns):
+    ordered = sorted(timings_ns)
+    count = len(ordered)
+    stats = {
+        'count': count,
+        'min_us': round(ordered[0] / 1000, 2),
+        'mean_us': round(sum(ordered) / count / 1000, 2),
+        'max_us': round(ordered[-1] / 1000, 2),
+    }
+    for pct in PERCENTILES:
+        index = min(max(-(-pct * count // 100) - 1, 0), count - 1)
+        stats[f'p{pct}_us'] = round(ordered[index] / 1000, 2)
+    return stats
+
+
+def measure(func, iterations=DEFAULT_ITERATIONS, warmup=DEFAULT_WARMUP, before=None):
+    """
+    Latency percentiles over iterations calls, then peak and retained
+    memory per call from a shorter traced pass. before() runs untimed
+    ahead of every call (e.g. to empty a cache).
+    """
+    for _ in range(warmup):
+        if before:
+            before()
+        func()
+    timings = []
+    for _ in range(iterations):
+        if before:
+            before()
+        start = time.perf_counter_ns()
+        func()
+        timings.append(time.perf_counter_ns() - start)
+    stats = summarize(timings)
+
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(iterations, ALLOCATION_ITERATIONS)):
+            if before:
+                before()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            func()
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+            retained.append(after - current)
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    retained.sort()
+    stats['alloc_peak_bytes'] = peaks[len(peaks) // 2]
+    stats['alloc_retained_bytes'] = retained[len(retained) // 2]
+    return stats
+
+
+def collector_benchmarks(app_module, iterations, warmup):
+    import hardware_info
+    import sampler
+
+    results = {}
+    print("Collectors")
+    for name in HARDWARE_COLLECTORS:
+        results[f'hardware_info.{name}'] = measure(getattr(hardware_info, name), iterations, warmup)
+    monitor = app_module.advanced_monitor
+    for name, method in inspect.getmembers(monitor, inspect.ismethod):
+        if not name.startswith('get_') or name in SKIPPED_METHODS:
+            continue
+        parameters = inspect.signature(method).parameters.values()
+        if any(p.default is p.empty and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY) for p in parameters):
+            continue
+        results[f'AdvancedMonitoring.{name}'] = measure(method, iterations, warmup)
+    # One full tick: collection plus every listener (history, processes,
+    # alerts, disk latency, cgroups)
+    results['sampler.tick'] = measure(sampler.resource_sampler.sample_now, max(iterations // 10, 10), 2)
+    for name, stats in results.items():
+        print(f"  {name:50s} p50 {stats['p50_us']:>10.1f} us  p99 {stats['p99_us']:>10.1f} us")
+    return results
+
+
+def benchmark_routes(app_module):
+    routes = []
+    for rule in app_module.app.url_map.iter_rules():
+        if 'GET' not in rule.methods or rule.arguments or rule.endpoint == 'static':
+            continue
+        if rule.rule in SKIPPED_ROUTES or rule.rule == '/':
+            continue
+        routes.append(rule.rule)
+    return sorted(routes)
+
+
+def route_benchmarks(app_module, iterations, warmup):
+    client = app_module.app.test_client()
+    cache = app_module.response_cache
+    results = {}
+    print("Routes (cold: cache emptied before every call, warm: cached)")
+    for route in benchmark_routes(app_module):
+        response = client.get(route)
+        results[route] = {
+            'status': response.status_code,
+            'bytes': len(response.data),
+            'cold': measure(lambda: client.get(route), iterations, warmup, before=cache.clear),
+            'warm': measure(lambda: client.get(route), iterations, warmup),
+        }
+        print(f"  {route:50s} cold p50 {results[route]['cold']['p50_us']:>10.1f} us  "
+              f"warm p50 {results[route]['warm']['p50_us']:>10.1f} us  {results[route]['bytes']} B")
+    return results
+
+
+def throughput_benchmark(app_module, clients, duration, tick_interval=1.0):
+    """
+    clients threads each poll DASHBOARD_ENDPOINTS in a loop, revalidating
+    with If-None-Match like a browser, while the sampler ticks.
+    """
+    import sampler
+
+    stop = threading.Event()
+    timings = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def client_loop():
+        client = app_module.app.test_client()
+        etags = {}
+        local = []
+        while not stop.is_set():
+            for route in DASHBOARD_ENDPOINTS:
+                headers = {'Accept-Encoding': 'gzip'}
+                if route in etags:
+                    headers['If-None-Match'] = etags[route]
+                start = time.perf_counter_ns()
+                response = client.get(route, headers=headers)
+                local.append(time.perf_counter_ns() - start)
+                if response.headers.get('ETag'):
+                    etags[route] = response.headers['ETag']
+                with lock:
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        with lock:
+            timings.extend(local)
+
+    def ticker():
+        while not stop.wait(tick_interval):
+            sampler.resource_sampler.sample_now()
+
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    threads.append(threading.Thread(target=ticker))
+    # os.times rather than psutil, which may be replaying a fixture
+    cpu_before = os.times()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    cpu_after = os.times()
+
+    result = summarize(timings)
+    result.update({
+        'clients': clients,
+        'duration_s': round(elapsed, 2),
+        'requests_per_sec': round(len(timings) / elapsed, 1),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'cpu_seconds': round((cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system), 2)
+    })
+    print(f"Throughput: {result['requests_per_sec']} req/s with {clients} clients, "
+          f"p50 {result['p50_us']} us, p99 {result['p99_us']} us")
+    return result
+
+
+def flatten(results):
+    # {"collectors/<name>": p50, "routes/<route>/cold": p50, ...}
+    flat = {}
+    for name, stats in results.get('collectors', {}).items():
+        flat[f'collectors/{name}'] = stats['p50_us']
+    for route, stats in results.get('routes', {}).items():
+        flat[f'routes/{route}/cold'] = stats['cold']['p50_us']
+        flat[f'routes/{route}/warm'] = stats['warm']['p50_us']
+    if 'throughput' in results:
+        flat['throughput/p50'] = results['throughput']['p50_us']
+    return flat
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Return the p50 latencies that grew by more than threshold."""
+    before = flatten(baseline)
+    regressions = []
+    for name, value in flatten(current).items():
+        previous = before.get(name)
+        if previous and value > MIN_COMPARED_US and value > previous * (1 + threshold):
+            regressions.append({'name': name, 'baseline_us': previous, 'current_us': value,
+                                'change': round(value / previous - 1, 3)})
+    baseline_rps = baseline.get('throughput', {}).get('requests_per_sec')
+    current_rps = current.get('throughput', {}).get('requests_per_sec')
+    if baseline_rps and current_rps and current_rps < baseline_rps * (1 - threshold):
+        regressions.append({'name': 'throughput/requests_per_sec', 'baseline': baseline_rps,
+                            'current': current_rps, 'change': round(current_rps / baseline_rps - 1, 3)})
+    return regressions
+
+
+def run(args):
+    replay = None
+    if args.fixture:
+        replay = Replay(load_fixture(args.fixture))
+        replay.install()
+
+    import sampler
+    from procfs import PsutilBackend
+
+    # A sampler that only ticks when told to, so timings are not disturbed
+    # by a background thread; with a fixture it reads through psutil
+    bench_sampler = sampler.ResourceSampler(
+        backend=PsutilBackend() if replay else None,
+        gpu_backend=ReplayGpuBackend(replay.fixture['gpus']) if replay else None
+    )
+    sampler.use_sampler(bench_sampler)
+    workdir = tempfile.mkdtemp(prefix='hwmon-bench-')
+    cwd = os.getcwd()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+    try:
+        app_module = importlib.import_module('app')
+        bench_sampler.stop()
+        for _ in range(3):
+            bench_sampler.sample_now()
+
+        results = {
+            'meta': {
+                'timestamp': time.time(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'fixture': os.path.abspath(args.fixture) if args.fixture else None,
+                'json_provider': type(app_module.app.json).__name__,
+                'iterations': args.iterations
+            }
+        }
+        sections = set(args.only.split(',')) if args.only else {'collectors', 'routes', 'throughput'}
+        if 'collectors' in sections:
+            results['collectors'] = collector_benchmarks(app_module, args.iterations, args.warmup)
+        if 'routes' in sections:
+            results['routes'] = route_benchmarks(app_module, args.iterations, args.warmup)
+        if 'throughput' in sections:
+            results['throughput'] = throughput_benchmark(app_module, args.clients, args.duration)
+        app_module.advanced_monitor.stop_resource_monitoring()
+    finally:
+        os.chdir(cwd)
+        if replay:
+            replay.uninstall()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']}: {regression['change']:+.0%}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hardware monitor collectors and routes')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help='record this machine as a replay fixture')
+    record_parser.add_argument('path')
+    record_parser.add_argument('--gap', type=float, default=1.0, help='seconds between the two counter frames')
+
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--fixture', help='replay a recorded fixture instead of the live machine')
+    run_parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    run_parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP)
+    run_parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS)
+    run_parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='throughput run in seconds')
+    run_parser.add_argument('--only', help='comma separated: collectors,routes,throughput')
+    run_parser.add_argument('--output', help='write results as JSON')
+    run_parser.add_argument('--compare', help='baseline results JSON to check for regressions')
+    run_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'record':
+        record(args.path, args.gap)
+        print(f"Fixture written to {args.path}")
+        return 0
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
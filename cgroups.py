@@ -0,0 +1,315 @@
+import os
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+# Raw counters of one cgroup v2 directory; limits are None when unset
+scgroup = namedtuple('scgroup', [
+    'path', 'usage_usec', 'nr_periods', 'nr_throttled', 'throttled_usec', 'cpu_limit',
+    'memory_current', 'memory_max', 'swap_current', 'oom_kills',
+    'io_read_bytes', 'io_write_bytes', 'io_reads', 'io_writes', 'pressure'
+])
+# One line of a PSI file; avgN are percentages, total is stalled microseconds
+spsi = namedtuple('spsi', ['avg10', 'avg60', 'avg300', 'total'])
+
+PRESSURE_RESOURCES = ('cpu', 'memory', 'io')
+SYSTEM_PRESSURE_DIR = '/proc/pressure'
+DEFAULT_ROOT = '/sys/fs/cgroup'
+# Levels below the root walked when listing cgroups (enough for
+# system.slice/docker-<id>.scope and most Kubernetes pod layouts)
+MAX_DEPTH = 4
+# Seconds between readings of the whole cgroup tree
+UPDATE_INTERVAL = 5.0
+# Seconds between re-listing the cgroup directories
+SCAN_INTERVAL = 60.0
+SORT_KEYS = {
+    'cpu': lambda row: row['cpu_percent'],
+    'memory': lambda row: row['memory_current'] or 0,
+    'throttled': lambda row: row['throttled_percent'],
+    'pressure': lambda row: max(
+        (stall['some']['stall_percent'] for stall in row['pressure'].values()), default=0.0
+    ),
+}
+
+_root = None
+
+
+def cgroup2_root():
+    # Mount point of the unified hierarchy ("/sys/fs/cgroup", or
+    # "/sys/fs/cgroup/unified" on hybrid systems); None without cgroup v2
+    global _root
+    if _root is None:
+        _root = ''
+        try:
+            with open('/proc/self/mountinfo') as f:
+                for line in f:
+                    fields = line.split()
+                    separator = fields.index('-')
+                    if fields[separator + 1] == 'cgroup2':
+                        _root = fields[4]
+                        break
+        except (OSError, ValueError, IndexError):
+            if os.path.exists(os.path.join(DEFAULT_ROOT, 'cgroup.controllers')):
+                _root = DEFAULT_ROOT
+    return _root or None
+
+
+def own_cgroup():
+    # Path of this process's cgroup relative to the root, e.g. "/docker/<id>"
+    try:
+        with open('/proc/self/cgroup') as f:
+            for line in f:
+                if line.startswith('0::'):
+                    return line[3:].strip() or '/'
+    except OSError:
+        pass
+    return None
+
+
+def _read(directory, name):
+    try:
+        with open(os.path.join(directory, name)) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _flat_keyed(text):
+    values = {}
+    for line in (text or '').splitlines():
+        key, _, value = line.partition(' ')
+        if value.strip().isdigit():
+            values[key] = int(value)
+    return values
+
+
+def _limit(text):
+    if text is None:
+        return None
+    text = text.strip()
+    return None if text == 'max' or not text.isdigit() else int(text)
+
+
+def parse_pressure(text):
+    """
+    "some avg10=0.00 avg60=0.00 avg300=0.00 total=0" lines ->
+    {'some': spsi, 'full': spsi}
+    """
+    pressure = {}
+    for line in (text or '').splitlines():
+        kind, *fields = line.split()
+        values = dict(field.split('=', 1) for field in fields)
+        try:
+            pressure[kind] = spsi(
+                float(values['avg10']), float(values['avg60']), float(values['avg300']), int(values['total'])
+            )
+        except (KeyError, ValueError):
+            continue
+    return pressure
+
+
+def read_pressure(directory, template='{}'):
+    # PSI for cpu, memory and io: /proc/pressure/cpu, or cpu.pressure
+    # inside a cgroup directory
+    pressure = {}
+    for resource in PRESSURE_RESOURCES:
+        stalls = parse_pressure(_read(directory, template.format(resource)))
+        if stalls:
+            pressure[resource] = MappingProxyType(stalls)
+    return MappingProxyType(pressure)
+
+
+def read_system_pressure():
+    return read_pressure(SYSTEM_PRESSURE_DIR)
+
+
+def read_cgroup(path, root=None):
+    """
+    Read the counters of the cgroup at path (relative to the cgroup v2
+    root). Controllers that are not enabled for it read as zero or None.
+    """
+    root = root or cgroup2_root()
+    if root is None:
+        return None
+    directory = os.path.join(root, path.lstrip('/'))
+    cpu = _flat_keyed(_read(directory, 'cpu.stat'))
+    if not cpu and not os.path.isdir(directory):
+        return None
+
+    cpu_limit = None
+    cpu_max = (_read(directory, 'cpu.max') or '').split()
+    if len(cpu_max) == 2 and cpu_max[0] != 'max':
+        cpu_limit = int(cpu_max[0]) / int(cpu_max[1])
+
+    io_read = io_write = io_reads = io_writes = 0
+    for line in (_read(directory, 'io.stat') or '').splitlines():
+        # "8:0 rbytes=... wbytes=... rios=... wios=... dbytes=... dios=..."
+        for field in line.split()[1:]:
+            key, _, value = field.partition('=')
+            if key == 'rbytes':
+                io_read += int(value)
+            elif key == 'wbytes':
+                io_write += int(value)
+            elif key == 'rios':
+                io_reads += int(value)
+            elif key == 'wios':
+                io_writes += int(value)
+
+    return scgroup(
+        path=path,
+        usage_usec=cpu.get('usage_usec', 0),
+        nr_periods=cpu.get('nr_periods', 0),
+        nr_throttled=cpu.get('nr_throttled', 0),
+        throttled_usec=cpu.get('throttled_usec', 0),
+        cpu_limit=cpu_limit,
+        memory_current=_limit(_read(directory, 'memory.current')),
+        memory_max=_limit(_read(directory, 'memory.max')),
+        swap_current=_limit(_read(directory, 'memory.swap.current')),
+        oom_kills=_flat_keyed(_read(directory, 'memory.events')).get('oom_kill', 0),
+        io_read_bytes=io_read,
+        io_write_bytes=io_write,
+        io_reads=io_reads,
+        io_writes=io_writes,
+        pressure=read_pressure(directory, '{}.pressure')
+    )
+
+
+def read_own_cgroup():
+    path = own_cgroup()
+    return read_cgroup(path) if path is not None else None
+
+
+def pressure_rates(before, after, elapsed):
+    # {'cpu': {'some': {avg10, avg60, stall_percent}, ...}, ...}
+    rates = {}
+    for resource, stalls in after.items():
+        previous = before.get(resource, {}) if before else {}
+        rates[resource] = {}
+        for kind, psi in stalls.items():
+            stall_percent = 0.0
+            if kind in previous and elapsed > 0:
+                stall_percent = max(psi.total - previous[kind].total, 0) / (elapsed * 1e6) * 100
+            rates[resource][kind] = {
+                'avg10': psi.avg10,
+                'avg60': psi.avg60,
+                'stall_percent': round(min(stall_percent, 100.0), 2)
+            }
+    return rates
+
+
+def cgroup_rates(before, after, elapsed):
+    usage = max(after.usage_usec - before.usage_usec, 0) / (elapsed * 1e6) * 100
+    periods = after.nr_periods - before.nr_periods
+    throttled = after.nr_throttled - before.nr_throttled
+    memory_percent = None
+    if after.memory_max and after.memory_current is not None:
+        memory_percent = round(after.memory_current / after.memory_max * 100, 1)
+    return {
+        'path': after.path,
+        # Percent of one CPU, so 250 means two and a half cores busy
+        'cpu_percent': round(usage, 1),
+        'cpu_limit': after.cpu_limit,
+        'cpu_limit_percent': round(usage / after.cpu_limit, 1) if after.cpu_limit else None,
+        'throttled_percent': round(throttled / periods * 100, 1) if periods > 0 else 0.0,
+        'throttled_ms_per_sec': round(max(after.throttled_usec - before.throttled_usec, 0) / 1000 / elapsed, 2),
+        'memory_current': after.memory_current,
+        'memory_max': after.memory_max,
+        'memory_percent': memory_percent,
+        'swap_current': after.swap_current,
+        'oom_kills': after.oom_kills,
+        'io_read_bytes_per_sec': round(max(after.io_read_bytes - before.io_read_bytes, 0) / elapsed, 1),
+        'io_write_bytes_per_sec': round(max(after.io_write_bytes - before.io_write_bytes, 0) / elapsed, 1),
+        'pressure': pressure_rates(before.pressure, after.pressure, elapsed)
+    }
+
+
+class CgroupMonitor:
+    """
+    Per-cgroup CPU usage and throttling, memory against its limit, I/O
+    throughput and pressure stall rates for every cgroup down to MAX_DEPTH
+    levels, plus system-wide PSI. Driven by the sampler but reads the tree
+    at most every UPDATE_INTERVAL seconds.
+    """
+
+    def __init__(self, root=None, max_depth=MAX_DEPTH, update_interval=UPDATE_INTERVAL):
+        self.root = root
+        self.max_depth = max_depth
+        self.update_interval = update_interval
+        self._paths = []
+        self._last_scan = None
+        self._previous = {}
+        self._current = {}
+        self._pressure = (None, None)
+        self._system_pressure = {}
+        self._lock = threading.Lock()
+
+    def attach(self, sampler):
+        sampler.add_listener(self.update)
+
+    def detach(self, sampler):
+        sampler.remove_listener(self.update)
+
+    def update(self, snapshot):
+        # System PSI comes with snapshots that collected the cgroup group
+        if snapshot.pressure and 'cgroup' in snapshot.fresh:
+            timestamp, previous = self._pressure
+            elapsed = snapshot.timestamp - timestamp if timestamp is not None else 0
+            self._system_pressure = pressure_rates(previous, snapshot.pressure, elapsed)
+            self._pressure = (snapshot.timestamp, snapshot.pressure)
+
+        root = self.root or cgroup2_root()
+        if root is None:
+            return
+        now = snapshot.timestamp
+        last = max((sample[0] for sample in self._previous.values()), default=None)
+        if last is not None and now - last < self.update_interval:
+            return
+        if self._last_scan is None or now - self._last_scan >= SCAN_INTERVAL:
+            self._paths = self._scan(root)
+            self._last_scan = now
+
+        current = {}
+        previous = {}
+        for path in self._paths:
+            sample = read_cgroup(path, root)
+            if sample is None:
+                continue
+            previous[path] = (now, sample)
+            before = self._previous.get(path)
+            if before is not None and now > before[0]:
+                current[path] = cgroup_rates(before[1], sample, now - before[0])
+        with self._lock:
+            self._previous = previous
+            self._current = current
+
+    def _scan(self, root):
+        paths = []
+        root_depth = root.rstrip('/').count('/')
+        for directory, subdirectories, _ in os.walk(root):
+            depth = directory.rstrip('/').count('/') - root_depth
+            if depth >= self.max_depth:
+                subdirectories[:] = []
+            relative = '/' + os.path.relpath(directory, root).replace(os.sep, '/')
+            paths.append('/' if relative == '/.' else relative)
+        return paths
+
+    def get_cgroups(self, sort='cpu', limit=None, prefix=None):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        with self._lock:
+            rows = list(self._current.values())
+        if prefix:
+            rows = [row for row in rows if row['path'].startswith(prefix)]
+        rows.sort(key=SORT_KEYS[sort], reverse=True)
+        return rows[:limit] if limit else rows
+
+    def get_cgroup(self, path):
+        with self._lock:
+            return self._current.get(path)
+
+    def get_own(self):
+        path = own_cgroup()
+        return self.get_cgroup(path) if path is not None else None
+
+    def get_system_pressure(self):
+        return self._system_pressure
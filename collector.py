@@ -0,0 +1,225 @@
+import functools
+import os
+import pickle
+import socket
+import struct
+import threading
+
+from advanced_monitoring import AdvancedMonitoring
+from fleet import FleetCollector
+from hardware_info import get_performance_report
+from instrumentation import self_stats
+from reports import ReportJobs
+import shared_snapshot  # registers pickling of read-only mappings
+from sampler import resource_sampler
+from static_info import static_facts
+
+# Set by serve.py for worker processes
+COLLECTOR_SOCKET_ENV = 'HWMON_COLLECTOR_SOCKET'
+SNAPSHOT_SHM_ENV = 'HWMON_SNAPSHOT_SHM'
+# Address the central instance accepts fleet agents on (fleet.py)
+FLEET_LISTEN_ENV = 'HWMON_FLEET_LISTEN'
+
+_LENGTH = struct.Struct('<I')
+
+
+def build_monitoring():
+    """
+    Create and start the collection stack: shared sampler, monitoring,
+    process table, alerts, report jobs and, when HWMON_FLEET_LISTEN is set,
+    the fleet listener. Runs in exactly one process, the dev server or the
+    serve.py collector.
+    """
+    monitor = AdvancedMonitoring()
+    reports = ReportJobs()
+    reports.register('performance', get_performance_report, 'performance_report')
+    reports.register('historical', monitor.build_historical_report, 'historical_report')
+
+    # Collect static hardware facts off the request path
+    static_facts.warm()
+    # Start the shared sampler once; every endpoint reads its latest snapshot
+    resource_sampler.start()
+    monitor.start_resource_monitoring()
+    monitoring = {
+        'monitor': monitor,
+        'process_table': monitor.process_table,
+        'alerts': monitor.alerts,
+        'reports': reports,
+        'self_stats': self_stats,
+        # Workers call touch() so clients keep it at the base rate
+        'sampler': resource_sampler
+    }
+    if os.environ.get(FLEET_LISTEN_ENV):
+        monitoring['fleet'] = FleetCollector(os.environ[FLEET_LISTEN_ENV])
+        monitoring['fleet'].start()
+    return monitoring
+
+
+def _send(sock, value):
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _receive(sock):
+    header = _receive_exact(sock, _LENGTH.size)
+    if header is None:
+        return None
+    data = _receive_exact(sock, _LENGTH.unpack(header)[0])
+    return pickle.loads(data) if data is not None else None
+
+
+def _receive_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+class CollectorServer:
+    """
+    Unix socket endpoint of the collector process. Workers call public
+    methods of the registered objects (monitor, process table, alerts,
+    report jobs) so stateful data such as history, scan jobs and report
+    jobs exists once, whichever worker serves the request.
+    """
+
+    def __init__(self, path, objects):
+        self.path = path
+        self.objects = dict(objects)
+        if os.path.exists(path):
+            os.remove(path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Requests are pickles, so only the owning user may connect; the
+        # socket file is created owner-only rather than chmod-ed after bind
+        umask = os.umask(0o177)
+        try:
+            self._socket.bind(path)
+        finally:
+            os.umask(umask)
+        self._socket.listen(64)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept, name='collector-server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._socket.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            thread = threading.Thread(target=self._serve, args=(conn,), name='collector-connection')
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = _receive(conn)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    return
+                if request is None:
+                    return
+                try:
+                    result = ('ok', self._dispatch(*request))
+                except Exception as e:
+                    result = ('error', e)
+                try:
+                    _send(conn, result)
+                except (pickle.PicklingError, TypeError, AttributeError) as e:
+                    _send(conn, ('error', RuntimeError(str(e))))
+                except OSError:
+                    return
+
+    def _dispatch(self, target, method, args, kwargs):
+        obj = self.objects.get(target)
+        if obj is None or method.startswith('_'):
+            raise AttributeError(f"Unknown collector call: {target}.{method}")
+        func = getattr(obj, method)
+        if not callable(func):
+            raise AttributeError(f"Unknown collector call: {target}.{method}")
+        return func(*args, **kwargs)
+
+
+class CollectorClient:
+    # One connection per worker thread, re-established if the collector restarts
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def call(self, target, method, *args, **kwargs):
+        return self_stats.call('rpc', f'{target}.{method}', self._call, target, method, args, kwargs)
+
+    def _call(self, target, method, args, kwargs):
+        # Retried only when the request could not be sent, e.g. on a
+        # connection left over from a restarted collector. Once it is sent
+        # the collector may have run it, and calls such as reports.start
+        # must not run twice, so later failures are raised.
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send(sock, (target, method, args, kwargs))
+                break
+            except OSError:
+                self._disconnect()
+                if attempt:
+                    raise
+        try:
+            response = _receive(sock)
+        except (OSError, EOFError):
+            self._disconnect()
+            raise
+        if response is None:
+            self._disconnect()
+            raise ConnectionError("Collector closed the connection")
+        status, value = response
+        if status == 'error':
+            raise value
+        return value
+
+    def proxy(self, target):
+        return RemoteObject(self, target)
+
+    def _connection(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+class RemoteObject:
+    """Calls on this object run on the collector's object of the same name."""
+
+    def __init__(self, client, target):
+        self._client = client
+        self._target = target
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return functools.partial(self._client.call, self._target, name)
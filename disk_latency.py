@@ -0,0 +1,174 @@
+import math
+import os
+import threading
+from collections import deque
+
+from procfs import sdiskstats
+
+# Rolling windows (in seconds) for the percentiles
+LATENCY_WINDOWS = (('1m', 60), ('5m', 300))
+PERCENTILES = (50, 99)
+# Utilisation (%) above which a device is reported as busy / saturated
+BUSY_UTILIZATION = 60
+SATURATED_UTILIZATION = 90
+
+
+def percentile(values, pct):
+    # Nearest-rank percentile of an unsorted sequence
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+class _DeviceWindow:
+    # (timestamp, value) pairs; the sampler's tick period varies, so the
+    # windows are pruned by age rather than by count
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.read_latency = deque()
+        self.write_latency = deque()
+        self.utilization = deque()
+        self.queue_size = deque()
+
+    def prune(self, now):
+        cutoff = now - self.seconds
+        for samples in (self.read_latency, self.write_latency, self.utilization, self.queue_size):
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+
+    @staticmethod
+    def since(samples, cutoff):
+        return [value for timestamp, value in samples if timestamp >= cutoff]
+
+
+class DiskLatencyMonitor:
+    """
+    Per-device latency, utilisation and queue depth derived from successive
+    /proc/diskstats readings (or psutil per-disk counters elsewhere), with
+    p50/p99 over rolling windows.
+    """
+
+    def __init__(self):
+        self._previous = {}
+        self._windows = {}
+        self._current = {}
+        self._window_seconds = max(seconds for _, seconds in LATENCY_WINDOWS)
+        self._lock = threading.Lock()
+
+    def attach(self, sampler):
+        sampler.add_listener(self.update)
+
+    def detach(self, sampler):
+        sampler.remove_listener(self.update)
+
+    def update(self, snapshot):
+        # Counters carried over from an earlier tick would read as idle
+        if 'disk_io' not in snapshot.fresh:
+            return
+        stats = snapshot.disk_stats or {name: self._from_psutil(io) for name, io in snapshot.disk_io_perdisk.items()}
+        current = {}
+        with self._lock:
+            for name, sample in stats.items():
+                previous = self._previous.get(name)
+                self._previous[name] = (snapshot.timestamp, sample)
+                if previous is None:
+                    continue
+                elapsed = snapshot.timestamp - previous[0]
+                if elapsed <= 0:
+                    continue
+                metrics = self._compute(previous[1], sample, elapsed)
+                if metrics is None:
+                    continue
+
+                window = self._windows.get(name)
+                if window is None:
+                    window = self._windows[name] = _DeviceWindow(self._window_seconds)
+                now = snapshot.timestamp
+                if metrics['reads_per_sec']:
+                    window.read_latency.append((now, metrics['read_latency_ms']))
+                if metrics['writes_per_sec']:
+                    window.write_latency.append((now, metrics['write_latency_ms']))
+                window.utilization.append((now, metrics['utilization']))
+                window.queue_size.append((now, metrics['avg_queue_size']))
+                window.prune(now)
+                current[name] = metrics
+
+            for name in list(self._previous):
+                if name not in stats:
+                    del self._previous[name]
+                    self._windows.pop(name, None)
+            self._current = current
+
+    def get_devices(self, include_idle=False):
+        with self._lock:
+            devices = {}
+            for name, metrics in self._current.items():
+                window = self._windows[name]
+                if (not include_idle and not any(value for _, value in window.utilization)
+                        and not window.read_latency and not window.write_latency):
+                    continue
+                # Windows end at the device's latest sample
+                now = self._previous[name][0]
+                since = window.since
+                device = dict(metrics)
+                device['windows'] = {
+                    label: {
+                        'read_latency_ms': self._percentiles(since(window.read_latency, now - seconds)),
+                        'write_latency_ms': self._percentiles(since(window.write_latency, now - seconds)),
+                        'utilization': self._percentiles(since(window.utilization, now - seconds)),
+                        'avg_queue_size': self._percentiles(since(window.queue_size, now - seconds))
+                    }
+                    for label, seconds in LATENCY_WINDOWS
+                }
+                short_util = device['windows'][LATENCY_WINDOWS[0][0]]['utilization']['p50'] or 0
+                if short_util >= SATURATED_UTILIZATION:
+                    device['status'] = 'Saturated'
+                elif short_util >= BUSY_UTILIZATION:
+                    device['status'] = 'Busy'
+                else:
+                    device['status'] = 'OK'
+                devices[name] = device
+            return devices
+
+    def get_device(self, device):
+        # Accepts "sda" or "/dev/sda"
+        return self.get_devices(include_idle=True).get(os.path.basename(device))
+
+    @staticmethod
+    def _compute(before, after, elapsed):
+        reads = after.reads - before.reads
+        writes = after.writes - before.writes
+        if reads < 0 or writes < 0:
+            # Counters were reset; wait for the next pair of samples
+            return None
+        elapsed_ms = elapsed * 1000
+        io_ms = max(after.io_ms - before.io_ms, 0)
+        weighted_ms = max(after.weighted_ms - before.weighted_ms, 0)
+        return {
+            'reads_per_sec': round(reads / elapsed, 2),
+            'writes_per_sec': round(writes / elapsed, 2),
+            'read_bytes_per_sec': round((after.sectors_read - before.sectors_read) * 512 / elapsed, 1),
+            'write_bytes_per_sec': round((after.sectors_written - before.sectors_written) * 512 / elapsed, 1),
+            'read_merges_per_sec': round(max(after.reads_merged - before.reads_merged, 0) / elapsed, 2),
+            'write_merges_per_sec': round(max(after.writes_merged - before.writes_merged, 0) / elapsed, 2),
+            'read_latency_ms': round(max(after.read_ms - before.read_ms, 0) / reads, 3) if reads else 0.0,
+            'write_latency_ms': round(max(after.write_ms - before.write_ms, 0) / writes, 3) if writes else 0.0,
+            'utilization': round(min(io_ms / elapsed_ms * 100, 100.0), 1),
+            'avg_queue_size': round(weighted_ms / elapsed_ms, 3),
+            'in_flight': after.in_flight
+        }
+
+    @staticmethod
+    def _from_psutil(io):
+        # Portable fallback: psutil has no in-flight or weighted time counters
+        return sdiskstats(
+            io.read_count, getattr(io, 'read_merged_count', 0), io.read_bytes // 512, io.read_time,
+            io.write_count, getattr(io, 'write_merged_count', 0), io.write_bytes // 512, io.write_time,
+            0, getattr(io, 'busy_time', 0), 0
+        )
+
+    @staticmethod
+    def _percentiles(values):
+        return {f'p{pct}': percentile(values, pct) for pct in PERCENTILES}
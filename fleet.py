@@ -0,0 +1,482 @@
+"""
+Fleet mode: agents ship a compact record per sampler tick to one central
+instance, which keeps a ring buffer per host and serves fleet-wide rollups.
+
+    # central (dashboard + fleet listener), local agents only
+    python serve.py --fleet-listen unix:/run/hwmon-fleet.sock
+    python fleet.py --central unix:/run/hwmon-fleet.sock
+
+Listen on loopback or a Unix socket unless agents really are remote. A
+TCP listener on any other address needs a shared token, which agents
+send in their HELLO; set it in the environment of both sides:
+
+    HWMON_FLEET_TOKEN=... python serve.py --fleet-listen 0.0.0.0:5070
+    HWMON_FLEET_TOKEN=... python fleet.py --central central-host:5070
+
+Several agents can run on one machine with distinct --host-id values.
+Addresses are "host:port" for TCP or "unix:/path/to.sock".
+"""
+import argparse
+import collections
+import hmac
+import ipaddress
+import json
+import os
+import signal
+import socket
+import struct
+import threading
+import time
+
+from timeseries import RingBuffer
+
+# Per-host columns, one float64 each in the central ring buffers
+FLEET_COLUMNS = (
+    'timestamp', 'cpu', 'mem', 'disk', 'net_tx', 'net_rx',
+    'disk_read', 'disk_write', 'load1', 'mem_used', 'mem_total', 'gpu'
+)
+# Wire format of one record: timestamp as a double, the rest as floats
+RECORD = struct.Struct('<d11f')
+# Frame header: type, payload length
+FRAME = struct.Struct('<BI')
+FRAME_HELLO = 1
+FRAME_BATCH = 2
+FRAME_ACK = 3
+MAX_FRAME_SIZE = 1024 * 1024
+
+DEFAULT_BATCH_SIZE = 10
+# Seconds an agent holds a partial batch before sending it
+DEFAULT_FLUSH_INTERVAL = 5.0
+# Records an agent buffers while the central instance is slow or down;
+# the oldest are dropped beyond this
+MAX_PENDING = 3600
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+# Seconds without a batch after which a host counts as offline
+STALE_AFTER = 30
+# One hour of 1 Hz records per host
+HOST_CAPACITY = 3600
+# Shared secret agents present in HELLO
+FLEET_TOKEN_ENV = 'HWMON_FLEET_TOKEN'
+# Hosts the central instance keeps buffers for (about 350 KB each)
+MAX_HOSTS = 1000
+# Seconds without a batch after which a host's buffer is dropped
+EVICT_AFTER = 3600
+# Seconds an agent connection may stay silent, or a frame take to arrive
+CONNECTION_TIMEOUT = 60
+ROLLUP_FIELDS = ('cpu', 'mem', 'disk', 'net_tx', 'net_rx', 'disk_read', 'disk_write', 'load1', 'gpu')
+
+
+def parse_address(text):
+    # "unix:/path" -> (AF_UNIX, path); "host:port" -> (AF_INET, (host, port))
+    if text.startswith('unix:'):
+        return socket.AF_UNIX, text[len('unix:'):]
+    host, _, port = text.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid fleet address: {text}")
+    return socket.AF_INET, (host.strip('[]'), int(port))
+
+
+def is_local_address(text):
+    # Unix sockets and loopback TCP addresses are only reachable from this machine
+    family, address = parse_address(text)
+    if family == socket.AF_UNIX or address[0] == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(address[0]).is_loopback
+    except ValueError:
+        return False
+
+
+def snapshot_record(snapshot):
+    net = snapshot.net_rates['total']
+    disk = snapshot.disk_rates['total']
+    gpus = [gpu.utilization for gpu in snapshot.gpus if gpu.utilization is not None]
+    return RECORD.pack(
+        snapshot.timestamp,
+        snapshot.cpu_percent,
+        snapshot.memory.percent,
+        snapshot.disk_usage.percent if snapshot.disk_usage else 0.0,
+        net['per_second']['bytes_sent'] if net else 0.0,
+        net['per_second']['bytes_recv'] if net else 0.0,
+        disk['per_second']['read_bytes'] if disk else 0.0,
+        disk['per_second']['write_bytes'] if disk else 0.0,
+        snapshot.load_avg[0] if snapshot.load_avg else 0.0,
+        snapshot.memory.total - snapshot.memory.available,
+        snapshot.memory.total,
+        sum(gpus) / len(gpus) if gpus else 0.0
+    )
+
+
+def _send_frame(sock, frame_type, payload=b''):
+    sock.sendall(FRAME.pack(frame_type, len(payload)) + payload)
+
+
+def _receive_frame(sock):
+    header = _receive_exact(sock, FRAME.size)
+    if header is None:
+        return None, None
+    frame_type, length = FRAME.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ValueError(f"Fleet frame of {length} bytes is too large")
+    payload = _receive_exact(sock, length) if length else b''
+    if payload is None:
+        return None, None
+    return frame_type, payload
+
+
+def _receive_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+class FleetAgent:
+    """
+    Sampler listener that forwards one packed record per tick to the
+    central instance. Records are sent in batches and each batch waits for
+    the central ACK before the next goes out, so a slow central instance
+    slows the agent down instead of being flooded; meanwhile records queue
+    up to MAX_PENDING and the oldest are dropped.
+    """
+
+    def __init__(self, address, host_id=None, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=MAX_PENDING, token=None):
+        self.address = address
+        self.host_id = host_id or socket.gethostname()
+        self.token = token if token is not None else os.environ.get(FLEET_TOKEN_ENV)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sent = 0
+        self.dropped = 0
+        self._pending = collections.deque()
+        self._max_pending = max_pending
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._socket = None
+        self._thread = None
+
+    def attach(self, sampler):
+        sampler.add_listener(self.update)
+
+    def detach(self, sampler):
+        sampler.remove_listener(self.update)
+
+    def update(self, snapshot):
+        record = snapshot_record(snapshot)
+        with self._lock:
+            if len(self._pending) >= self._max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='fleet-agent')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._disconnect()
+
+    def stats(self):
+        return {
+            'host': self.host_id,
+            'connected': self._socket is not None,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'pending': len(self._pending)
+        }
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while not self._stop_event.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            while self._pending and not self._stop_event.is_set():
+                with self._lock:
+                    batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                try:
+                    self._send_batch(batch)
+                    self.sent += len(batch)
+                    delay = RECONNECT_DELAY
+                except (OSError, ValueError) as e:
+                    print(f"Error sending fleet batch to {self.address}: {str(e)}")
+                    self._disconnect()
+                    self._requeue(batch)
+                    self._stop_event.wait(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                    break
+
+    def _requeue(self, batch):
+        with self._lock:
+            room = self._max_pending - len(self._pending)
+            kept = batch[len(batch) - room:] if room < len(batch) else batch
+            self.dropped += len(batch) - len(kept)
+            self._pending.extendleft(reversed(kept))
+
+    def _send_batch(self, batch):
+        if self._socket is None:
+            family, address = parse_address(self.address)
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.settimeout(30)
+            sock.connect(address)
+            hello = {'host': self.host_id, 'columns': FLEET_COLUMNS}
+            if self.token:
+                hello['token'] = self.token
+            hello = json.dumps(hello).encode()
+            _send_frame(sock, FRAME_HELLO, hello)
+            self._socket = sock
+        _send_frame(self._socket, FRAME_BATCH, b''.join(batch))
+        frame_type, _ = _receive_frame(self._socket)
+        if frame_type != FRAME_ACK:
+            raise ConnectionError("Central instance closed the connection")
+
+    def _disconnect(self):
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            except OSError:
+                pass
+            self._socket = None
+
+
+class FleetCollector:
+    """
+    Central side: accepts agent connections and keeps a ring buffer of
+    the last HOST_CAPACITY records per host for fleet-wide rollups. At most
+    max_hosts are tracked; hosts silent for evict_after seconds make room.
+    """
+
+    def __init__(self, address, capacity=HOST_CAPACITY, stale_after=STALE_AFTER, token=None,
+                 max_hosts=MAX_HOSTS, evict_after=EVICT_AFTER, timeout=CONNECTION_TIMEOUT):
+        self.address = address
+        self.capacity = capacity
+        self.stale_after = stale_after
+        self.token = token if token is not None else os.environ.get(FLEET_TOKEN_ENV)
+        self.max_hosts = max_hosts
+        self.evict_after = evict_after
+        self.timeout = timeout
+        if not self.token and not is_local_address(address):
+            raise ValueError(f"Fleet listener on {address} needs {FLEET_TOKEN_ENV}; "
+                             "without a token listen on loopback or a Unix socket")
+        self._hosts = {}
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        family, bind_address = parse_address(address)
+        self._unix_path = bind_address if family == socket.AF_UNIX else None
+        if self._unix_path and os.path.exists(self._unix_path):
+            os.remove(self._unix_path)
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(bind_address)
+        self._socket.listen(128)
+        self._connections = set()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept, name='fleet-collector')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._socket.close()
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._unix_path and os.path.exists(self._unix_path):
+            os.remove(self._unix_path)
+
+    def record(self, host, payload):
+        if len(payload) % RECORD.size:
+            raise ValueError(f"Fleet batch from {host} has a partial record")
+        now = time.time()
+        with self._lock:
+            buffer = self._hosts.get(host)
+            if buffer is None:
+                self._evict(now)
+                if len(self._hosts) >= self.max_hosts:
+                    raise ValueError(f"Fleet host limit of {self.max_hosts} reached; rejected {host}")
+                buffer = self._hosts[host] = RingBuffer(FLEET_COLUMNS, self.capacity)
+            self._last_seen[host] = now
+        last = buffer.last()
+        newest = last['timestamp'] if last else 0.0
+        for values in RECORD.iter_unpack(payload):
+            # A batch re-sent after a lost ACK must not repeat or reorder
+            # samples; the ring buffer is searched by timestamp
+            if values[0] > newest:
+                buffer.append(values)
+                newest = values[0]
+
+    def _evict(self, now):
+        # Caller holds the lock
+        for host, seen in list(self._last_seen.items()):
+            if now - seen > self.evict_after:
+                del self._last_seen[host]
+                del self._hosts[host]
+
+    def _check_token(self, hello):
+        if not self.token:
+            return True
+        token = hello.get('token')
+        return isinstance(token, str) and hmac.compare_digest(token.encode(), self.token.encode())
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return
+            thread = threading.Thread(target=self._serve, args=(conn,), name='fleet-agent-connection')
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+        with conn:
+            try:
+                # A silent or half-sent agent must not hold its thread forever
+                conn.settimeout(self.timeout)
+                frame_type, payload = _receive_frame(conn)
+                if frame_type != FRAME_HELLO:
+                    return
+                hello = json.loads(payload)
+                if not isinstance(hello, dict) or not self._check_token(hello):
+                    print("Rejected fleet agent connection with a wrong or missing token")
+                    return
+                host = str(hello['host'])[:255]
+                while True:
+                    frame_type, payload = _receive_frame(conn)
+                    if frame_type != FRAME_BATCH:
+                        return
+                    self.record(host, payload)
+                    _send_frame(conn, FRAME_ACK)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error in fleet agent connection: {str(e)}")
+            finally:
+                with self._lock:
+                    self._connections.discard(conn)
+
+    def _latest(self):
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            hosts = list(self._hosts.items())
+            last_seen = dict(self._last_seen)
+        latest = []
+        for host, buffer in hosts:
+            values = buffer.last()
+            if values is None:
+                continue
+            seen = last_seen.get(host, 0)
+            latest.append({
+                'host': host,
+                'online': now - seen <= self.stale_after,
+                'last_seen': seen,
+                **{name: round(values[name], 2) for name in FLEET_COLUMNS}
+            })
+        return latest
+
+    def get_hosts(self):
+        try:
+            hosts = sorted(self._latest(), key=lambda row: row['host'])
+            return {'hosts': hosts, 'online': sum(1 for row in hosts if row['online'])}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def get_top_hosts(self, by='cpu', n=5):
+        try:
+            if by not in ROLLUP_FIELDS:
+                return {'error': f"Unknown fleet metric: {by}"}
+            online = [row for row in self._latest() if row['online']]
+            online.sort(key=lambda row: row[by], reverse=True)
+            return {'by': by, 'hosts': online[:n]}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def get_throughput(self):
+        try:
+            online = [row for row in self._latest() if row['online']]
+            totals = {name: round(sum(row[name] for row in online), 2)
+                      for name in ('net_tx', 'net_rx', 'disk_read', 'disk_write', 'mem_used', 'mem_total')}
+            totals['cpu_avg'] = round(sum(row['cpu'] for row in online) / len(online), 2) if online else 0.0
+            totals['hosts'] = len(online)
+            return totals
+        except Exception as e:
+            return {'error': str(e)}
+
+    def get_host_history(self, host, start=None, end=None, max_points=None):
+        try:
+            with self._lock:
+                buffer = self._hosts.get(host)
+            if buffer is None:
+                return {'error': f"Unknown fleet host: {host}"}
+            columns = buffer.range(start, end)
+            count = len(columns['timestamp'])
+            if max_points and count > max_points:
+                # Even stride over the window; the most recent point is kept
+                step = -(-count // max_points)
+                columns = {name: values[::-1][::step][::-1] for name, values in columns.items()}
+            return {'host': host, 'columns': columns, 'count': len(columns['timestamp'])}
+        except Exception as e:
+            return {'error': str(e)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Ship this machine\'s samples to a central hardware monitor')
+    parser.add_argument('--central', required=True, help='central address, host:port or unix:/path')
+    parser.add_argument('--host-id', help='name reported for this machine (default: hostname)')
+    parser.add_argument('--interval', type=float, default=1.0, help='sampler interval in seconds')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from sampler import resource_sampler
+
+    args = parse_args(argv)
+    parse_address(args.central)
+    agent = FleetAgent(args.central, args.host_id, args.batch_size, args.flush_interval)
+    resource_sampler.interval = args.interval
+    agent.attach(resource_sampler)
+    agent.start()
+    resource_sampler.start()
+    print(f"Fleet agent {agent.host_id} sending to {args.central}")
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    try:
+        while not stopping:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.detach(resource_sampler)
+        resource_sampler.stop()
+        agent.stop()
+
+
+if __name__ == '__main__':
+    main()
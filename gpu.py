@@ -0,0 +1,298 @@
+import math
+import os
+import shutil
+import subprocess
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+# One reading of one GPU. Memory is in bytes, power in watts, clocks in MHz;
+# values a device does not report are None.
+sgpu = namedtuple('sgpu', [
+    'index', 'uuid', 'name', 'driver',
+    'utilization', 'memory_utilization', 'memory_total', 'memory_used', 'memory_free',
+    'temperature', 'power_draw', 'power_limit', 'fan_speed', 'clock_sm',
+    'display_mode', 'display_active'
+])
+
+MIB = 1024 * 1024
+# Per-device columns recorded in the GPU history
+GPU_HISTORY_COLUMNS = ('timestamp', 'utilization', 'memory_percent', 'temperature', 'power_draw')
+# Overrides backend auto-detection: nvml, nvidia-smi, fake or none
+GPU_BACKEND_ENV = 'GPU_BACKEND'
+# Seconds to wait before restarting a nvidia-smi loop that exited
+SMI_RESTART_DELAY = 30
+
+SMI_FIELDS = (
+    'index', 'uuid', 'name', 'driver_version', 'utilization.gpu', 'utilization.memory',
+    'memory.total', 'memory.used', 'memory.free', 'temperature.gpu', 'power.draw', 'power.limit',
+    'fan.speed', 'clocks.sm', 'display_mode', 'display_active'
+)
+
+
+def _number(value, cast=float, scale=1):
+    # nvidia-smi prints "[N/A]" / "[Not Supported]" for missing values
+    try:
+        return cast(float(value) * scale)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class NullGpuBackend:
+    """No GPU tooling available."""
+
+    name = 'none'
+
+    def sample(self):
+        return ()
+
+    def close(self):
+        pass
+
+
+class FakeGpuBackend:
+    """
+    Synthetic devices with smoothly varying load, for GPU-less machines and
+    tests. Readings depend only on the number of samples taken, so a run is
+    reproducible.
+    """
+
+    name = 'fake'
+
+    def __init__(self, count=2, memory_total=8192 * MIB):
+        self.count = count
+        self.memory_total = memory_total
+        self._ticks = 0
+
+    def sample(self):
+        self._ticks += 1
+        gpus = []
+        for index in range(self.count):
+            phase = self._ticks / 10 + index
+            utilization = round(50 + 45 * math.sin(phase), 1)
+            memory_used = int(self.memory_total * (0.3 + 0.25 * math.sin(phase / 3)))
+            gpus.append(sgpu(
+                index=index,
+                uuid=f'GPU-fake-{index:04d}',
+                name='Fake GPU',
+                driver='0.0',
+                utilization=utilization,
+                memory_utilization=round(utilization * 0.6, 1),
+                memory_total=self.memory_total,
+                memory_used=memory_used,
+                memory_free=self.memory_total - memory_used,
+                temperature=round(40 + utilization * 0.4, 1),
+                power_draw=round(30 + utilization * 2, 1),
+                power_limit=250.0,
+                fan_speed=round(30 + utilization * 0.5, 1),
+                clock_sm=int(300 + utilization * 15),
+                display_mode='Disabled',
+                display_active='Disabled'
+            ))
+        return tuple(gpus)
+
+    def close(self):
+        pass
+
+
+class NvmlGpuBackend:
+    """
+    In-process NVML queries through pynvml. Device handles and identity are
+    looked up once; a sample is a few library calls per device and no
+    process spawn.
+    """
+
+    name = 'nvml'
+
+    def __init__(self):
+        pynvml.nvmlInit()
+        self._driver = _text(pynvml.nvmlSystemGetDriverVersion())
+        self._devices = []
+        for index in range(pynvml.nvmlDeviceGetCount()):
+            handle = pynvml.nvmlDeviceGetHandleByIndex(index)
+            self._devices.append((
+                index, handle,
+                _text(pynvml.nvmlDeviceGetUUID(handle)),
+                _text(pynvml.nvmlDeviceGetName(handle))
+            ))
+
+    def sample(self):
+        return tuple(self._sample_device(*device) for device in self._devices)
+
+    def _sample_device(self, index, handle, uuid, name):
+        rates = self._call(pynvml.nvmlDeviceGetUtilizationRates, handle)
+        memory = self._call(pynvml.nvmlDeviceGetMemoryInfo, handle)
+        power = self._call(pynvml.nvmlDeviceGetPowerUsage, handle)
+        limit = self._call(pynvml.nvmlDeviceGetEnforcedPowerLimit, handle)
+        display_mode = self._call(pynvml.nvmlDeviceGetDisplayMode, handle)
+        display_active = self._call(pynvml.nvmlDeviceGetDisplayActive, handle)
+        return sgpu(
+            index=index,
+            uuid=uuid,
+            name=name,
+            driver=self._driver,
+            utilization=float(rates.gpu) if rates else None,
+            memory_utilization=float(rates.memory) if rates else None,
+            memory_total=memory.total if memory else None,
+            memory_used=memory.used if memory else None,
+            memory_free=memory.free if memory else None,
+            temperature=self._call(pynvml.nvmlDeviceGetTemperature, handle, pynvml.NVML_TEMPERATURE_GPU),
+            power_draw=power / 1000 if power is not None else None,
+            power_limit=limit / 1000 if limit is not None else None,
+            fan_speed=self._call(pynvml.nvmlDeviceGetFanSpeed, handle),
+            clock_sm=self._call(pynvml.nvmlDeviceGetClockInfo, handle, pynvml.NVML_CLOCK_SM),
+            display_mode=None if display_mode is None else ('Enabled' if display_mode else 'Disabled'),
+            display_active=None if display_active is None else ('Enabled' if display_active else 'Disabled')
+        )
+
+    @staticmethod
+    def _call(func, *args):
+        try:
+            return func(*args)
+        except pynvml.NVMLError:
+            return None
+
+    def close(self):
+        try:
+            pynvml.nvmlShutdown()
+        except pynvml.NVMLError:
+            pass
+
+
+class NvidiaSmiGpuBackend:
+    """
+    One long-running `nvidia-smi --query-gpu ... --loop-ms` process printing a
+    CSV line per device every interval. A reader thread keeps the latest
+    complete batch, so sampling never spawns a process.
+    """
+
+    name = 'nvidia-smi'
+
+    def __init__(self, interval=1.0, executable='nvidia-smi'):
+        self.interval = interval
+        self.executable = executable
+        self._latest = ()
+        self._device_count = 0
+        self._process = None
+        self._started_at = None
+        self._lock = threading.Lock()
+        self._start()
+
+    def sample(self):
+        if self._process is None or self._process.poll() is not None:
+            if self._started_at is None or time.monotonic() - self._started_at >= SMI_RESTART_DELAY:
+                self._start()
+        with self._lock:
+            return self._latest
+
+    def close(self):
+        process, self._process = self._process, None
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def _start(self):
+        self._started_at = time.monotonic()
+        self._process = subprocess.Popen(
+            [
+                self.executable,
+                f"--query-gpu={','.join(SMI_FIELDS)}",
+                '--format=csv,noheader,nounits',
+                f'--loop-ms={max(int(self.interval * 1000), 100)}'
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        reader = threading.Thread(target=self._read, args=(self._process,), name='nvidia-smi-reader')
+        reader.daemon = True
+        reader.start()
+
+    def _read(self, process):
+        batch = []
+        for line in process.stdout:
+            gpu = self.parse_line(line)
+            if gpu is None:
+                continue
+            # A repeated index starts the next round of the loop
+            if batch and gpu.index <= batch[-1].index:
+                self._publish(batch)
+                batch = []
+            batch.append(gpu)
+            if len(batch) >= self._device_count > 0:
+                self._publish(batch)
+                batch = []
+        if batch:
+            self._publish(batch)
+        # The loop exited; stale readings are worse than none
+        with self._lock:
+            self._latest = ()
+
+    def _publish(self, batch):
+        with self._lock:
+            self._latest = tuple(batch)
+            self._device_count = max(self._device_count, len(batch))
+
+    @staticmethod
+    def parse_line(line):
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) != len(SMI_FIELDS) or not fields[0].isdigit():
+            return None
+        return sgpu(
+            index=int(fields[0]),
+            uuid=fields[1],
+            name=fields[2],
+            driver=fields[3],
+            utilization=_number(fields[4]),
+            memory_utilization=_number(fields[5]),
+            memory_total=_number(fields[6], int, MIB),
+            memory_used=_number(fields[7], int, MIB),
+            memory_free=_number(fields[8], int, MIB),
+            temperature=_number(fields[9]),
+            power_draw=_number(fields[10]),
+            power_limit=_number(fields[11]),
+            fan_speed=_number(fields[12]),
+            clock_sm=_number(fields[13], int),
+            display_mode=fields[14],
+            display_active=fields[15]
+        )
+
+
+def gpu_history_row(timestamp, gpu):
+    # Missing readings are stored as 0 so the columns stay JSON friendly
+    memory_percent = gpu.memory_used / gpu.memory_total * 100 if gpu.memory_total and gpu.memory_used is not None else 0.0
+    return (timestamp, gpu.utilization or 0.0, memory_percent, gpu.temperature or 0.0, gpu.power_draw or 0.0)
+
+
+def create_gpu_backend(preferred=None, interval=1.0):
+    # NVML when the bindings and a driver are present, then the nvidia-smi
+    # loop, otherwise no GPUs
+    preferred = preferred or os.environ.get(GPU_BACKEND_ENV)
+    if preferred == 'fake':
+        return FakeGpuBackend()
+    if preferred == 'none':
+        return NullGpuBackend()
+    if preferred in (None, 'nvml') and pynvml is not None:
+        try:
+            return NvmlGpuBackend()
+        except pynvml.NVMLError:
+            pass
+    if preferred in (None, 'nvidia-smi') and shutil.which('nvidia-smi'):
+        try:
+            return NvidiaSmiGpuBackend(interval)
+        except OSError:
+            pass
+    return NullGpuBackend()
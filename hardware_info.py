@@ -1,8 +1,11 @@
-import platform
 import psutil
-import GPUtil
-import cpuinfo
 from datetime import datetime
+import alerts
+from sampler import get_snapshot
+from static_info import get_static_facts
+from process_table import top_processes
+from rates import round_rates
+from instrumentation import self_stats
 
 def get_size(bytes, suffix="B"):
     """
@@ -17,19 +20,29 @@ def get_size(bytes, suffix="B"):
             return f"{bytes:.2f}{unit}{suffix}"
         bytes /= factor
 
+def get_rate_info(rates):
+    # Rounded per-second rates and EWMAs for the total and every device
+    return {
+        "total": round_rates(rates["total"]) if rates["total"] else None,
+        "devices": {name: round_rates(value) for name, value in rates["devices"].items()}
+    }
+
+@self_stats.timed
 def get_cpu_info():
     # CPU information
     cpu_info = {}
+    snapshot = get_snapshot()
+    facts = get_static_facts()
     
     # CPU name
-    cpu_info["name"] = cpuinfo.get_cpu_info()['brand_raw']
+    cpu_info["name"] = facts["cpu_name"]
     
     # CPU cores
-    cpu_info["physical_cores"] = psutil.cpu_count(logical=False)
-    cpu_info["total_cores"] = psutil.cpu_count(logical=True)
+    cpu_info["physical_cores"] = facts["physical_cores"]
+    cpu_info["total_cores"] = facts["logical_cores"]
     
     # CPU frequencies - Fixed to handle 0 values better
-    cpufreq = psutil.cpu_freq()
+    cpufreq = snapshot.cpu_freq
     if cpufreq:
         cpu_info["max_frequency"] = f"{cpufreq.max:.2f}MHz" if cpufreq.max else "N/A"
         cpu_info["min_frequency"] = f"{cpufreq.min:.2f}MHz" if cpufreq.min and cpufreq.min > 0 else "N/A"
@@ -39,143 +52,173 @@ def get_cpu_info():
         cpu_info["min_frequency"] = "N/A" 
         cpu_info["current_frequency"] = "N/A"
     
-    # CPU usage
+    # CPU usage (deltas computed by the background sampler)
     cpu_info["usage_per_core"] = []
-    for i, percentage in enumerate(psutil.cpu_percent(percpu=True, interval=1)):
+    for i, percentage in enumerate(snapshot.cpu_per_core):
         cpu_info["usage_per_core"].append({
             "core": i,
             "usage": percentage
         })
     
-    cpu_info["total_cpu_usage"] = psutil.cpu_percent()
+    cpu_info["total_cpu_usage"] = snapshot.cpu_percent
     
     # CPU temperature (if available)
-    try:
-        if hasattr(psutil, "sensors_temperatures"):
-            temp = psutil.sensors_temperatures()
-            if temp and 'coretemp' in temp:
-                cpu_info["temperature"] = temp['coretemp'][0].current
-            else:
-                cpu_info["temperature"] = "N/A"
-        else:
-            cpu_info["temperature"] = "N/A"
-    except:
+    temp = snapshot.temperatures
+    if temp and 'coretemp' in temp:
+        cpu_info["temperature"] = temp['coretemp'][0].current
+    else:
         cpu_info["temperature"] = "N/A"
     
     # CPU architecture
-    cpu_info["architecture"] = cpuinfo.get_cpu_info()['arch']
-    cpu_info["bits"] = cpuinfo.get_cpu_info()['bits']
+    cpu_info["architecture"] = facts["architecture"]
+    cpu_info["bits"] = facts["bits"]
     
     # CPU cache
-    if 'l2_cache_size' in cpuinfo.get_cpu_info():
-        cpu_info["l2_cache"] = get_size(cpuinfo.get_cpu_info()['l2_cache_size'])
+    if facts["l2_cache_size"]:
+        cpu_info["l2_cache"] = get_size(facts["l2_cache_size"])
     else:
         cpu_info["l2_cache"] = "N/A"
     
-    if 'l3_cache_size' in cpuinfo.get_cpu_info():
-        cpu_info["l3_cache"] = get_size(cpuinfo.get_cpu_info()['l3_cache_size'])
+    if facts["l3_cache_size"]:
+        cpu_info["l3_cache"] = get_size(facts["l3_cache_size"])
     else:
         cpu_info["l3_cache"] = "N/A"
     
-    # Process information using CPU
-    cpu_info["processes"] = []
-    for process in psutil.process_iter(['pid', 'name', 'cpu_percent']):
-        try:
-            process_info = process.info
-            if process_info['cpu_percent'] > 0.5:  # Only show processes using significant CPU
-                cpu_info["processes"].append({
-                    "pid": process_info['pid'],
-                    "name": process_info['name'],
-                    "cpu_usage": process_info['cpu_percent']
-                })
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
+    # CPU quota of our cgroup (v2); inside a container this, not the core
+    # count, is what throttles us
+    cgroup = snapshot.cgroup
+    if cgroup and cgroup.cpu_limit:
+        cpu_info["container"] = {
+            "cpu_limit_cores": round(cgroup.cpu_limit, 2),
+            "throttled_periods": cgroup.nr_throttled,
+            "total_periods": cgroup.nr_periods,
+            "throttled_time": f"{cgroup.throttled_usec / 1e6:.2f}s"
+        }
     
-    # Sort processes by CPU usage (descending)
-    cpu_info["processes"] = sorted(cpu_info["processes"], key=lambda x: x["cpu_usage"], reverse=True)[:5]
+    # Process information using CPU (top-N kept by the process table)
+    cpu_info["processes"] = []
+    for process_info in top_processes('cpu', 5):
+        if process_info['cpu_percent'] > 0.5:  # Only show processes using significant CPU
+            cpu_info["processes"].append({
+                "pid": process_info['pid'],
+                "name": process_info['name'],
+                "cpu_usage": process_info['cpu_percent']
+            })
     
     return cpu_info
 
+def _format_gpu(gpu, firing):
+    memory_percent = gpu.memory_used / gpu.memory_total * 100 if gpu.memory_total and gpu.memory_used is not None else 0.0
+    utilization = gpu.utilization or 0.0
+    info = {
+        "index": gpu.index,
+        "uuid": gpu.uuid,
+        "name": gpu.name,
+        "driver": gpu.driver,
+        "memory_total": get_size(gpu.memory_total) if gpu.memory_total is not None else "N/A",
+        "memory_used": get_size(gpu.memory_used) if gpu.memory_used is not None else "N/A",
+        "memory_free": get_size(gpu.memory_free) if gpu.memory_free is not None else "N/A",
+        "memory_utilization": f"{memory_percent:.1f}%",
+        "gpu_utilization": f"{utilization:.1f}%",
+        "current_usage": f"{utilization:.1f}%",
+        "temperature": f"{gpu.temperature:.1f} °C" if gpu.temperature is not None else "N/A",
+        "power_draw": f"{gpu.power_draw:.1f} W" if gpu.power_draw is not None else "N/A",
+        "fan_speed": f"{gpu.fan_speed:.0f}%" if gpu.fan_speed is not None else "N/A",
+        "display_mode": gpu.display_mode,
+        "display_active": gpu.display_active
+    }
+
+    # Status follows the GPU alert rules (alerts.DEFAULT_RULES)
+    info["status"] = "Active"
+    if ('gpu_hot', f'gpu.{gpu.index}.temperature') in firing:
+        info["status"] = "Warning: High Temperature"
+    elif ('gpu_memory_high', f'gpu.{gpu.index}.memory_percent') in firing:
+        info["status"] = "Warning: High Memory Usage"
+    elif ('gpu_busy', f'gpu.{gpu.index}.utilization') in firing:
+        info["status"] = "Warning: High GPU Usage"
+    return info
+
+@self_stats.timed
 def get_gpu_info():
+    # Every device, sampled once per tick by the shared sampler; the first
+    # one is also reported at the top level for the dashboard card
     gpu_info = {}
     try:
-        gpus = GPUtil.getGPUs()
+        firing = alerts.firing_alerts()
+        gpus = [_format_gpu(gpu, firing) for gpu in get_snapshot().gpus]
         if gpus:
-            gpu = gpus[0]  # Just get the first GPU if multiple exist
-            gpu_info["name"] = gpu.name
-            gpu_info["driver"] = gpu.driver
-            gpu_info["memory_total"] = get_size(gpu.memoryTotal * 1024 * 1024)  # Convert MB to bytes
-            gpu_info["memory_used"] = get_size(gpu.memoryUsed * 1024 * 1024)  # Convert MB to bytes
-            gpu_info["memory_free"] = get_size(gpu.memoryFree * 1024 * 1024)  # Convert MB to bytes
-            gpu_info["memory_utilization"] = f"{gpu.memoryUtil * 100:.1f}%"
-            gpu_info["gpu_utilization"] = f"{gpu.load * 100:.1f}%"
-            gpu_info["current_usage"] = f"{gpu.load * 100:.1f}%"
-            gpu_info["temperature"] = f"{gpu.temperature:.1f} °C"
-            gpu_info["display_mode"] = gpu.display_mode
-            gpu_info["display_active"] = gpu.display_active
-            
-            # Tambahan informasi status
-            gpu_info["status"] = "Active"
-            if gpu.temperature > 80:
-                gpu_info["status"] = "Warning: High Temperature"
-            elif gpu.memoryUtil > 0.9:
-                gpu_info["status"] = "Warning: High Memory Usage"
-            elif gpu.load > 0.9:
-                gpu_info["status"] = "Warning: High GPU Usage"
+            gpu_info.update(gpus[0])
+            gpu_info["count"] = len(gpus)
+            gpu_info["gpus"] = gpus
         else:
             gpu_info["status"] = "No GPU detected"
     except Exception as e:
         gpu_info["status"] = f"Error getting GPU info: {str(e)}"
-        
+
     return gpu_info
 
+@self_stats.timed
 def get_memory_info():
     memory_info = {}
-    svmem = psutil.virtual_memory()
+    snapshot = get_snapshot()
+    svmem = snapshot.memory
     memory_info["total"] = get_size(svmem.total)
     memory_info["available"] = get_size(svmem.available)
     memory_info["used"] = get_size(svmem.used)
     memory_info["percentage"] = svmem.percent
     
     # swap memory
-    swap = psutil.swap_memory()
+    swap = snapshot.swap
     memory_info["swap_total"] = get_size(swap.total)
     memory_info["swap_free"] = get_size(swap.free)
     memory_info["swap_used"] = get_size(swap.used)
     memory_info["swap_percentage"] = swap.percent
     
+    # Memory limit of our cgroup (v2) when running in a container
+    cgroup = snapshot.cgroup
+    if cgroup and cgroup.memory_max:
+        used = cgroup.memory_current or 0
+        memory_info["container"] = {
+            "limit": get_size(cgroup.memory_max),
+            "used": get_size(used),
+            "percentage": round(used / cgroup.memory_max * 100, 1),
+            "oom_kills": cgroup.oom_kills
+        }
+    
     return memory_info
 
+@self_stats.timed
 def get_disk_info():
     disk_info = []
-    partitions = psutil.disk_partitions()
-    for partition in partitions:
-        try:
-            partition_usage = psutil.disk_usage(partition.mountpoint)
-            disk_info.append({
-                "device": partition.device,
-                "mountpoint": partition.mountpoint,
-                "file_system_type": partition.fstype,
-                "total_size": get_size(partition_usage.total),
-                "used": get_size(partition_usage.used),
-                "free": get_size(partition_usage.free),
-                "percentage": partition_usage.percent
-            })
-        except Exception:
-            pass
+    snapshot = get_snapshot()
+    for partition in snapshot.partitions:
+        disk_info.append({
+            "device": partition.device,
+            "mountpoint": partition.mountpoint,
+            "file_system_type": partition.fstype,
+            "total_size": get_size(partition.total),
+            "used": get_size(partition.used),
+            "free": get_size(partition.free),
+            "percentage": partition.percent
+        })
     
     # Disk I/O
-    disk_io = psutil.disk_io_counters()
+    disk_io = snapshot.disk_io
+    total_rates = snapshot.disk_rates["total"]
     if disk_io:
         disk_io_info = {
             "read_since_boot": get_size(disk_io.read_bytes),
             "write_since_boot": get_size(disk_io.write_bytes)
         }
+        if total_rates:
+            disk_io_info["read_rate"] = get_size(total_rates["per_second"]["read_bytes"]) + "/s"
+            disk_io_info["write_rate"] = get_size(total_rates["per_second"]["write_bytes"]) + "/s"
     else:
         disk_io_info = {"status": "Disk I/O information not available"}
     
-    return {"partitions": disk_info, "disk_io": disk_io_info}
+    return {"partitions": disk_info, "disk_io": disk_io_info, "rates": get_rate_info(snapshot.disk_rates)}
 
+@self_stats.timed
 def get_network_info():
     network_info = {}
     
@@ -194,34 +237,47 @@ def get_network_info():
                 })
     
     # Network I/O
-    net_io = psutil.net_io_counters()
-    network_info["io"] = {
-        "bytes_sent": get_size(net_io.bytes_sent),
-        "bytes_received": get_size(net_io.bytes_recv)
-    }
+    snapshot = get_snapshot()
+    net_io = snapshot.net_io
+    total_rates = snapshot.net_rates["total"]
+    if net_io:
+        network_info["io"] = {
+            "bytes_sent": get_size(net_io.bytes_sent),
+            "bytes_received": get_size(net_io.bytes_recv)
+        }
+        if total_rates:
+            network_info["io"]["upload_rate"] = get_size(total_rates["per_second"]["bytes_sent"]) + "/s"
+            network_info["io"]["download_rate"] = get_size(total_rates["per_second"]["bytes_recv"]) + "/s"
+    else:
+        network_info["io"] = {"bytes_sent": "N/A", "bytes_received": "N/A"}
+    network_info["rates"] = get_rate_info(snapshot.net_rates)
     
     return network_info
 
+@self_stats.timed
 def get_system_info():
     system_info = {}
-    system_info["system"] = platform.system()
-    system_info["node_name"] = platform.node()
-    system_info["release"] = platform.release()
-    system_info["version"] = platform.version()
-    system_info["machine"] = platform.machine()
-    system_info["processor"] = platform.processor()
-    system_info["uptime"] = str(datetime.now() - datetime.fromtimestamp(psutil.boot_time()))
+    facts = get_static_facts()
+    system_info["system"] = facts["system"]
+    system_info["node_name"] = facts["node_name"]
+    system_info["release"] = facts["release"]
+    system_info["version"] = facts["version"]
+    system_info["machine"] = facts["machine"]
+    system_info["processor"] = facts["processor"]
+    system_info["uptime"] = str(datetime.now() - datetime.fromtimestamp(facts["boot_time"]))
     system_info["current_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     return system_info
 
+@self_stats.timed
 def get_system_health():
     health_info = {}
+    snapshot = get_snapshot()
     
     # System temperature monitoring
     try:
         if hasattr(psutil, "sensors_temperatures"):
-            temps = psutil.sensors_temperatures()
+            temps = snapshot.temperatures
             health_info["temperatures"] = {}
             
             # Check for common temperature sensors
@@ -260,7 +316,7 @@ def get_system_health():
     # Fan speed monitoring
     try:
         if hasattr(psutil, "sensors_fans"):
-            fans = psutil.sensors_fans()
+            fans = snapshot.fans
             health_info["fans"] = {}
             
             if fans:
@@ -294,27 +350,30 @@ def get_system_health():
     # Disk health status
     health_info["disk_health"] = []
     try:
-        for partition in psutil.disk_partitions():
-            try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                health_info["disk_health"].append({
-                    "device": partition.device,
-                    "mountpoint": partition.mountpoint,
-                    "status": "Healthy" if usage.percent < 80 else "Warning" if usage.percent < 90 else "Critical",
-                    "usage_percent": usage.percent,
-                    "total": get_size(usage.total),
-                    "used": get_size(usage.used),
-                    "free": get_size(usage.free)
-                })
-            except:
-                continue
+        for usage in snapshot.partitions:
+            health_info["disk_health"].append({
+                "device": usage.device,
+                "mountpoint": usage.mountpoint,
+                "status": "Healthy" if usage.percent < 80 else "Warning" if usage.percent < 90 else "Critical",
+                "usage_percent": usage.percent,
+                "total": get_size(usage.total),
+                "used": get_size(usage.used),
+                "free": get_size(usage.free)
+            })
     except:
         health_info["disk_health"] = {"status": "Error reading disk health"}
 
+    # Pressure stall information: share of time tasks waited on CPU,
+    # memory or I/O (contention rather than utilisation)
+    health_info["pressure"] = {
+        resource: {kind: {"avg10": psi.avg10, "avg60": psi.avg60} for kind, psi in stalls.items()}
+        for resource, stalls in (snapshot.pressure or {}).items()
+    }
+
     # System stability metrics
     try:
         # CPU load average
-        load_avg = psutil.getloadavg()
+        load_avg = snapshot.load_avg
         health_info["load_average"] = {
             "1min": load_avg[0],
             "5min": load_avg[1],
@@ -322,14 +381,14 @@ def get_system_health():
         }
         
         # Memory stability
-        memory = psutil.virtual_memory()
+        memory = snapshot.memory
         health_info["memory_stability"] = {
             "status": "Stable" if memory.percent < 90 else "Warning",
             "usage_percent": memory.percent
         }
         
         # CPU stability
-        cpu_percent = psutil.cpu_percent(interval=1)
+        cpu_percent = snapshot.cpu_percent
         health_info["cpu_stability"] = {
             "status": "Stable" if cpu_percent < 90 else "Warning",
             "usage_percent": cpu_percent
@@ -345,12 +404,14 @@ def get_system_health():
 
     return health_info
 
+@self_stats.timed
 def get_power_info():
     power_info = {}
+    snapshot = get_snapshot()
     
     try:
         # Battery information
-        battery = psutil.sensors_battery()
+        battery = snapshot.battery
         if battery:
             power_info["battery"] = {
                 "percent": battery.percent,
@@ -362,8 +423,8 @@ def get_power_info():
             power_info["battery"] = {"status": "No battery detected"}
 
         # Power consumption estimation (simplified)
-        cpu_percent = psutil.cpu_percent()
-        memory = psutil.virtual_memory()
+        cpu_percent = snapshot.cpu_percent
+        memory = snapshot.memory
         
         # Rough estimation of power consumption based on CPU and memory usage
         power_info["power_consumption"] = {
@@ -373,7 +434,7 @@ def get_power_info():
         }
 
         # Power mode detection (Windows only)
-        if platform.system() == "Windows":
+        if get_static_facts()["system"] == "Windows":
             try:
                 import winreg
                 key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, 
@@ -394,30 +455,36 @@ def get_power_info():
 
     return power_info
 
+@self_stats.timed
 def get_performance_report():
+    snapshot = get_snapshot()
+    firing = alerts.firing_alerts()
+    facts = get_static_facts()
+    memory = snapshot.memory
+    net_io = snapshot.net_io
     report = {
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "system_info": get_system_info(),
         "performance_metrics": {
             "cpu": {
-                "usage": psutil.cpu_percent(),
-                "frequency": psutil.cpu_freq().current if psutil.cpu_freq() else None,
+                "usage": snapshot.cpu_percent,
+                "frequency": snapshot.cpu_freq.current if snapshot.cpu_freq else None,
                 "cores": {
-                    "physical": psutil.cpu_count(logical=False),
-                    "logical": psutil.cpu_count(logical=True)
+                    "physical": facts["physical_cores"],
+                    "logical": facts["logical_cores"]
                 }
             },
             "memory": {
-                "total": get_size(psutil.virtual_memory().total),
-                "used": get_size(psutil.virtual_memory().used),
-                "percent": psutil.virtual_memory().percent
+                "total": get_size(memory.total),
+                "used": get_size(memory.used),
+                "percent": memory.percent
             },
             "disk": {
                 "partitions": []
             },
             "network": {
-                "bytes_sent": get_size(psutil.net_io_counters().bytes_sent),
-                "bytes_recv": get_size(psutil.net_io_counters().bytes_recv)
+                "bytes_sent": get_size(net_io.bytes_sent) if net_io else "N/A",
+                "bytes_recv": get_size(net_io.bytes_recv) if net_io else "N/A"
             }
         },
         "health_status": {
@@ -428,53 +495,39 @@ def get_performance_report():
     }
 
     # Get CPU temperature if available
-    try:
-        if hasattr(psutil, "sensors_temperatures"):
-            temps = psutil.sensors_temperatures()
-            if temps and 'coretemp' in temps:
-                report["health_status"]["cpu_temperature"] = temps['coretemp'][0].current
-    except:
-        pass
+    temps = snapshot.temperatures
+    if temps and 'coretemp' in temps:
+        report["health_status"]["cpu_temperature"] = temps['coretemp'][0].current
 
     # Get disk health information
-    try:
-        for partition in psutil.disk_partitions():
-            try:
-                usage = psutil.disk_usage(partition.mountpoint)
-                report["performance_metrics"]["disk"]["partitions"].append({
-                    "device": partition.device,
-                    "mountpoint": partition.mountpoint,
-                    "total": get_size(usage.total),
-                    "used": get_size(usage.used),
-                    "free": get_size(usage.free),
-                    "percent": usage.percent
-                })
-                
-                # Add disk health status
-                health_status = "Healthy"
-                if usage.percent > 90:
-                    health_status = "Critical"
-                elif usage.percent > 80:
-                    health_status = "Warning"
-                
-                report["health_status"]["disk_health"].append({
-                    "device": partition.device,
-                    "status": health_status,
-                    "usage_percent": usage.percent
-                })
-            except:
-                continue
-    except:
-        pass
+    for usage in snapshot.partitions:
+        report["performance_metrics"]["disk"]["partitions"].append({
+            "device": usage.device,
+            "mountpoint": usage.mountpoint,
+            "total": get_size(usage.total),
+            "used": get_size(usage.used),
+            "free": get_size(usage.free),
+            "percent": usage.percent
+        })
+        
+        # Add disk health status, as judged by the partition alert rules
+        metric = f'partition.{usage.mountpoint}.percent'
+        health_status = "Healthy"
+        if ('partition_full', metric) in firing:
+            health_status = "Critical"
+        elif ('partition_filling', metric) in firing:
+            health_status = "Warning"
+        
+        report["health_status"]["disk_health"].append({
+            "device": usage.device,
+            "status": health_status,
+            "usage_percent": usage.percent
+        })
 
     # Get memory stability
-    try:
-        memory = psutil.virtual_memory()
-        report["health_status"]["memory_stability"] = {
-            "status": "Stable" if memory.percent < 90 else "Warning",
-            "usage_percent": memory.percent
-        }
-    except:
-        pass
+    report["health_status"]["memory_stability"] = {
+        "status": "Warning" if ('memory_high', 'memory.percent') in firing else "Stable",
+        "usage_percent": memory.percent
+    }
 
-    return report
\ No newline at end of file
+    return report
@@ -0,0 +1,244 @@
+import bisect
+import os
+import threading
+import time
+from functools import wraps
+from time import perf_counter
+
+import psutil
+from flask import g, request
+
+# Set to 0 to turn the monitor's self-instrumentation off
+SELF_STATS_ENV = 'HWMON_SELF_STATS'
+# Upper bounds in seconds of the duration histogram buckets
+DURATION_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+# Sections of the stats; each holds one CallStats per name
+KINDS = ('sampler', 'listeners', 'collectors', 'routes', 'rpc')
+# Requests that matched no route share one entry instead of one per URL
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds=DURATION_BUCKETS):
+        self.bounds = bounds
+        # One count per bound plus the overflow bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self, scale=1000.0):
+        # Milliseconds by default; buckets are cumulative like Prometheus
+        buckets = {}
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            buckets[f'{bound * scale:g}'] = seen
+        buckets['+Inf'] = self.count
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count * scale, 4) if self.count else None,
+            'p50': round(self.quantile(0.5) * scale, 4) if self.count else None,
+            'p90': round(self.quantile(0.9) * scale, 4) if self.count else None,
+            'p99': round(self.quantile(0.99) * scale, 4) if self.count else None,
+            'max': round(self.max * scale, 4),
+            'buckets': buckets
+        }
+
+
+class CallStats:
+    __slots__ = ('calls', 'errors', 'exceptions', 'last_error', 'bytes', 'durations')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        # Exception type name -> count
+        self.exceptions = {}
+        self.last_error = None
+        self.bytes = 0
+        self.durations = Histogram()
+
+    def record(self, duration, error=None, size=None):
+        self.calls += 1
+        # Histogram.observe inlined; this runs on every instrumented call
+        durations = self.durations
+        durations.counts[bisect.bisect_left(durations.bounds, duration)] += 1
+        durations.count += 1
+        durations.sum += duration
+        if duration > durations.max:
+            durations.max = duration
+        if size:
+            self.bytes += size
+        if error is not None:
+            self.errors += 1
+            if isinstance(error, BaseException):
+                kind = type(error).__name__
+                self.exceptions[kind] = self.exceptions.get(kind, 0) + 1
+                error = f'{kind}: {error}'
+            self.last_error = str(error)
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'exceptions': dict(self.exceptions),
+            'last_error': self.last_error,
+            'bytes': self.bytes,
+            'duration_ms': self.durations.to_dict()
+        }
+
+
+class SelfStats:
+    """
+    What the monitor costs: call counts, duration histograms, errors and
+    bytes for every sampler step, listener, collector, route and collector
+    RPC, the sampler's tick jitter, and this process's CPU and RSS.
+    Recording is two clock reads and a short lock, so it stays on.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.started = time.time()
+        self.tick_jitter = Histogram()
+        self._stats = {kind: {} for kind in KINDS}
+        self._cpu = (time.monotonic(), self._cpu_seconds())
+        self._process = None
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, duration, error=None, size=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            entries = self._stats[kind]
+            stats = entries.get(name)
+            if stats is None:
+                stats = entries[name] = CallStats()
+            stats.record(duration, error, size)
+
+    def record_jitter(self, lateness):
+        # How late a sampler tick started against its schedule, in seconds
+        if not self.enabled:
+            return
+        with self._lock:
+            self.tick_jitter.observe(max(lateness, 0.0))
+
+    def call(self, kind, name, func, /, *args, **kwargs):
+        """Run func, recording its duration and any raised or returned error."""
+        if not self.enabled:
+            return func(*args, **kwargs)
+        started = perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.record(kind, name, perf_counter() - started, e)
+            raise
+        # Collectors report failures as {'error': message} instead of raising
+        self.record(kind, name, perf_counter() - started, result.get('error') if type(result) is dict else None)
+        return result
+
+    def timed(self, func):
+        # Decorator for collectors: "hardware_info.get_cpu_info",
+        # "AdvancedMonitoring.get_alerts", ...
+        name = func.__qualname__ if '.' in func.__qualname__ else f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call('collectors', name, func, *args, **kwargs)
+        return wrapper
+
+    def init_app(self, app):
+        # Registered before the response cache so its after_request hook
+        # runs last and sees the compressed size
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        g.self_stats_started = time.perf_counter()
+
+    def _after_request(self, response):
+        g.self_stats_response = (response.status_code, response.content_length)
+        return response
+
+    def _teardown_request(self, exc):
+        started = g.pop('self_stats_started', None)
+        if started is None:
+            return
+        status, size = g.pop('self_stats_response', (500, None))
+        error = exc
+        if error is None and status >= 500:
+            error = f'HTTP {status}'
+        rule = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        self.record('routes', f'{request.method} {rule}', time.perf_counter() - started, error, size)
+
+    @staticmethod
+    def _cpu_seconds():
+        times = os.times()
+        return times.user + times.system
+
+    def get_process_stats(self):
+        now = time.monotonic()
+        cpu = self._cpu_seconds()
+        last_time, last_cpu = self._cpu
+        self._cpu = (now, cpu)
+        # Percent of one CPU since the previous call, like top
+        cpu_percent = (cpu - last_cpu) / (now - last_time) * 100 if now > last_time else 0.0
+        stats = {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started, 1),
+            'cpu_seconds': round(cpu, 2),
+            'cpu_percent': round(cpu_percent, 2),
+            'cpu_percent_of_machine': round(cpu_percent / (os.cpu_count() or 1), 2),
+            'rss': None,
+            'threads': threading.active_count()
+        }
+        try:
+            if self._process is None:
+                self._process = psutil.Process()
+            stats['rss'] = self._process.memory_info().rss
+        except psutil.Error:
+            self._process = None
+        return stats
+
+    def get_stats(self):
+        with self._lock:
+            sections = {
+                kind: {name: stats.to_dict() for name, stats in sorted(entries.items())}
+                for kind, entries in self._stats.items()
+            }
+            jitter = self.tick_jitter.to_dict()
+        result = {'enabled': self.enabled, 'process': self.get_process_stats(), 'tick_jitter_ms': jitter}
+        result.update(sections)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stats = {kind: {} for kind in KINDS}
+            self.tick_jitter = Histogram()
+
+
+# Shared instance; every module of this process records into it
+self_stats = SelfStats(enabled=os.environ.get(SELF_STATS_ENV, '1') != '0')
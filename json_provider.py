@@ -0,0 +1,84 @@
+from collections.abc import Mapping
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    # numpy arrays and scalars, array('d'), read-only mappings and
+    # namedtuples; anything else gets Flask's handling (dates, UUIDs, ...)
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, tuple):
+        return list(value)
+    return DefaultJSONProvider.default(value)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson, several times faster than the
+    json module on large process lists and histories. C-contiguous numpy
+    arrays are written directly; keys keep insertion order rather than
+    being sorted.
+    """
+
+    default = staticmethod(_default)
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def dumps(self, obj, **kwargs):
+        # Callers asking for json.dumps options get the stdlib encoder
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.option | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        body = orjson.dumps(obj, default=_default, option=option)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_app(app):
+    app.json_provider_class = OrjsonProvider if orjson is not None else StdlibJSONProvider
+    app.json = app.json_provider_class(app)
+
+
+def to_columnar(result):
+    """
+    Compact shape for list endpoints (?format=columnar): every top-level
+    list of row dicts becomes {'columns': {field: [values]}, 'count': n},
+    so field names are sent once instead of once per row.
+    """
+    if not isinstance(result, dict):
+        return result
+    converted = {}
+    for key, value in result.items():
+        if isinstance(value, list) and value and all(isinstance(row, dict) for row in value):
+            fields = {}
+            for row in value:
+                for field in row:
+                    fields.setdefault(field, None)
+            converted[key] = {
+                'columns': {field: [row.get(field) for row in value] for field in fields},
+                'count': len(value)
+            }
+        else:
+            converted[key] = value
+    return converted
@@ -0,0 +1,283 @@
+import calendar
+import mmap
+import os
+import struct
+import threading
+import time
+
+from timeseries import HISTORY_COLUMNS, ROLLUP_STATS, np
+
+# Absolute, so history is found again whatever the CWD at startup
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metrics')
+# Retention limits; None disables a limit
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_BYTES = None
+# Records buffered before the current segment is flushed to disk
+FLUSH_EVERY = 10
+
+SEGMENT_SUFFIX = '.seg'
+HOUR_SECONDS = 3600
+DAY_SECONDS = 86400
+
+
+def _segment_start(name):
+    # Hourly segments are named YYYYMMDDHH, compacted daily ones YYYYMMDD (UTC)
+    stem = name[:-len(SEGMENT_SUFFIX)]
+    if len(stem) == 10:
+        return calendar.timegm(time.strptime(stem, '%Y%m%d%H')), HOUR_SECONDS
+    return calendar.timegm(time.strptime(stem, '%Y%m%d')), DAY_SECONDS
+
+
+class MetricsStore:
+    """
+    Append-only on-disk history. Every sample is a fixed-width record of
+    little-endian float64 columns appended to one segment file per hour.
+    Hourly segments of past days are compacted into one file per day, and
+    reads memory-map only the segments that overlap the requested window.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, columns=HISTORY_COLUMNS,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.columns = tuple(columns)
+        self.record = struct.Struct('<%dd' % len(self.columns))
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self._file = None
+        self._file_name = None
+        self._pending = 0
+        # Guards the writer's current segment
+        self._lock = threading.Lock()
+        # Held while reads list and open segments, and while compaction or
+        # retention swaps and deletes them, so a read sees either the
+        # hourly sources or their daily file, never both or neither
+        self._segments_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, values):
+        if isinstance(values, dict):
+            values = [values.get(name, 0.0) for name in self.columns]
+        name = time.strftime('%Y%m%d%H', time.gmtime(values[0])) + SEGMENT_SUFFIX
+        with self._lock:
+            if name != self._file_name:
+                self._close_segment()
+                self._file = open(os.path.join(self.directory, name), 'ab')
+                self._file_name = name
+            self._file.write(self.record.pack(*values))
+            self._pending += 1
+            if self._pending >= FLUSH_EVERY:
+                self._file.flush()
+                self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+    def segments(self):
+        # [(start, span, path)] sorted by start time
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            try:
+                start, span = _segment_start(name)
+            except ValueError:
+                continue
+            result.append((start, span, os.path.join(self.directory, name)))
+        result.sort()
+        return result
+
+    def size(self):
+        return sum(os.path.getsize(path) for _, _, path in self.segments())
+
+    def read(self, start=None, end=None, columns=None):
+        """
+        Return {column: array} for records with start <= timestamp <= end.
+        """
+        columns = self.columns if columns is None else tuple(columns)
+        indexes = [self.columns.index(name) for name in columns]
+        self.flush()
+
+        chunks = []
+        with self._segments_lock:
+            for segment_start, span, path in self.segments():
+                if end is not None and segment_start > end:
+                    break
+                if start is not None and segment_start + span < start:
+                    continue
+                chunk = self._read_segment(path, start, end)
+                if chunk is not None and len(chunk):
+                    chunks.append(chunk)
+
+        if np is not None:
+            if chunks:
+                rows = np.concatenate(chunks)
+            else:
+                rows = np.empty((0, len(self.columns)))
+            return {name: rows[:, index] for name, index in zip(columns, indexes)}
+        rows = [row for chunk in chunks for row in chunk]
+        return {name: [row[index] for row in rows] for name, index in zip(columns, indexes)}
+
+    def query(self, start=None, end=None, max_points=None):
+        """
+        Same shape as TieredHistory.query(): raw records, or min/max/avg/last
+        buckets sized to fit max_points when the window is larger.
+        """
+        data = self.read(start, end)
+        timestamps = data['timestamp']
+        count = len(timestamps)
+        if not max_points or count <= max_points:
+            return {
+                'resolution': None,
+                'stats': None,
+                'columns': {name: values if np is None else np.ascontiguousarray(values) for name, values in data.items()}
+            }
+
+        first, last = float(timestamps[0]), float(timestamps[-1])
+        resolution = max((last - first) / max_points, 1.0)
+        return {
+            'resolution': resolution,
+            'stats': list(ROLLUP_STATS),
+            'columns': self._downsample(data, first, resolution)
+        }
+
+    def compact(self, now=None):
+        # Merge hourly segments of finished days into one sorted daily file
+        today = time.strftime('%Y%m%d', time.gmtime(now or time.time()))
+        by_day = {}
+        for _, span, path in self.segments():
+            name = os.path.basename(path)
+            # The writer may still hold the last hour of yesterday open
+            if span == HOUR_SECONDS and name[:8] < today and name != self._file_name:
+                by_day.setdefault(name[:8], []).append(path)
+
+        for day, paths in by_day.items():
+            target = os.path.join(self.directory, day + SEGMENT_SUFFIX)
+            sources = ([target] if os.path.exists(target) else []) + sorted(paths)
+            records = []
+            for path in sources:
+                with open(path, 'rb') as f:
+                    payload = f.read()
+                usable = len(payload) - len(payload) % self.record.size
+                records.extend(self.record.iter_unpack(payload[:usable]))
+            records.sort(key=lambda record: record[0])
+            temp_path = target + '.tmp'
+            with open(temp_path, 'wb') as f:
+                for record in records:
+                    f.write(self.record.pack(*record))
+            # The merge above runs unlocked; only the swap excludes readers
+            with self._segments_lock:
+                os.replace(temp_path, target)
+                for path in paths:
+                    os.remove(path)
+
+        self.apply_retention(now)
+
+    def apply_retention(self, now=None):
+        # The writer lock keeps the current segment from rotating meanwhile
+        with self._lock, self._segments_lock:
+            self._apply_retention(now)
+
+    def _apply_retention(self, now):
+        segments = self.segments()
+        if self._file_name:
+            # Never delete the segment currently being written
+            segments = [s for s in segments if os.path.basename(s[2]) != self._file_name]
+
+        if self.max_age_days is not None:
+            cutoff = (now or time.time()) - self.max_age_days * DAY_SECONDS
+            for segment_start, span, path in list(segments):
+                if segment_start + span < cutoff:
+                    os.remove(path)
+                    segments.remove((segment_start, span, path))
+
+        if self.max_bytes is not None:
+            total = sum(os.path.getsize(path) for _, _, path in segments)
+            if self._file_name:
+                total += os.path.getsize(os.path.join(self.directory, self._file_name))
+            for _, _, path in segments:
+                if total <= self.max_bytes:
+                    break
+                total -= os.path.getsize(path)
+                os.remove(path)
+
+    def _close_segment(self):
+        if self._file:
+            self._file.close()
+        self._file = None
+        self._file_name = None
+        self._pending = 0
+
+    def _read_segment(self, path, start, end):
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+        # Ignore a partially written trailing record
+        size -= size % self.record.size
+        if size == 0:
+            return None
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            # Removed by a concurrent compaction
+            return None
+        with f:
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                if np is not None:
+                    rows = np.frombuffer(mapped, dtype='<f8').reshape(-1, len(self.columns))
+                    times = rows[:, 0]
+                    lo = int(np.searchsorted(times, start, 'left')) if start is not None else 0
+                    hi = int(np.searchsorted(times, end, 'right')) if end is not None else len(rows)
+                    # Copy the selected rows so the mapping can be released
+                    selected = rows[lo:hi].copy()
+                    del rows, times
+                    return selected
+                return [
+                    record for record in self.record.iter_unpack(mapped)
+                    if (start is None or record[0] >= start) and (end is None or record[0] <= end)
+                ]
+
+    def _downsample(self, data, first, resolution):
+        timestamps = data['timestamp']
+        metrics = [name for name in self.columns if name != 'timestamp']
+        if np is not None:
+            buckets = ((timestamps - first) // resolution).astype(np.int64)
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            counts = np.diff(np.r_[starts, len(timestamps)])
+            columns = {'timestamp': first + buckets[starts] * resolution}
+            for name in metrics:
+                values = data[name]
+                columns[f'{name}_min'] = np.minimum.reduceat(values, starts)
+                columns[f'{name}_max'] = np.maximum.reduceat(values, starts)
+                columns[f'{name}_avg'] = np.add.reduceat(values, starts) / counts
+                columns[f'{name}_last'] = values[np.r_[starts[1:], len(values)] - 1]
+            return columns
+
+        columns = {'timestamp': []}
+        for name in metrics:
+            for stat in ROLLUP_STATS:
+                columns[f'{name}_{stat}'] = []
+        current = None
+        group = []
+        for index, timestamp in enumerate(timestamps + [None]):
+            bucket = None if timestamp is None else int((timestamp - first) // resolution)
+            if group and bucket != current:
+                columns['timestamp'].append(first + current * resolution)
+                for name in metrics:
+                    values = [data[name][i] for i in group]
+                    columns[f'{name}_min'].append(min(values))
+                    columns[f'{name}_max'].append(max(values))
+                    columns[f'{name}_avg'].append(sum(values) / len(values))
+                    columns[f'{name}_last'].append(values[-1])
+                group = []
+            current = bucket
+            if timestamp is not None:
+                group.append(index)
+        return columns
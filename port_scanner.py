@@ -0,0 +1,250 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import uuid
+
+import psutil
+
+DEFAULT_PORTS = "1-1024"
+DEFAULT_CONCURRENCY = 256
+DEFAULT_TIMEOUT = 0.5
+MAX_CONCURRENCY = 1024
+# Per-port connect timeout is clamped to this many seconds
+MAX_TIMEOUT = 5.0
+# Scan jobs allowed to run at once; more are refused
+MAX_ACTIVE_SCANS = 4
+# Finished scans are reused for this many seconds
+CACHE_TTL = 60
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 32
+
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+# Comma separated hosts that may be scanned besides the local machine
+SCAN_HOSTS_ENV = 'HWMON_SCAN_HOSTS'
+# Addresses a loopback client can reach
+LOOPBACK_BINDS = ('0.0.0.0', '::', '127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+# TCP_LISTEN in /proc/net/tcp
+_PROC_TCP_LISTEN = '0A'
+
+
+class ScanLimitError(Exception):
+    pass
+
+
+class ScanHostError(Exception):
+    pass
+
+
+def allowed_scan_hosts():
+    configured = os.environ.get(SCAN_HOSTS_ENV, '')
+    return frozenset(LOCAL_HOSTS) | {host.strip().lower() for host in configured.split(',') if host.strip()}
+
+
+def parse_port_ranges(spec):
+    """
+    Turn a port specification into a sorted list of ports
+    e.g:
+        "22,80,8000-8010" => [22, 80, 8000, ..., 8010]
+    """
+    ports = set()
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-', 1)
+            start, end = int(start), int(end)
+        else:
+            start = end = int(part)
+        if start < 1 or end > 65535 or start > end:
+            raise ValueError(f"Invalid port range: {part}")
+        ports.update(range(start, end + 1))
+    if not ports:
+        raise ValueError("No ports to scan")
+    return sorted(ports)
+
+
+def _read_proc_listeners():
+    # Fallback for when psutil.net_connections() is not permitted
+    listeners = []
+    for path, family in (('/proc/net/tcp', 'IPv4'), ('/proc/net/tcp6', 'IPv6')):
+        try:
+            with open(path) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 4 or fields[3] != _PROC_TCP_LISTEN:
+                        continue
+                    address, port = fields[1].split(':')
+                    listeners.append({
+                        'address': _decode_proc_address(address),
+                        'port': int(port, 16),
+                        'family': family,
+                        'pid': None
+                    })
+        except OSError:
+            continue
+    return listeners
+
+
+def _decode_proc_address(hex_address):
+    raw = bytes.fromhex(hex_address)
+    if len(raw) == 4:
+        return socket.inet_ntop(socket.AF_INET, raw[::-1])
+    # IPv6 is stored as four little-endian 32-bit words
+    words = b''.join(raw[i:i + 4][::-1] for i in range(0, 16, 4))
+    return socket.inet_ntop(socket.AF_INET6, words)
+
+
+class PortScanner:
+    def __init__(self, cache_ttl=CACHE_TTL, max_active=MAX_ACTIVE_SCANS, allowed_hosts=None):
+        self.cache_ttl = cache_ttl
+        self.max_active = max_active
+        # Only the local machine unless more hosts are configured
+        self.allowed_hosts = frozenset(allowed_hosts) if allowed_hosts is not None else allowed_scan_hosts()
+        self._jobs = {}
+        self._cache = {}
+        # Scan key -> job id of the scan still running for it
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def get_listening_ports(self):
+        # Read the kernel socket table instead of probing ports
+        try:
+            listeners = []
+            for conn in psutil.net_connections(kind='tcp'):
+                if conn.status != psutil.CONN_LISTEN or not conn.laddr:
+                    continue
+                listeners.append({
+                    'address': conn.laddr.ip,
+                    'port': conn.laddr.port,
+                    'family': 'IPv6' if conn.family == socket.AF_INET6 else 'IPv4',
+                    'pid': conn.pid
+                })
+        except (psutil.AccessDenied, NotImplementedError):
+            listeners = _read_proc_listeners()
+        listeners.sort(key=lambda item: (item['port'], item['address']))
+        return listeners
+
+    def get_local_open_ports(self, ports=DEFAULT_PORTS):
+        wanted = set(parse_port_ranges(ports))
+        open_ports = set()
+        for listener in self.get_listening_ports():
+            address = listener['address']
+            if listener['port'] in wanted and (address in LOOPBACK_BINDS or address.startswith('127.')):
+                open_ports.add(listener['port'])
+        return sorted(open_ports)
+
+    def start_scan(self, host='127.0.0.1', ports=DEFAULT_PORTS,
+                   concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+        if host.lower() not in self.allowed_hosts:
+            raise ScanHostError(f"Scanning {host} is not allowed; add it to {SCAN_HOSTS_ENV} to permit it")
+        port_list = parse_port_ranges(ports)
+        concurrency = max(1, min(int(concurrency), MAX_CONCURRENCY))
+        timeout = max(0.01, min(float(timeout), MAX_TIMEOUT))
+        key = (host, tuple(port_list), timeout)
+
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and self._jobs.get(cached) and time.time() - self._jobs[cached]['finished_at'] < self.cache_ttl:
+                return self._public_job(self._jobs[cached], cached=True)
+            # The same scan is already running; hand out its job
+            running = self._running.get(key)
+            if running is not None:
+                return self._public_job(self._jobs[running])
+            if len(self._running) >= self.max_active:
+                raise ScanLimitError(f"Too many port scans running (limit {self.max_active}); try again later")
+
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                'job_id': job_id,
+                'host': host,
+                'ports': ports,
+                'concurrency': concurrency,
+                'timeout': timeout,
+                'status': 'running',
+                'scanned': 0,
+                'total': len(port_list),
+                'open_ports': [],
+                'started_at': time.time(),
+                'finished_at': None,
+                'error': None
+            }
+            self._jobs[job_id] = job
+            self._running[key] = job_id
+
+        thread = threading.Thread(target=self._run_job, args=(job, key, port_list), name=f'port-scan-{job_id}')
+        thread.daemon = True
+        thread.start()
+        return self._public_job(job)
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._public_job(job) if job else None
+
+    def scan(self, host, port_list, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, progress=None):
+        # Blocking helper; runs the async scan on a private event loop
+        return asyncio.run(self._scan(host, port_list, concurrency, timeout, progress))
+
+    async def _scan(self, host, port_list, concurrency, timeout, progress):
+        open_ports = []
+        ports = iter(port_list)
+
+        async def worker():
+            for port in ports:
+                if await self._probe(host, port, timeout):
+                    open_ports.append(port)
+                if progress:
+                    progress(port)
+
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(port_list)))))
+        return sorted(open_ports)
+
+    @staticmethod
+    async def _probe(host, port, timeout):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+    def _run_job(self, job, key, port_list):
+        def progress(port):
+            job['scanned'] += 1
+
+        try:
+            job['open_ports'] = self.scan(job['host'], port_list, job['concurrency'], job['timeout'], progress)
+            job['status'] = 'done'
+        except Exception as e:
+            job['status'] = 'error'
+            job['error'] = str(e)
+        job['finished_at'] = time.time()
+
+        with self._lock:
+            del self._running[key]
+            if job['status'] == 'done':
+                self._cache[key] = job['job_id']
+            self._prune()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job['finished_at'] is not None]
+        finished.sort(key=lambda job: job['finished_at'])
+        for job in finished[:-MAX_FINISHED_JOBS]:
+            del self._jobs[job['job_id']]
+        self._cache = {key: job_id for key, job_id in self._cache.items() if job_id in self._jobs}
+
+    @staticmethod
+    def _public_job(job, cached=False):
+        result = dict(job)
+        result['progress'] = round(job['scanned'] / job['total'] * 100, 1) if job['total'] else 100.0
+        result['cached'] = cached
+        return result
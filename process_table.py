@@ -0,0 +1,489 @@
+import heapq
+import sys
+import threading
+import time
+from array import array
+from collections import deque, namedtuple
+
+import psutil
+
+# Length of the maintained top-N lists
+DEFAULT_TOP_N = 10
+
+# Sort keys accepted by query() and top()
+SORT_KEYS = {
+    'cpu': 'cpu_percent',
+    'memory': 'rss',
+    'rss': 'rss',
+    'io': 'io_rate',
+    'pid': 'pid',
+    'name': 'name'
+}
+
+# Per-node values summed over subtrees: cpu, rss, threads, fds, process count
+TREE_FIELDS = ('cpu_percent', 'rss', 'num_threads', 'num_fds', 'processes')
+# Full tree rebuilds, to shed floating point drift from incremental updates
+REBUILD_TREE_EVERY = 600
+
+# Per-process usage history: one bucket per minute for the last few hours,
+# then one per ten minutes up to a week, keeping the heaviest processes of
+# each bucket
+HISTORY_BUCKET_SECONDS = 60
+HISTORY_DETAIL_SECONDS = 6 * 3600
+HISTORY_COARSE_SECONDS = 600
+HISTORY_SECONDS = 7 * 24 * 3600
+HISTORY_KEEP = 20
+
+_ACCESS_ERRORS = (psutil.AccessDenied, psutil.ZombieProcess, NotImplementedError, AttributeError)
+
+# Closed history bucket. values holds USAGE_FIELDS for each process back to
+# back as doubles; names and users are parallel tuples of interned strings.
+_Bucket = namedtuple('_Bucket', ['start', 'seconds', 'ticks', 'values', 'names', 'users'])
+USAGE_FIELDS = ('pid', 'create_time', 'cpu_sum', 'cpu_max', 'rss_sum', 'rss_max', 'samples')
+
+
+def _intern(text):
+    # Names and users repeat in every bucket; store each string once
+    return sys.intern(text) if type(text) is str else text
+
+
+class ProcessHistory:
+    """
+    Usage buckets used to rank processes over a time window. Every refresh
+    adds each process's cpu_percent and rss to the open minute bucket; when
+    the minute ends only the top HISTORY_KEEP processes by cpu and by rss
+    are kept, packed into a flat array of doubles. Minute buckets older
+    than HISTORY_DETAIL_SECONDS are merged into ten minute ones, so a week
+    of history stays at a few megabytes.
+    """
+
+    def __init__(self, bucket_seconds=HISTORY_BUCKET_SECONDS, detail_seconds=HISTORY_DETAIL_SECONDS,
+                 coarse_seconds=HISTORY_COARSE_SECONDS, history_seconds=HISTORY_SECONDS, keep=HISTORY_KEEP):
+        self.bucket_seconds = bucket_seconds
+        self.coarse_seconds = coarse_seconds
+        self.keep = keep
+        self._buckets = deque()
+        self._detail = max(detail_seconds // bucket_seconds, 1)
+        self._coarse = deque(maxlen=max((history_seconds - detail_seconds) // coarse_seconds, 1))
+        self._current = None
+        self._merging = None
+        self._lock = threading.Lock()
+
+    def add(self, timestamp, rows):
+        bucket_start = timestamp - timestamp % self.bucket_seconds
+        with self._lock:
+            if self._current is None or self._current['start'] != bucket_start:
+                if self._current is not None:
+                    self._close(self._current)
+                self._current = {'start': bucket_start, 'ticks': 0, 'processes': {}}
+            bucket = self._current
+            bucket['ticks'] += 1
+            processes = bucket['processes']
+            for key, row in rows.items():
+                usage = processes.get(key)
+                if usage is None:
+                    processes[key] = [row['name'], row['username'], row['cpu_percent'], row['cpu_percent'], row['rss'], row['rss'], 1]
+                else:
+                    usage[2] += row['cpu_percent']
+                    usage[3] = max(usage[3], row['cpu_percent'])
+                    usage[4] += row['rss']
+                    usage[5] = max(usage[5], row['rss'])
+                    usage[6] += 1
+
+    def top(self, start=None, end=None, by='cpu', n=DEFAULT_TOP_N):
+        """
+        Heaviest processes over [start, end]: cpu_avg is averaged over every
+        tick of the window, so a process that ran for half of it at 50 %
+        reports 25 %.
+        """
+        by = 'rss' if by == 'memory' else by
+        if by not in ('cpu', 'rss'):
+            raise ValueError(f"Unknown top-N key: {by}")
+        with self._lock:
+            buckets = list(self._coarse) + list(self._buckets)
+            open_buckets = [bucket for bucket in (self._merging, self._current) if bucket is not None]
+            ticks = 0
+            totals = {}
+            for bucket in buckets:
+                if not self._in_window(bucket.start, bucket.seconds, start, end):
+                    continue
+                ticks += bucket.ticks
+                for key, usage in self._unpack(bucket):
+                    self._merge(totals, key, usage)
+            for bucket in open_buckets:
+                if not self._in_window(bucket['start'], bucket.get('seconds', self.bucket_seconds), start, end):
+                    continue
+                ticks += bucket['ticks']
+                for key, usage in bucket['processes'].items():
+                    self._merge(totals, key, usage)
+
+        field = 2 if by == 'cpu' else 5
+        top = heapq.nlargest(n, totals.items(), key=lambda item: item[1][field])
+        return [
+            {
+                'pid': key[0],
+                'create_time': key[1],
+                'name': usage[0],
+                'username': usage[1],
+                'cpu_avg': round(usage[2] / ticks, 2) if ticks else 0.0,
+                'cpu_max': round(usage[3], 1),
+                'rss_avg': int(usage[4] / usage[6]),
+                'rss_max': int(usage[5]),
+                'samples': int(usage[6])
+            }
+            for key, usage in top
+        ]
+
+    @staticmethod
+    def _in_window(bucket_start, seconds, start, end):
+        return (start is None or bucket_start + seconds > start) and (end is None or bucket_start <= end)
+
+    @staticmethod
+    def _merge(totals, key, usage):
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(usage)
+        else:
+            total[2] += usage[2]
+            total[3] = max(total[3], usage[3])
+            total[4] += usage[4]
+            total[5] = max(total[5], usage[5])
+            total[6] += usage[6]
+
+    def _close(self, bucket):
+        # Caller holds the lock
+        self._buckets.append(self._pack(bucket, self.bucket_seconds))
+        while len(self._buckets) > self._detail:
+            old = self._buckets.popleft()
+            coarse_start = old.start - old.start % self.coarse_seconds
+            merging = self._merging
+            if merging is not None and merging['start'] != coarse_start:
+                self._coarse.append(self._pack(merging, self.coarse_seconds))
+                merging = None
+            if merging is None:
+                merging = self._merging = {
+                    'start': coarse_start, 'seconds': self.coarse_seconds, 'ticks': 0, 'processes': {}
+                }
+            merging['ticks'] += old.ticks
+            for key, usage in self._unpack(old):
+                self._merge(merging['processes'], key, usage)
+
+    def _pack(self, bucket, seconds):
+        processes = bucket['processes']
+        if len(processes) > self.keep:
+            keep = set(heapq.nlargest(self.keep, processes, key=lambda key: processes[key][2]))
+            keep.update(heapq.nlargest(self.keep, processes, key=lambda key: processes[key][5]))
+        else:
+            keep = processes
+        values = array('d')
+        names = []
+        users = []
+        for key in keep:
+            usage = processes[key]
+            values.extend((key[0], key[1], usage[2], usage[3], usage[4], usage[5], usage[6]))
+            names.append(_intern(usage[0]))
+            users.append(_intern(usage[1]))
+        return _Bucket(bucket['start'], seconds, bucket['ticks'], values, tuple(names), tuple(users))
+
+    @staticmethod
+    def _unpack(bucket):
+        values = bucket.values
+        width = len(USAGE_FIELDS)
+        for index, (name, user) in enumerate(zip(bucket.names, bucket.users)):
+            offset = index * width
+            row = values[offset:offset + width]
+            yield (int(row[0]), row[1]), [name, user, row[2], row[3], row[4], row[5], row[6]]
+
+
+class ProcessTable:
+    """
+    Long-lived table of running processes keyed by (pid, create_time).
+    It also maintains the parent/child tree with subtree totals, updated
+    incrementally as processes change, are born, die or get reparented.
+
+    psutil.Process objects are kept between refreshes, so cpu_percent() is a
+    real delta since the previous sampler tick instead of the 0.0 a freshly
+    created object reports. Each refresh publishes a new dict of rows and the
+    top-N lists, which readers use without locking.
+    """
+
+    def __init__(self, top_n=DEFAULT_TOP_N):
+        self.top_n = top_n
+        self._processes = {}
+        self._io_totals = {}
+        self._rows = {}
+        self._top = {'cpu': [], 'rss': [], 'io': []}
+        self._nodes = {}
+        self.history = ProcessHistory()
+        self._refresh_count = 0
+        self._last_refresh = None
+        self._lock = threading.Lock()
+
+    def attach(self, sampler):
+        sampler.add_listener(self.refresh)
+
+    def detach(self, sampler):
+        sampler.remove_listener(self.refresh)
+
+    @property
+    def last_refresh(self):
+        return self._last_refresh
+
+    def refresh(self, snapshot=None):
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._last_refresh if self._last_refresh else None
+            total_memory = snapshot.memory.total if snapshot else psutil.virtual_memory().total
+
+            rows = {}
+            alive = {}
+            for pid in psutil.pids():
+                proc = self._processes_by_pid(pid)
+                if proc is None:
+                    continue
+                try:
+                    with proc.oneshot():
+                        key = (pid, proc.create_time())
+                        row = self._read_process(proc, key, elapsed, total_memory)
+                except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                    continue
+                except psutil.AccessDenied:
+                    continue
+                alive[pid] = proc
+                rows[key] = row
+
+            self._processes = alive
+            self._io_totals = {key: self._io_totals_for(row) for key, row in rows.items()}
+            self._refresh_count += 1
+            if self._refresh_count % REBUILD_TREE_EVERY == 0:
+                self._nodes = {}
+                self._update_tree({}, rows)
+            else:
+                self._update_tree(self._rows, rows)
+            self._rows = rows
+            self._top = {
+                'cpu': heapq.nlargest(self.top_n, rows.values(), key=lambda row: row['cpu_percent']),
+                'rss': heapq.nlargest(self.top_n, rows.values(), key=lambda row: row['rss']),
+                'io': heapq.nlargest(self.top_n, rows.values(), key=lambda row: row['io_rate'])
+            }
+            self._last_refresh = now
+            self.history.add(snapshot.timestamp if snapshot else time.time(), rows)
+
+    def rows(self):
+        if self._last_refresh is None:
+            self.refresh()
+        return self._rows
+
+    def get(self, pid):
+        for key, row in self.rows().items():
+            if key[0] == pid:
+                return row
+        return None
+
+    def top(self, by='cpu', n=None):
+        if self._last_refresh is None:
+            self.refresh()
+        by = 'rss' if by == 'memory' else by
+        if by not in self._top:
+            raise ValueError(f"Unknown top-N key: {by}")
+        top = self._top[by]
+        return top if n is None else top[:n]
+
+    def query(self, sort='cpu', limit=None, offset=0, name=None, user=None, min_cpu=None, descending=True):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        field = SORT_KEYS[sort]
+        rows = self.rows().values()
+
+        if name:
+            name = name.lower()
+            rows = [row for row in rows if name in (row['name'] or '').lower()]
+        if user:
+            rows = [row for row in rows if row['username'] == user]
+        if min_cpu is not None:
+            rows = [row for row in rows if row['cpu_percent'] >= min_cpu]
+
+        rows = list(rows)
+        total = len(rows)
+        offset = max(offset or 0, 0)
+        if limit is not None and field not in ('name', 'pid') and descending:
+            # Only the requested page needs to be ordered
+            page = heapq.nlargest(offset + limit, rows, key=lambda row: row[field])[offset:]
+        else:
+            rows.sort(key=lambda row: row[field] if row[field] is not None else '', reverse=descending)
+            page = rows[offset:offset + limit] if limit is not None else rows[offset:]
+
+        return {'total': total, 'offset': offset, 'count': len(page), 'processes': page}
+
+    def tree(self, root=None, depth=None):
+        """
+        Nested view of the process hierarchy. root limits it to one subtree
+        and depth to that many levels below the root(s).
+        """
+        self.rows()
+        with self._lock:
+            rows_by_pid = {key[0]: row for key, row in self._rows.items()}
+            if root is not None:
+                if root not in self._nodes:
+                    raise ValueError(f"Unknown process: {root}")
+                roots = [root]
+            else:
+                roots = sorted(pid for pid, node in self._nodes.items() if node['parent'] not in self._nodes)
+            return [self._build_subtree(pid, rows_by_pid, depth) for pid in roots]
+
+    def _build_subtree(self, pid, rows_by_pid, depth):
+        node = self._nodes[pid]
+        row = rows_by_pid.get(pid, {})
+        result = {
+            'pid': pid,
+            'ppid': row.get('ppid'),
+            'name': row.get('name'),
+            'username': row.get('username'),
+            'cpu_percent': row.get('cpu_percent'),
+            'rss': row.get('rss'),
+            'num_threads': row.get('num_threads'),
+            'num_fds': row.get('num_fds'),
+            'subtree': {
+                field: round(value, 1) if field == 'cpu_percent' else int(value)
+                for field, value in zip(TREE_FIELDS, node['total'])
+            },
+            'child_count': len(node['children'])
+        }
+        if depth is None or depth > 0:
+            next_depth = None if depth is None else depth - 1
+            result['children'] = [
+                self._build_subtree(child, rows_by_pid, next_depth) for child in sorted(node['children'])
+            ]
+        return result
+
+    def _update_tree(self, old_rows, new_rows):
+        old_by_pid = {key[0]: key for key in old_rows}
+        new_by_pid = {key[0]: key for key in new_rows}
+
+        # Deaths (including pid reuse): drop the node and everything it
+        # contributed upwards; its children become roots until they are
+        # seen again with their new parent below
+        for pid, key in old_by_pid.items():
+            if new_by_pid.get(pid) != key and pid in self._nodes:
+                node = self._nodes.pop(pid)
+                self._add_to_ancestors(node['parent'], node['total'], -1)
+                parent = self._nodes.get(node['parent'])
+                if parent is not None:
+                    parent['children'].discard(pid)
+                for child in node['children']:
+                    if child in self._nodes:
+                        self._nodes[child]['parent'] = None
+
+        # Births start detached and are linked in the next pass
+        for pid, key in new_by_pid.items():
+            if pid not in self._nodes:
+                own = self._own_values(new_rows[key])
+                self._nodes[pid] = {'own': own, 'total': list(own), 'parent': None, 'children': set()}
+
+        for pid, key in new_by_pid.items():
+            node = self._nodes[pid]
+            own = self._own_values(new_rows[key])
+            delta = [new - old for new, old in zip(own, node['own'])]
+            node['own'] = own
+            ppid = new_rows[key]['ppid']
+            new_parent = ppid if ppid in self._nodes and ppid != pid else None
+
+            if new_parent != node['parent']:
+                # Move the whole subtree under its new parent
+                old_parent = node['parent']
+                self._add_to_ancestors(old_parent, node['total'], -1)
+                if old_parent in self._nodes:
+                    self._nodes[old_parent]['children'].discard(pid)
+                node['total'] = [total + change for total, change in zip(node['total'], delta)]
+                node['parent'] = new_parent
+                if new_parent is not None:
+                    self._nodes[new_parent]['children'].add(pid)
+                self._add_to_ancestors(new_parent, node['total'], 1)
+            elif any(delta):
+                node['total'] = [total + change for total, change in zip(node['total'], delta)]
+                self._add_to_ancestors(node['parent'], delta, 1)
+
+    def _add_to_ancestors(self, pid, values, sign):
+        visited = 0
+        while pid is not None and pid in self._nodes and visited <= len(self._nodes):
+            node = self._nodes[pid]
+            node['total'] = [total + sign * value for total, value in zip(node['total'], values)]
+            pid = node['parent']
+            visited += 1
+
+    @staticmethod
+    def _own_values(row):
+        return [row['cpu_percent'], row['rss'], row['num_threads'], row['num_fds'], 1]
+
+    def _processes_by_pid(self, pid):
+        proc = self._processes.get(pid)
+        if proc is not None:
+            try:
+                if proc.is_running():
+                    return proc
+            except psutil.Error:
+                pass
+        # New process, or the pid was reused by a different process
+        try:
+            return psutil.Process(pid)
+        except psutil.Error:
+            return None
+
+    def _read_process(self, proc, key, elapsed, total_memory):
+        row = {
+            'pid': key[0],
+            'create_time': key[1],
+            'ppid': proc.ppid(),
+            'name': proc.name(),
+            'status': proc.status(),
+            'cpu_percent': proc.cpu_percent(interval=None),
+        }
+        try:
+            row['username'] = proc.username()
+        except _ACCESS_ERRORS:
+            row['username'] = None
+        try:
+            rss = proc.memory_info().rss
+        except _ACCESS_ERRORS:
+            rss = 0
+        row['rss'] = rss
+        row['memory_percent'] = round(rss / total_memory * 100, 2) if total_memory else 0.0
+        try:
+            row['num_threads'] = proc.num_threads()
+        except _ACCESS_ERRORS:
+            row['num_threads'] = 0
+        try:
+            row['num_fds'] = proc.num_fds()
+        except _ACCESS_ERRORS:
+            row['num_fds'] = 0
+        try:
+            io = proc.io_counters()
+            row['io_read_bytes'] = io.read_bytes
+            row['io_write_bytes'] = io.write_bytes
+        except _ACCESS_ERRORS:
+            row['io_read_bytes'] = row['io_write_bytes'] = 0
+
+        previous = self._io_totals.get(key)
+        if previous is not None and elapsed:
+            row['io_rate'] = max(self._io_totals_for(row) - previous, 0) / elapsed
+        else:
+            row['io_rate'] = 0.0
+        return row
+
+    @staticmethod
+    def _io_totals_for(row):
+        return row['io_read_bytes'] + row['io_write_bytes']
+
+
+# Shared instance refreshed by the sampler
+process_table = ProcessTable()
+
+
+def use_process_table(table):
+    # Swap the shared instance, e.g. for a proxy to the collector's table
+    global process_table
+    process_table = table
+
+
+def top_processes(by='cpu', n=None):
+    return process_table.top(by, n)
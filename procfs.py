@@ -0,0 +1,312 @@
+import os
+import sys
+from collections import namedtuple
+
+import psutil
+
+# Field layouts match the psutil namedtuples they stand in for, so
+# snapshot consumers work the same with either backend
+scputimes = namedtuple('scputimes', [
+    'user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal', 'guest', 'guest_nice'
+])
+scpustats = namedtuple('scpustats', ['ctx_switches', 'interrupts', 'soft_interrupts', 'syscalls'])
+svmem = namedtuple('svmem', [
+    'total', 'available', 'percent', 'used', 'free', 'active', 'inactive',
+    'buffers', 'cached', 'shared', 'slab'
+])
+sswap = namedtuple('sswap', ['total', 'used', 'free', 'percent', 'sin', 'sout'])
+snetio = namedtuple('snetio', [
+    'bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin', 'dropout'
+])
+sdiskio = namedtuple('sdiskio', [
+    'read_count', 'write_count', 'read_bytes', 'write_bytes', 'read_time', 'write_time',
+    'read_merged_count', 'write_merged_count', 'busy_time'
+])
+
+# Raw /proc/diskstats fields kept per device (used for latency and queue depth)
+sdiskstats = namedtuple('sdiskstats', [
+    'reads', 'reads_merged', 'sectors_read', 'read_ms',
+    'writes', 'writes_merged', 'sectors_written', 'write_ms',
+    'in_flight', 'io_ms', 'weighted_ms'
+])
+
+SECTOR_SIZE = 512
+# Re-list /sys/block every this many disk_io reads to notice hot-plugged disks
+BLOCK_DEVICES_REFRESH = 60
+# Sampler metric group -> procfs files its fields are parsed from
+GROUP_FILES = {
+    'cpu': ('stat', 'loadavg'),
+    'memory': ('meminfo', 'vmstat'),
+    'net': ('net_dev',),
+    'disk_io': ('diskstats',),
+}
+
+
+class ProcFile:
+    """
+    A /proc file kept open for the lifetime of the process and re-read with
+    a positional read into a reused buffer, instead of open/read/close on
+    every sample.
+    """
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        self._buffer = bytearray(size)
+
+    def read(self):
+        while True:
+            length = os.preadv(self._fd, [self._buffer], 0)
+            if length < len(self._buffer):
+                return bytes(memoryview(self._buffer)[:length])
+            # File grew past the buffer (e.g. many CPUs or NICs)
+            self._buffer = bytearray(len(self._buffer) * 2)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class PsutilBackend:
+    """Portable collector backend: plain psutil calls."""
+
+    name = 'psutil'
+
+    def begin_tick(self, groups=None):
+        pass
+
+    def cpu_times(self):
+        return psutil.cpu_times(), psutil.cpu_times(percpu=True)
+
+    def cpu_stats(self):
+        return psutil.cpu_stats()
+
+    def load_avg(self):
+        return psutil.getloadavg() if hasattr(psutil, 'getloadavg') else None
+
+    def memory(self):
+        return psutil.virtual_memory()
+
+    def swap(self):
+        return psutil.swap_memory()
+
+    def net_io(self):
+        return psutil.net_io_counters()
+
+    def net_io_pernic(self):
+        return psutil.net_io_counters(pernic=True)
+
+    def disk_io(self):
+        return psutil.disk_io_counters()
+
+    def disk_io_perdisk(self):
+        return psutil.disk_io_counters(perdisk=True)
+
+    def disk_stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class ProcfsBackend:
+    """
+    Linux collector backend. Each procfs file is read at most once per tick,
+    only when a metric group that needs it is due, through a kept-open
+    descriptor, and only the needed fields are parsed.
+    """
+
+    name = 'procfs'
+
+    def __init__(self):
+        self._clock_ticks = os.sysconf('SC_CLK_TCK')
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+        self._files = {
+            'stat': ProcFile('/proc/stat', 16384),
+            'meminfo': ProcFile('/proc/meminfo'),
+            'vmstat': ProcFile('/proc/vmstat', 16384),
+            'net_dev': ProcFile('/proc/net/dev'),
+            'diskstats': ProcFile('/proc/diskstats', 16384),
+            'loadavg': ProcFile('/proc/loadavg', 256),
+        }
+        self._parsers = {
+            'stat': self._parse_stat,
+            'meminfo': self._parse_key_values,
+            'vmstat': lambda data: self._parse_key_values(data, (b'pswpin', b'pswpout')),
+            'net_dev': self._parse_net_dev,
+            'diskstats': self._parse_diskstats,
+            'loadavg': lambda data: data.split()[:3],
+        }
+        self._block_devices = None
+        self._ticks = 0
+        self._parsed = {}
+
+    def begin_tick(self, groups=None):
+        # Read the files of the metric groups due this tick (all of them
+        # without groups) up front; accessors only look up
+        names = self._files if groups is None else {name for group in groups for name in GROUP_FILES.get(group, ())}
+        if 'diskstats' in names:
+            self._ticks += 1
+            if self._block_devices is None or self._ticks % BLOCK_DEVICES_REFRESH == 0:
+                self._block_devices = self._list_block_devices()
+        for name in names:
+            self._parsed[name] = self._parsers[name](self._files[name].read())
+
+    def cpu_times(self):
+        stat = self._parsed['stat']
+        return stat['cpu'], stat['per_cpu']
+
+    def cpu_stats(self):
+        return self._parsed['stat']['cpu_stats']
+
+    def load_avg(self):
+        return tuple(float(value) for value in self._parsed['loadavg'])
+
+    def memory(self):
+        # Same derivation as psutil.virtual_memory() on Linux
+        info = self._parsed['meminfo']
+        total = info.get(b'MemTotal', 0)
+        free = info.get(b'MemFree', 0)
+        buffers = info.get(b'Buffers', 0)
+        cached = info.get(b'Cached', 0) + info.get(b'SReclaimable', 0)
+        available = info.get(b'MemAvailable', free + buffers + cached)
+        used = total - available
+        percent = round((total - available) / total * 100, 1) if total else 0.0
+        return svmem(
+            total, available, percent, used, free,
+            info.get(b'Active', 0), info.get(b'Inactive', 0),
+            buffers, cached, info.get(b'Shmem', 0), info.get(b'Slab', 0)
+        )
+
+    def swap(self):
+        info = self._parsed['meminfo']
+        vmstat = self._parsed['vmstat']
+        total = info.get(b'SwapTotal', 0)
+        free = info.get(b'SwapFree', 0)
+        used = total - free
+        percent = round(used / total * 100, 1) if total else 0.0
+        # vmstat counts pages; psutil reports swapped bytes
+        return sswap(
+            total, used, free, percent,
+            vmstat.get(b'pswpin', 0) * self._page_size,
+            vmstat.get(b'pswpout', 0) * self._page_size
+        )
+
+    def net_io_pernic(self):
+        return self._parsed['net_dev']
+
+    def net_io(self):
+        pernic = self._parsed['net_dev']
+        if not pernic:
+            return None
+        return snetio(*(sum(values) for values in zip(*pernic.values())))
+
+    def disk_stats(self):
+        return self._parsed['diskstats']
+
+    def disk_io_perdisk(self):
+        return {name: self._to_diskio(stats) for name, stats in self._parsed['diskstats'].items()}
+
+    def disk_io(self):
+        # Whole disks only, so partitions are not counted twice
+        disks = [stats for name, stats in self._parsed['diskstats'].items() if name in self._block_devices]
+        if not disks:
+            return None
+        return self._to_diskio(sdiskstats(*(sum(values) for values in zip(*disks))))
+
+    def close(self):
+        for proc_file in self._files.values():
+            proc_file.close()
+
+    def _parse_stat(self, data):
+        result = {'per_cpu': [], 'cpu_stats': None}
+        ctx = intr = softirq = 0
+        for line in data.split(b'\n'):
+            if line.startswith(b'cpu'):
+                fields = line.split()
+                times = [int(value) / self._clock_ticks for value in fields[1:11]]
+                times += [0.0] * (10 - len(times))
+                if fields[0] == b'cpu':
+                    result['cpu'] = scputimes(*times)
+                else:
+                    result['per_cpu'].append(scputimes(*times))
+            elif line.startswith(b'ctxt '):
+                ctx = int(line.split()[1])
+            elif line.startswith(b'intr '):
+                intr = int(line.split(None, 2)[1])
+            elif line.startswith(b'softirq '):
+                softirq = int(line.split(None, 2)[1])
+        result['cpu_stats'] = scpustats(ctx, intr, softirq, 0)
+        return result
+
+    @staticmethod
+    def _parse_key_values(data, wanted=None):
+        # "Key: value kB" lines (meminfo, values in bytes) or "key value" (vmstat)
+        values = {}
+        for line in data.split(b'\n'):
+            fields = line.split()
+            if len(fields) < 2:
+                continue
+            key = fields[0].rstrip(b':')
+            if wanted is not None and key not in wanted:
+                continue
+            value = int(fields[1])
+            if len(fields) > 2 and fields[2] == b'kB':
+                value *= 1024
+            values[key] = value
+        return values
+
+    @staticmethod
+    def _parse_net_dev(data):
+        pernic = {}
+        for line in data.split(b'\n')[2:]:
+            if b':' not in line:
+                continue
+            name, counters = line.split(b':', 1)
+            fields = counters.split()
+            pernic[name.strip().decode()] = snetio(
+                bytes_sent=int(fields[8]), bytes_recv=int(fields[0]),
+                packets_sent=int(fields[9]), packets_recv=int(fields[1]),
+                errin=int(fields[2]), errout=int(fields[10]),
+                dropin=int(fields[3]), dropout=int(fields[11])
+            )
+        return pernic
+
+    @staticmethod
+    def _parse_diskstats(data):
+        disks = {}
+        for line in data.split(b'\n'):
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            disks[fields[2].decode()] = sdiskstats(*(int(value) for value in fields[3:14]))
+        return disks
+
+    @staticmethod
+    def _to_diskio(stats):
+        return sdiskio(
+            stats.reads, stats.writes,
+            stats.sectors_read * SECTOR_SIZE, stats.sectors_written * SECTOR_SIZE,
+            stats.read_ms, stats.write_ms,
+            stats.reads_merged, stats.writes_merged, stats.io_ms
+        )
+
+    @staticmethod
+    def _list_block_devices():
+        try:
+            return frozenset(name.replace('!', '/') for name in os.listdir('/sys/block'))
+        except OSError:
+            return frozenset()
+
+
+def create_backend():
+    # Fast path on Linux, psutil everywhere else or if /proc is unusable
+    if sys.platform.startswith('linux'):
+        try:
+            backend = ProcfsBackend()
+            backend.begin_tick()
+            return backend
+        except (OSError, ValueError, IndexError, KeyError):
+            pass
+    return PsutilBackend()
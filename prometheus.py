@@ -0,0 +1,247 @@
+import threading
+
+# Text exposition format 0.0.4, understood by Prometheus and OpenMetrics scrapers
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PREFIX = 'hwmon_'
+# Processes exported from each top-N list
+TOP_PROCESSES = 10
+# Formatted label sets kept between scrapes (process churn adds new ones)
+MAX_CACHED_LABELS = 10000
+
+# (name, type, help) for every exported family. HELP/TYPE headers are
+# rendered once; a scrape only fills in sample lines.
+FAMILIES = (
+    ('snapshot_sequence', 'gauge', 'Sequence number of the exported snapshot.'),
+    ('snapshot_timestamp_seconds', 'gauge', 'Unix time the snapshot was taken.'),
+    ('boot_time_seconds', 'gauge', 'Unix time the system booted.'),
+    ('cpu_usage_percent', 'gauge', 'CPU utilisation over the last sampler interval.'),
+    ('cpu_core_usage_percent', 'gauge', 'Per-core CPU utilisation over the last sampler interval.'),
+    ('cpu_frequency_mhz', 'gauge', 'Current CPU frequency.'),
+    ('cpu_context_switches_total', 'counter', 'Context switches since boot.'),
+    ('cpu_interrupts_total', 'counter', 'Interrupts since boot.'),
+    ('cpu_soft_interrupts_total', 'counter', 'Soft interrupts since boot.'),
+    ('load_average', 'gauge', 'System load average.'),
+    ('memory_bytes', 'gauge', 'Virtual memory by kind.'),
+    ('memory_usage_percent', 'gauge', 'Memory in use, excluding reclaimable caches.'),
+    ('swap_bytes', 'gauge', 'Swap space by kind.'),
+    ('swap_in_bytes_total', 'counter', 'Bytes swapped in since boot.'),
+    ('swap_out_bytes_total', 'counter', 'Bytes swapped out since boot.'),
+    ('filesystem_size_bytes', 'gauge', 'Filesystem size.'),
+    ('filesystem_used_bytes', 'gauge', 'Filesystem space in use.'),
+    ('filesystem_free_bytes', 'gauge', 'Filesystem space free.'),
+    ('disk_reads_completed_total', 'counter', 'Reads completed per disk.'),
+    ('disk_writes_completed_total', 'counter', 'Writes completed per disk.'),
+    ('disk_read_bytes_total', 'counter', 'Bytes read per disk.'),
+    ('disk_written_bytes_total', 'counter', 'Bytes written per disk.'),
+    ('disk_read_time_seconds_total', 'counter', 'Time spent reading per disk.'),
+    ('disk_write_time_seconds_total', 'counter', 'Time spent writing per disk.'),
+    ('disk_io_time_seconds_total', 'counter', 'Time the disk had I/O in progress.'),
+    ('network_receive_bytes_total', 'counter', 'Bytes received per interface.'),
+    ('network_transmit_bytes_total', 'counter', 'Bytes sent per interface.'),
+    ('network_receive_packets_total', 'counter', 'Packets received per interface.'),
+    ('network_transmit_packets_total', 'counter', 'Packets sent per interface.'),
+    ('network_receive_errors_total', 'counter', 'Receive errors per interface.'),
+    ('network_transmit_errors_total', 'counter', 'Transmit errors per interface.'),
+    ('network_receive_drop_total', 'counter', 'Inbound packets dropped per interface.'),
+    ('network_transmit_drop_total', 'counter', 'Outbound packets dropped per interface.'),
+    ('gpu_utilization_percent', 'gauge', 'GPU core utilisation.'),
+    ('gpu_memory_used_bytes', 'gauge', 'GPU memory in use.'),
+    ('gpu_memory_total_bytes', 'gauge', 'GPU memory size.'),
+    ('gpu_temperature_celsius', 'gauge', 'GPU temperature.'),
+    ('gpu_power_watts', 'gauge', 'GPU power draw.'),
+    ('gpu_fan_speed_percent', 'gauge', 'GPU fan speed.'),
+    ('gpu_sm_clock_mhz', 'gauge', 'GPU streaming multiprocessor clock.'),
+    ('temperature_celsius', 'gauge', 'Hardware sensor temperature.'),
+    ('fan_speed_rpm', 'gauge', 'Fan speed.'),
+    ('battery_percent', 'gauge', 'Battery charge.'),
+    ('battery_power_plugged', 'gauge', 'Whether the machine runs on external power.'),
+    ('battery_seconds_left', 'gauge', 'Estimated battery time left.'),
+    ('pressure_stall_seconds_total', 'counter', 'Time tasks stalled waiting on a resource (PSI).'),
+    ('cgroup_cpu_usage_seconds_total', 'counter', 'CPU time used by this process\'s cgroup.'),
+    ('cgroup_cpu_throttled_seconds_total', 'counter', 'Time this process\'s cgroup was throttled by its CPU quota.'),
+    ('cgroup_cpu_limit_cores', 'gauge', 'CPU quota of this process\'s cgroup.'),
+    ('cgroup_memory_bytes', 'gauge', 'Memory charged to this process\'s cgroup.'),
+    ('cgroup_memory_limit_bytes', 'gauge', 'Memory limit of this process\'s cgroup.'),
+    ('process_cpu_percent', 'gauge', 'CPU usage of the busiest processes.'),
+    ('process_resident_memory_bytes', 'gauge', 'Resident memory of the largest processes.'),
+    ('alerts_active', 'gauge', 'Alerts currently pending or firing.'),
+)
+
+_HEADERS = {
+    name: f'# HELP {PREFIX}{name} {help_text}\n# TYPE {PREFIX}{name} {metric_type}\n'
+    for name, metric_type, help_text in FAMILIES
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return 'NaN'
+    return repr(float(value))
+
+
+class PrometheusExporter:
+    """
+    Renders the latest sampler snapshot in the Prometheus text format. The
+    text is rendered at most once per snapshot and cached, so scrapes are a
+    dictionary lookup and never trigger collection.
+    """
+
+    def __init__(self, sampler, process_table=None, alerts=None, static_facts=None):
+        self.sampler = sampler
+        self.process_table = process_table
+        self.alerts = alerts
+        self.static_facts = static_facts
+        self._labels = {}
+        self._cache = (None, b'')
+        self._lock = threading.Lock()
+
+    def render(self):
+        snapshot = self.sampler.get_snapshot()
+        seq, body = self._cache
+        if seq == snapshot.seq:
+            return body
+        with self._lock:
+            if self._cache[0] != snapshot.seq:
+                self._cache = (snapshot.seq, self._render(snapshot).encode())
+            return self._cache[1]
+
+    def _label_string(self, labels):
+        # Label sets repeat every scrape (same cores, disks, NICs), so the
+        # formatted strings are cached
+        text = self._labels.get(labels)
+        if text is None:
+            if len(self._labels) >= MAX_CACHED_LABELS:
+                self._labels.clear()
+            text = '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+            self._labels[labels] = text
+        return text
+
+    def _render(self, snapshot):
+        families = {name: [] for name in _HEADERS}
+
+        def add(name, value, labels=()):
+            if value is None:
+                return
+            label_text = self._label_string(labels) if labels else ''
+            families[name].append(f'{PREFIX}{name}{label_text} {_format_value(value)}\n')
+
+        add('snapshot_sequence', snapshot.seq)
+        add('snapshot_timestamp_seconds', snapshot.timestamp)
+        if self.static_facts is not None:
+            add('boot_time_seconds', self.static_facts.get().get('boot_time'))
+
+        add('cpu_usage_percent', snapshot.cpu_percent)
+        for core, percent in enumerate(snapshot.cpu_per_core):
+            add('cpu_core_usage_percent', percent, (('core', core),))
+        if snapshot.cpu_freq:
+            add('cpu_frequency_mhz', snapshot.cpu_freq.current)
+        if snapshot.cpu_stats:
+            add('cpu_context_switches_total', snapshot.cpu_stats.ctx_switches)
+            add('cpu_interrupts_total', snapshot.cpu_stats.interrupts)
+            add('cpu_soft_interrupts_total', snapshot.cpu_stats.soft_interrupts)
+        if snapshot.load_avg:
+            for period, value in zip(('1m', '5m', '15m'), snapshot.load_avg):
+                add('load_average', value, (('period', period),))
+
+        memory = snapshot.memory
+        for kind in memory._fields:
+            if kind != 'percent':
+                add('memory_bytes', getattr(memory, kind), (('kind', kind),))
+        add('memory_usage_percent', memory.percent)
+        swap = snapshot.swap
+        for kind in ('total', 'used', 'free'):
+            add('swap_bytes', getattr(swap, kind), (('kind', kind),))
+        add('swap_in_bytes_total', swap.sin)
+        add('swap_out_bytes_total', swap.sout)
+
+        for partition in snapshot.partitions:
+            labels = (('device', partition.device), ('mountpoint', partition.mountpoint), ('fstype', partition.fstype))
+            add('filesystem_size_bytes', partition.total, labels)
+            add('filesystem_used_bytes', partition.used, labels)
+            add('filesystem_free_bytes', partition.free, labels)
+
+        for disk, io in snapshot.disk_io_perdisk.items():
+            labels = (('device', disk),)
+            add('disk_reads_completed_total', io.read_count, labels)
+            add('disk_writes_completed_total', io.write_count, labels)
+            add('disk_read_bytes_total', io.read_bytes, labels)
+            add('disk_written_bytes_total', io.write_bytes, labels)
+            add('disk_read_time_seconds_total', io.read_time / 1000, labels)
+            add('disk_write_time_seconds_total', io.write_time / 1000, labels)
+            busy_time = getattr(io, 'busy_time', None)
+            add('disk_io_time_seconds_total', busy_time / 1000 if busy_time is not None else None, labels)
+
+        for nic, io in snapshot.net_io_pernic.items():
+            labels = (('interface', nic),)
+            add('network_receive_bytes_total', io.bytes_recv, labels)
+            add('network_transmit_bytes_total', io.bytes_sent, labels)
+            add('network_receive_packets_total', io.packets_recv, labels)
+            add('network_transmit_packets_total', io.packets_sent, labels)
+            add('network_receive_errors_total', io.errin, labels)
+            add('network_transmit_errors_total', io.errout, labels)
+            add('network_receive_drop_total', io.dropin, labels)
+            add('network_transmit_drop_total', io.dropout, labels)
+
+        for gpu in snapshot.gpus:
+            labels = (('gpu', gpu.index), ('name', gpu.name), ('uuid', gpu.uuid))
+            add('gpu_utilization_percent', gpu.utilization, labels)
+            add('gpu_memory_used_bytes', gpu.memory_used, labels)
+            add('gpu_memory_total_bytes', gpu.memory_total, labels)
+            add('gpu_temperature_celsius', gpu.temperature, labels)
+            add('gpu_power_watts', gpu.power_draw, labels)
+            add('gpu_fan_speed_percent', gpu.fan_speed, labels)
+            add('gpu_sm_clock_mhz', gpu.clock_sm, labels)
+
+        for sensor, entries in (snapshot.temperatures or {}).items():
+            for index, entry in enumerate(entries):
+                add('temperature_celsius', entry.current, (('sensor', sensor), ('label', entry.label or str(index))))
+        for sensor, entries in (snapshot.fans or {}).items():
+            for index, entry in enumerate(entries):
+                add('fan_speed_rpm', entry.current, (('sensor', sensor), ('label', entry.label or str(index))))
+
+        battery = snapshot.battery
+        if battery:
+            add('battery_percent', battery.percent)
+            add('battery_power_plugged', battery.power_plugged)
+            # psutil uses negative sentinels for "unknown" and "unlimited"
+            if isinstance(battery.secsleft, (int, float)) and battery.secsleft >= 0:
+                add('battery_seconds_left', battery.secsleft)
+
+        for resource, stalls in (snapshot.pressure or {}).items():
+            for kind, psi in stalls.items():
+                add('pressure_stall_seconds_total', psi.total / 1e6, (('resource', resource), ('kind', kind)))
+        cgroup = snapshot.cgroup
+        if cgroup:
+            labels = (('cgroup', cgroup.path),)
+            add('cgroup_cpu_usage_seconds_total', cgroup.usage_usec / 1e6, labels)
+            add('cgroup_cpu_throttled_seconds_total', cgroup.throttled_usec / 1e6, labels)
+            add('cgroup_cpu_limit_cores', cgroup.cpu_limit, labels)
+            add('cgroup_memory_bytes', cgroup.memory_current, labels)
+            add('cgroup_memory_limit_bytes', cgroup.memory_max, labels)
+
+        if self.process_table is not None:
+            for row in self.process_table.top('cpu', TOP_PROCESSES):
+                add('process_cpu_percent', row['cpu_percent'], (('pid', row['pid']), ('name', row['name'])))
+            for row in self.process_table.top('rss', TOP_PROCESSES):
+                add('process_resident_memory_bytes', row['rss'], (('pid', row['pid']), ('name', row['name'])))
+
+        if self.alerts is not None:
+            counts = {}
+            for alert in self.alerts.active():
+                key = (alert['severity'], alert['state'])
+                counts[key] = counts.get(key, 0) + 1
+            for (severity, state), count in sorted(counts.items()):
+                add('alerts_active', count, (('severity', severity), ('state', state)))
+
+        return ''.join(
+            _HEADERS[name] + ''.join(lines)
+            for name, lines in families.items() if lines
+        )
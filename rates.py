@@ -0,0 +1,91 @@
+import math
+
+# Exponentially weighted moving averages reported for every rate
+EWMA_WINDOWS = (('1m', 60), ('5m', 300), ('15m', 900))
+
+COUNTER_32_MAX = 2 ** 32
+COUNTER_64_MAX = 2 ** 64
+
+
+def counter_delta(previous, current):
+    """
+    Difference between two readings of a monotonically increasing counter.
+    A smaller reading is treated as a 32-bit or 64-bit wraparound when that
+    gives a plausible delta, otherwise as a counter reset.
+    """
+    if current >= previous:
+        return current - previous
+    if previous < COUNTER_32_MAX:
+        wrapped = current + COUNTER_32_MAX - previous
+        if wrapped < COUNTER_32_MAX // 2:
+            return wrapped
+    elif previous < COUNTER_64_MAX:
+        wrapped = current + COUNTER_64_MAX - previous
+        if wrapped < COUNTER_64_MAX // 2:
+            return wrapped
+    return current
+
+
+class CounterRates:
+    """
+    Turns cumulative counters (namedtuples keyed by device) into per-second
+    rates plus 1, 5 and 15 minute EWMAs. The previous sample is kept per
+    key; keys that disappear are forgotten.
+    """
+
+    def __init__(self, fields, windows=EWMA_WINDOWS):
+        self.fields = tuple(fields)
+        self.windows = tuple(windows)
+        self._previous = {}
+        self._ewma = {}
+        self._rates = {}
+
+    def update(self, timestamp, counters):
+        rates = {}
+        ewma = {}
+        for key, sample in counters.items():
+            if sample is None:
+                continue
+            values = tuple(getattr(sample, field, 0) or 0 for field in self.fields)
+            previous = self._previous.get(key)
+            self._previous[key] = (timestamp, values)
+            if previous is None:
+                continue
+            elapsed = timestamp - previous[0]
+            if elapsed <= 0:
+                continue
+
+            current = [counter_delta(old, new) / elapsed for old, new in zip(previous[1], values)]
+            averages = self._ewma.get(key)
+            if averages is None:
+                averages = {name: list(current) for name, _ in self.windows}
+            else:
+                for name, window in self.windows:
+                    alpha = 1 - math.exp(-elapsed / window)
+                    averages[name] = [avg + alpha * (rate - avg) for avg, rate in zip(averages[name], current)]
+            ewma[key] = averages
+            rates[key] = {
+                'per_second': dict(zip(self.fields, current)),
+                'ewma': {name: dict(zip(self.fields, values)) for name, values in averages.items()}
+            }
+
+        for key in list(self._previous):
+            if key not in counters:
+                del self._previous[key]
+        self._ewma = ewma
+        self._rates = rates
+        return rates
+
+    def rates(self):
+        return self._rates
+
+
+def round_rates(rates, digits=2):
+    # Copy of a rates entry with every value rounded, for JSON responses
+    return {
+        'per_second': {field: round(value, digits) for field, value in rates['per_second'].items()},
+        'ewma': {
+            name: {field: round(value, digits) for field, value in values.items()}
+            for name, values in rates['ewma'].items()
+        }
+    }
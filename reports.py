@@ -0,0 +1,203 @@
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+from collections.abc import Iterator, Mapping
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Absolute, so the writer and the download route agree whatever the CWD
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+# File suffix and download mimetype per output compression
+COMPRESSIONS = {
+    'none': ('.json', 'application/json'),
+    'gzip': ('.json.gz', 'application/gzip'),
+    'zstd': ('.json.zst', 'application/zstd'),
+}
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 32
+# Reports built at the same time; further requests are refused
+MAX_ACTIVE_JOBS = 2
+# Encoded text is written out in chunks of roughly this many characters
+WRITE_CHUNK = 64 * 1024
+
+
+class ReportLimitError(Exception):
+    pass
+
+
+def _default(value):
+    # numpy scalars and arrays, read-only mappings, anything else as text
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+
+_encode = json.JSONEncoder(default=_default).encode
+
+
+def iter_json(value):
+    """
+    Encode value as JSON piece by piece. Generators and other iterators are
+    written as arrays while they are consumed, so a report never has to be
+    materialised in memory as a whole.
+    """
+    if isinstance(value, Mapping):
+        yield '{'
+        first = True
+        for key, item in value.items():
+            if not first:
+                yield ','
+            first = False
+            yield _encode(str(key))
+            yield ':'
+            yield from iter_json(item)
+        yield '}'
+    elif isinstance(value, (list, Iterator)) or (isinstance(value, tuple) and not hasattr(value, '_fields')):
+        yield '['
+        first = True
+        for item in value:
+            if not first:
+                yield ','
+            first = False
+            yield from iter_json(item)
+        yield ']'
+    elif isinstance(value, tuple):
+        # namedtuples are written as objects
+        yield from iter_json(value._asdict())
+    else:
+        yield _encode(value)
+
+
+def open_compressed(path, compression='none'):
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    return open(path, 'wb')
+
+
+def write_json(path, value, compression='none'):
+    # Written to a temporary name and renamed, so downloads never see a partial file
+    temp_path = f"{path}.tmp"
+    size = 0
+    try:
+        with open_compressed(temp_path, compression) as f:
+            pending = []
+            pending_size = 0
+            for chunk in iter_json(value):
+                pending.append(chunk)
+                pending_size += len(chunk)
+                if pending_size >= WRITE_CHUNK:
+                    data = ''.join(pending).encode()
+                    f.write(data)
+                    size += len(data)
+                    pending = []
+                    pending_size = 0
+            data = ''.join(pending).encode()
+            f.write(data)
+            size += len(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return size
+
+
+def check_compression(compression):
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {compression}")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+
+
+def report_mimetype(filename):
+    for suffix, mimetype in sorted(COMPRESSIONS.values(), key=lambda item: -len(item[0])):
+        if filename.endswith(suffix):
+            return mimetype
+    return None
+
+
+class ReportJobs:
+    """
+    Builds reports on background threads. start() returns a job straight
+    away; the report is streamed to REPORTS_DIR and the job records the
+    file name once it is complete.
+    """
+
+    def __init__(self, directory=REPORTS_DIR, max_active=MAX_ACTIVE_JOBS):
+        self.directory = directory
+        self.max_active = max_active
+        self._builders = {}
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def register(self, kind, builder, prefix=None):
+        # builder(**params) returns the report; prefix names its files
+        self._builders[kind] = (builder, prefix or f'{kind}_report')
+
+    def start(self, kind='performance', compression='none', **params):
+        if kind not in self._builders:
+            raise ValueError(f"Unknown report kind: {kind}")
+        check_compression(compression)
+        builder, prefix = self._builders[kind]
+        job_id = uuid.uuid4().hex[:12]
+        timestamp = datetime.now()
+        suffix = COMPRESSIONS[compression][0]
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'running',
+            'compression': compression,
+            'filename': f"{prefix}_{timestamp.strftime('%Y%m%d_%H%M%S')}_{job_id[:6]}{suffix}",
+            'timestamp': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            'params': params,
+            'size': None,
+            'json_bytes': None,
+            'started_at': time.time(),
+            'finished_at': None,
+            'error': None
+        }
+        with self._lock:
+            active = sum(1 for item in self._jobs.values() if item['finished_at'] is None)
+            if active >= self.max_active:
+                raise ReportLimitError(f"Too many reports being built (limit {self.max_active}); try again later")
+            self._jobs[job_id] = job
+
+        thread = threading.Thread(target=self._run_job, args=(job, builder), name=f'report-{job_id}')
+        thread.daemon = True
+        thread.start()
+        return dict(job)
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _run_job(self, job, builder):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            report = builder(**job['params'])
+            path = os.path.join(self.directory, job['filename'])
+            job['json_bytes'] = write_json(path, report, job['compression'])
+            job['size'] = os.path.getsize(path)
+            job['status'] = 'done'
+        except Exception as e:
+            job['status'] = 'error'
+            job['error'] = str(e)
+        job['finished_at'] = time.time()
+
+        with self._lock:
+            finished = [item for item in self._jobs.values() if item['finished_at'] is not None]
+            finished.sort(key=lambda item: item['finished_at'])
+            for item in finished[:-MAX_FINISHED_JOBS]:
+                del self._jobs[item['job_id']]
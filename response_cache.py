@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Cached bodies kept across all endpoints and query strings
+MAX_ENTRIES = 512
+
+ENCODERS = {'gzip': lambda body: gzip.compress(body, GZIP_LEVEL)}
+if brotli is not None:
+    ENCODERS['br'] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+# Best compression first
+ENCODING_PREFERENCE = ('br', 'gzip')
+
+
+def negotiate_encoding(body_size):
+    if body_size < MIN_COMPRESS_SIZE:
+        return None
+    accepted = request.accept_encodings
+    for encoding in ENCODING_PREFERENCE:
+        if encoding in ENCODERS and accepted.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress_response(response):
+    """
+    after_request hook: compress JSON responses that did not come from the
+    cache (POSTs, job polls, error pages) when the client accepts it.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+    body = response.get_data()
+    encoding = negotiate_encoding(len(body))
+    response.vary.add('Accept-Encoding')
+    if encoding is not None:
+        response.set_data(ENCODERS[encoding](body))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class _Entry:
+    __slots__ = ('version', 'expires', 'status', 'mimetype', 'body', 'etag', 'encoded', 'lock')
+
+    def __init__(self, version, expires, response):
+        self.version = version
+        self.expires = expires
+        self.status = response.status_code
+        self.mimetype = response.mimetype
+        self.body = response.get_data()
+        self.etag = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.encoded = {}
+        self.lock = threading.Lock()
+
+    def is_fresh(self, version, now):
+        if self.expires is not None:
+            return now < self.expires
+        return self.version == version
+
+    def encode(self, encoding):
+        # Each cached body is compressed at most once per encoding
+        data = self.encoded.get(encoding)
+        if data is None:
+            with self.lock:
+                data = self.encoded.get(encoding)
+                if data is None:
+                    data = self.encoded[encoding] = ENCODERS[encoding](self.body)
+        return data
+
+
+class ResponseCache:
+    """
+    Serialized GET responses kept per endpoint and query string. A body is
+    built, JSON-encoded and hashed once, then served to every client until
+    the sampler publishes a new snapshot or, for slow sections, until its
+    TTL runs out. Clients revalidate with If-None-Match and get a 304 when
+    the body has not changed.
+    """
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.after_request(compress_response)
+
+    def cached(self, ttl=None):
+        """
+        View decorator. With ttl=None the response lives until the next
+        sampler tick; with ttl=N it lives N seconds whatever the ticks.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                return self._respond(view, ttl, args, kwargs)
+            return wrapper
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._building.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _respond(self, view, ttl, args, kwargs):
+        key = (request.endpoint, tuple(sorted(request.args.items(multi=True))), tuple(sorted(kwargs.items())))
+        version = self.sampler.get_snapshot().seq if ttl is None else None
+        entry = self._entries.get(key)
+        if entry is None or not entry.is_fresh(version, time.monotonic()):
+            # One request rebuilds an expired body; concurrent ones wait for it
+            with self._lock:
+                building = self._building.setdefault(key, threading.Lock())
+            try:
+                with building:
+                    entry = self._entries.get(key)
+                    if entry is None or not entry.is_fresh(version, time.monotonic()):
+                        response = current_app.make_response(view(*args, **kwargs))
+                        self.misses += 1
+                        # Errors and streams are not cached, so a client
+                        # cycling bad query strings cannot fill the cache
+                        if response.status_code != 200 or response.is_streamed or response.direct_passthrough:
+                            return response
+                        expires = time.monotonic() + ttl if ttl is not None else None
+                        entry = _Entry(version, expires, response)
+                        with self._lock:
+                            if len(self._entries) >= MAX_ENTRIES:
+                                self._entries.clear()
+                            self._entries[key] = entry
+                    else:
+                        self.hits += 1
+            finally:
+                # Build locks only live while a rebuild is in progress
+                with self._lock:
+                    if self._building.get(key) is building:
+                        del self._building[key]
+        else:
+            self.hits += 1
+        return self._serve(entry, ttl)
+
+    def _serve(self, entry, ttl):
+        max_age = ttl if ttl is not None else max(1, int(self.sampler.interval))
+        encoding = negotiate_encoding(len(entry.body))
+        # Each encoding is a different representation and needs its own
+        # strong ETag, or a cache could answer a gzip request with br bytes
+        etag = f'{entry.etag}-{encoding}' if encoding else entry.etag
+        if entry.status == 200 and request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            body = entry.encode(encoding) if encoding else entry.body
+            response = Response(body, status=entry.status, mimetype=entry.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f'private, max-age={max_age}'
+        response.vary.add('Accept-Encoding')
+        return response
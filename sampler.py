@@ -0,0 +1,448 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+import psutil
+
+from cgroups import read_own_cgroup, read_system_pressure
+from gpu import create_gpu_backend
+from instrumentation import self_stats
+from procfs import create_backend
+from rates import CounterRates
+
+# One immutable view of the machine, published once per tick. Readers only
+# ever swap in a reference to a whole snapshot, so they never see a half
+# updated state and never need a lock.
+Snapshot = namedtuple('Snapshot', [
+    'seq',
+    'timestamp',
+    'interval',
+    'cpu_percent',
+    'cpu_per_core',
+    'cpu_freq',
+    'cpu_stats',
+    'load_avg',
+    'memory',
+    'swap',
+    'disk_usage',
+    'partitions',
+    'disk_io',
+    'disk_io_perdisk',
+    'disk_rates',
+    'disk_stats',
+    'net_io',
+    'net_io_pernic',
+    'net_rates',
+    'temperatures',
+    'fans',
+    'battery',
+    'gpus',
+    'cgroup',
+    'pressure',
+    # Metric groups collected on this tick; the other fields are carried
+    # over from the tick that last collected their group
+    'fresh',
+    # Metric group -> wall clock time it was last collected
+    'collected_at',
+])
+
+PartitionUsage = namedtuple('PartitionUsage', [
+    'device', 'mountpoint', 'fstype', 'total', 'used', 'free', 'percent'
+])
+
+# Counters turned into per-second rates on every tick
+NET_RATE_FIELDS = (
+    'bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin', 'dropout'
+)
+DISK_RATE_FIELDS = (
+    'read_count', 'write_count', 'read_bytes', 'write_bytes', 'read_time', 'write_time', 'busy_time'
+)
+
+# Short priming window used only when a snapshot is requested before the
+# sampler thread has produced one.
+PRIME_INTERVAL = 0.1
+
+# Metric groups and how many ticks apart each is collected; in between, a
+# snapshot carries the group's previous values forward. Cheap, volatile
+# counters go every tick, slow or static readings less often.
+METRIC_GROUPS = {
+    'cpu': 1,          # cpu times, cpu stats, load average
+    'memory': 1,       # memory and swap
+    'net': 1,          # interface counters and rates
+    'disk_io': 1,      # disk counters, rates and /proc/diskstats
+    'cgroup': 2,       # own cgroup and system pressure
+    'gpu': 2,
+    'sensors': 5,      # temperatures, fans, battery, cpu frequency
+    'partitions': 30,  # usage of the root disk and every partition
+}
+# A boosted group (e.g. a metric close to an alert threshold) is collected
+# on every tick for this many base intervals
+BOOST_TICKS = 10
+# With no client for IDLE_AFTER seconds, nothing boosted and the CPU below
+# IDLE_CPU_PERCENT, the tick period doubles every tick up to MAX_BACKOFF
+# base intervals
+IDLE_AFTER = 60.0
+IDLE_CPU_PERCENT = 25.0
+MAX_BACKOFF = 8
+
+
+def _cpu_busy_and_total(times):
+    # Same accounting as psutil.cpu_percent(): guest time is already part of
+    # user time on Linux and iowait counts as idle.
+    total = sum(times)
+    total -= getattr(times, 'guest', 0.0)
+    total -= getattr(times, 'guest_nice', 0.0)
+    idle = times.idle + getattr(times, 'iowait', 0.0)
+    return total - idle, total
+
+
+def _cpu_percent_between(before, after):
+    busy_before, total_before = _cpu_busy_and_total(before)
+    busy_after, total_after = _cpu_busy_and_total(after)
+    total_delta = total_after - total_before
+    if total_delta <= 0:
+        return 0.0
+    percent = (busy_after - busy_before) / total_delta * 100
+    return round(min(max(percent, 0.0), 100.0), 1)
+
+
+class ResourceSampler:
+    """
+    Collects a Snapshot every interval seconds on its own thread. Each
+    metric group has its own period (METRIC_GROUPS); groups near an alert
+    threshold are boosted to every tick, and the whole schedule backs off
+    while the host is idle and no client is watching (see touch()).
+    """
+
+    def __init__(self, interval=1.0, disk_path='/', backend=None, gpu_backend=None, groups=None):
+        # Base tick period; the current one is interval * backoff
+        self.interval = interval
+        self.disk_path = disk_path
+        # groups overrides the period of some groups, e.g. {'partitions': 60}
+        self.groups = dict(METRIC_GROUPS)
+        self.groups.update(groups or {})
+        self.backoff = 1
+        self._countdown = dict.fromkeys(self.groups, 0)
+        self._boosts = {}
+        self._fields = {}
+        self._collected_at = {}
+        self._last_demand = time.monotonic()
+        self._wakeup = threading.Event()
+        self._backend = backend
+        self._gpu_backend = gpu_backend
+        self._snapshot = None
+        self._seq = 0
+        self._last_cpu_times = None
+        self._last_cpu_times_per_core = None
+        self._net_rates = CounterRates(NET_RATE_FIELDS)
+        self._disk_rates = CounterRates(DISK_RATE_FIELDS)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def backend(self):
+        # Chosen lazily so importing this module never touches /proc
+        if self._backend is None:
+            self._backend = create_backend()
+        return self._backend
+
+    @property
+    def gpu_backend(self):
+        if self._gpu_backend is None:
+            self._gpu_backend = create_gpu_backend(interval=self.interval)
+        return self._gpu_backend
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.is_running:
+                return
+            self._stop_event.clear()
+            self._wakeup.clear()
+            self._thread = threading.Thread(target=self._run, name='resource-sampler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    def add_listener(self, callback):
+        # Listeners are called from the sampler thread with every new snapshot
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    @property
+    def current_interval(self):
+        return self.interval * self.backoff
+
+    def touch(self):
+        """
+        A client is watching: sample at the base rate for the next
+        IDLE_AFTER seconds, waking the sampler at once if it backed off.
+        """
+        self._last_demand = time.monotonic()
+        self._speed_up()
+
+    def boost(self, group, duration=None):
+        # Collect group on every tick for a while, starting with the next
+        if group not in self.groups:
+            return
+        self._boosts[group] = time.monotonic() + (duration or BOOST_TICKS * self.interval)
+        self._countdown[group] = 0
+        self._speed_up()
+
+    def _speed_up(self):
+        if self.backoff > 1:
+            self.backoff = 1
+            self._wakeup.set()
+
+    def get_schedule(self):
+        now = time.monotonic()
+        return {
+            'interval': self.interval,
+            'current_interval': self.current_interval,
+            'backoff': self.backoff,
+            'idle_seconds': round(now - self._last_demand, 1),
+            'groups': {
+                group: {
+                    'every_ticks': every,
+                    'boosted_for': round(max(self._boosts.get(group, now) - now, 0.0), 1)
+                }
+                for group, every in self.groups.items()
+            }
+        }
+
+    def get_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.sample_now()
+        return snapshot
+
+    def sample_now(self):
+        with self._lock:
+            if self._last_cpu_times is None:
+                self._prime_cpu_times()
+                time.sleep(PRIME_INTERVAL)
+            snapshot = self._collect()
+            self._snapshot = snapshot
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                self_stats.call('listeners', getattr(callback, '__qualname__', repr(callback)), callback, snapshot)
+            except Exception:
+                # Counted with the exception in self_stats
+                pass
+        return snapshot
+
+    def _run(self):
+        if self._last_cpu_times is None:
+            with self._lock:
+                self._prime_cpu_times()
+        next_tick = time.monotonic() + (PRIME_INTERVAL if self._snapshot is None else self.interval)
+        while True:
+            # touch() and boost() cut a backed-off wait short
+            woken = self._wakeup.wait(max(next_tick - time.monotonic(), 0))
+            if self._stop_event.is_set():
+                return
+            self._wakeup.clear()
+            if woken:
+                next_tick = time.monotonic()
+            else:
+                self_stats.record_jitter(time.monotonic() - next_tick)
+            snapshot = None
+            try:
+                snapshot = self_stats.call('sampler', 'tick', self.sample_now)
+            except Exception:
+                pass
+            if snapshot is not None and self._is_idle(snapshot):
+                self.backoff = min(self.backoff * 2, MAX_BACKOFF)
+            else:
+                self.backoff = 1
+            # Schedule against a fixed grid so slow ticks do not drift
+            next_tick += self.current_interval
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic() + self.current_interval
+
+    def _is_idle(self, snapshot):
+        # Back off only when nobody is watching, nothing is near a threshold
+        # and the host itself is quiet
+        now = time.monotonic()
+        return (
+            now - self._last_demand >= IDLE_AFTER
+            and not any(until > now for until in self._boosts.values())
+            and snapshot.cpu_percent < IDLE_CPU_PERCENT
+        )
+
+    def _prime_cpu_times(self):
+        self.backend.begin_tick(('cpu',))
+        self._last_cpu_times, self._last_cpu_times_per_core = self.backend.cpu_times()
+
+    def _due_groups(self):
+        now = time.monotonic()
+        due = []
+        for group, every in self.groups.items():
+            self._countdown[group] -= 1
+            if self._countdown[group] <= 0:
+                due.append(group)
+                self._countdown[group] = 1 if self._boosts.get(group, 0) > now else every
+        return due
+
+    def _collect(self):
+        backend = self.backend
+        due = self._due_groups()
+        # Only the sources of the due groups are read
+        backend.begin_tick(due)
+        now = time.monotonic()
+        fields = self._fields
+        for group in due:
+            fields.update(getattr(self, f'_collect_{group}')(backend, now))
+
+        self._seq += 1
+        timestamp = time.time()
+        self._collected_at.update(dict.fromkeys(due, timestamp))
+        return Snapshot(
+            seq=self._seq,
+            timestamp=timestamp,
+            interval=self.current_interval,
+            fresh=frozenset(due),
+            collected_at=MappingProxyType(dict(self._collected_at)),
+            **fields
+        )
+
+    def _collect_cpu(self, backend, now):
+        cpu_times, cpu_times_per_core = self_stats.call('sampler', 'cpu_times', backend.cpu_times)
+        cpu_percent = _cpu_percent_between(self._last_cpu_times, cpu_times)
+        cpu_per_core = tuple(
+            _cpu_percent_between(before, after)
+            for before, after in zip(self._last_cpu_times_per_core, cpu_times_per_core)
+        )
+        self._last_cpu_times = cpu_times
+        self._last_cpu_times_per_core = cpu_times_per_core
+        return {
+            'cpu_percent': cpu_percent,
+            'cpu_per_core': cpu_per_core,
+            'cpu_stats': self._safe('cpu_stats', backend.cpu_stats),
+            'load_avg': self._safe('load_avg', backend.load_avg),
+        }
+
+    def _collect_memory(self, backend, now):
+        return {
+            'memory': self_stats.call('sampler', 'memory', backend.memory),
+            'swap': self_stats.call('sampler', 'swap', backend.swap),
+        }
+
+    def _collect_net(self, backend, now):
+        net_io = self._safe('net_io', backend.net_io)
+        net_io_pernic = self._safe('net_io_pernic', backend.net_io_pernic) or {}
+        return {
+            'net_io': net_io,
+            'net_io_pernic': MappingProxyType(dict(net_io_pernic)),
+            'net_rates': self._collect_rates(self._net_rates, now, net_io, net_io_pernic),
+        }
+
+    def _collect_disk_io(self, backend, now):
+        disk_io = self._safe('disk_io', backend.disk_io)
+        disk_io_perdisk = self._safe('disk_io_perdisk', backend.disk_io_perdisk) or {}
+        disk_stats = self._safe('disk_stats', backend.disk_stats) or {}
+        return {
+            'disk_io': disk_io,
+            'disk_io_perdisk': MappingProxyType(dict(disk_io_perdisk)),
+            'disk_rates': self._collect_rates(self._disk_rates, now, disk_io, disk_io_perdisk),
+            'disk_stats': MappingProxyType(dict(disk_stats)),
+        }
+
+    def _collect_cgroup(self, backend, now):
+        # This process's cgroup v2 counters and the system PSI, so readers
+        # can report container limits and contention
+        return {
+            'cgroup': self._safe('cgroup', read_own_cgroup),
+            'pressure': self._safe('pressure', read_system_pressure),
+        }
+
+    def _collect_gpu(self, backend, now):
+        return {'gpus': self._safe('gpus', self.gpu_backend.sample) or ()}
+
+    def _collect_sensors(self, backend, now):
+        return {
+            'cpu_freq': self._safe('cpu_freq', psutil.cpu_freq),
+            'temperatures': self._read_sensors('sensors_temperatures'),
+            'fans': self._read_sensors('sensors_fans'),
+            'battery': self._safe('battery', psutil.sensors_battery) if hasattr(psutil, 'sensors_battery') else None,
+        }
+
+    def _collect_partitions(self, backend, now):
+        return {
+            'disk_usage': self._safe('disk_usage', psutil.disk_usage, self.disk_path),
+            'partitions': self_stats.call('sampler', 'partitions', self._read_partitions),
+        }
+
+    @staticmethod
+    def _collect_rates(engine, now, total, per_device):
+        # Rates for the machine-wide total and for each device
+        counters = {('device', name): counters for name, counters in per_device.items()}
+        counters[('total',)] = total
+        rates = engine.update(now, counters)
+        return MappingProxyType({
+            'total': rates.get(('total',)),
+            'devices': {key[1]: value for key, value in rates.items() if key[0] == 'device'}
+        })
+
+    def _read_partitions(self):
+        partitions = []
+        for partition in psutil.disk_partitions():
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except Exception:
+                continue
+            partitions.append(PartitionUsage(
+                partition.device, partition.mountpoint, partition.fstype,
+                usage.total, usage.used, usage.free, usage.percent
+            ))
+        return tuple(partitions)
+
+    def _read_sensors(self, name):
+        if not hasattr(psutil, name):
+            return None
+        readings = self._safe(name, getattr(psutil, name))
+        if readings is None:
+            return None
+        return MappingProxyType({key: tuple(entries) for key, entries in readings.items()})
+
+    @staticmethod
+    def _safe(name, func, *args):
+        # Optional readings: a failure leaves the field None and is counted
+        # under the step's name in self_stats
+        try:
+            return self_stats.call('sampler', name, func, *args)
+        except Exception:
+            return None
+
+
+# Shared instance used by the collectors and the Flask app
+resource_sampler = ResourceSampler()
+
+
+def use_sampler(sampler):
+    # Swap the shared instance, e.g. for a reader of another process's snapshots
+    global resource_sampler
+    resource_sampler = sampler
+
+
+def get_snapshot():
+    return resource_sampler.get_snapshot()
@@ -0,0 +1,148 @@
+"""
+Production entry point.
+
+    python serve.py --host 0.0.0.0 --port 5000 --workers 4
+
+This process is the collector: it runs the only sampler, process table,
+history store and alert engine, publishes each snapshot to shared memory
+and answers stateful calls on a Unix socket. The HTTP workers (gunicorn
+when installed, otherwise pre-forked werkzeug servers sharing one
+listening socket) only read from it, so N workers cost one collection.
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from collector import COLLECTOR_SOCKET_ENV, FLEET_LISTEN_ENV, SNAPSHOT_SHM_ENV, CollectorServer, build_monitoring
+from sampler import resource_sampler
+from shared_snapshot import SnapshotPublisher
+
+# Seconds between checks for exited workers
+SUPERVISE_INTERVAL = 1.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the hardware monitor with a shared collector')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 4))
+    parser.add_argument('--threads', type=int, default=8, help='request threads per worker')
+    parser.add_argument('--interval', type=float, default=1.0, help='sampler interval in seconds')
+    parser.add_argument('--server', choices=('auto', 'gunicorn', 'werkzeug'), default='auto')
+    parser.add_argument('--fleet-listen', help='accept fleet agents on unix:/path or host:port; '
+                        'addresses other than loopback need HWMON_FLEET_TOKEN')
+    # Internal: run one werkzeug worker on an inherited listening socket
+    parser.add_argument('--worker-fd', type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def run_worker(args):
+    # Imported here: importing app outside a worker would start collection
+    from werkzeug.serving import make_server
+    from app import app
+
+    server = make_server(args.host, args.port, app, threaded=True, fd=args.worker_fd)
+    server.serve_forever()
+
+
+def _has_gunicorn():
+    try:
+        import gunicorn  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def start_workers(args, env):
+    if args.server == 'gunicorn' or (args.server == 'auto' and _has_gunicorn()):
+        command = [
+            sys.executable, '-m', 'gunicorn',
+            '--bind', f'{args.host}:{args.port}',
+            '--workers', str(args.workers),
+            '--worker-class', 'gthread',
+            '--threads', str(args.threads),
+            # app:app is imported from this checkout whatever the CWD
+            '--chdir', os.path.dirname(os.path.abspath(__file__)),
+            'app:app'
+        ]
+        return None, [lambda: subprocess.Popen(command, env=env)]
+
+    # Pre-fork: every worker accepts on the same socket and the kernel
+    # spreads connections between them
+    listener = socket.create_server((args.host, args.port), backlog=128)
+    listener.set_inheritable(True)
+    fd = listener.fileno()
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        '--host', args.host, '--port', str(args.port), '--worker-fd', str(fd)
+    ]
+    spawn = lambda: subprocess.Popen(command, env=env, pass_fds=(fd,))
+    return listener, [spawn] * args.workers
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker_fd is not None:
+        run_worker(args)
+        return
+
+    resource_sampler.interval = args.interval
+    if args.fleet_listen:
+        # Also inherited by the workers, which then proxy the fleet routes
+        os.environ[FLEET_LISTEN_ENV] = args.fleet_listen
+    monitoring = build_monitoring()
+    publisher = SnapshotPublisher()
+    publisher.attach(resource_sampler)
+    # Private (0700) directory, so nobody else can reach the socket at all
+    socket_dir = tempfile.mkdtemp(prefix='hwmon-collector-')
+    socket_path = os.path.join(socket_dir, 'collector.sock')
+    server = CollectorServer(socket_path, monitoring)
+    server.start()
+
+    env = dict(os.environ)
+    env[COLLECTOR_SOCKET_ENV] = socket_path
+    env[SNAPSHOT_SHM_ENV] = publisher.name
+    listener, spawners = start_workers(args, env)
+    workers = [spawn() for spawn in spawners]
+    print(f"Hardware Monitor collector {os.getpid()} serving http://{args.host}:{args.port} "
+          f"with {args.workers} workers")
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    try:
+        while not stopping:
+            time.sleep(SUPERVISE_INTERVAL)
+            for index, worker in enumerate(workers):
+                if worker.poll() is not None:
+                    print(f"Worker {worker.pid} exited with {worker.returncode}, restarting")
+                    workers[index] = spawners[index]()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+        for worker in workers:
+            try:
+                worker.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        if listener is not None:
+            listener.close()
+        publisher.detach(resource_sampler)
+        monitoring['monitor'].stop_resource_monitoring()
+        resource_sampler.stop()
+        server.close()
+        os.rmdir(socket_dir)
+        publisher.close()
+        if 'fleet' in monitoring:
+            monitoring['fleet'].close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import copyreg
+import pickle
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from types import MappingProxyType
+
+from instrumentation import self_stats
+
+
+def _read_only_mapping(items):
+    return MappingProxyType(items)
+
+
+# Snapshots hold read-only mappings, which pickle does not support natively
+copyreg.pickle(MappingProxyType, lambda mapping: (_read_only_mapping, (dict(mapping),)))
+
+# Segment layout: version (odd while a write is in progress), payload length,
+# then the pickled snapshot
+HEADER = struct.Struct('<QQ')
+DEFAULT_SIZE = 4 * 1024 * 1024
+# Seconds a reader waits for the collector's first snapshot
+FIRST_SNAPSHOT_TIMEOUT = 10
+
+
+class SnapshotPublisher:
+    """
+    Collector side: writes every sampler snapshot into a shared memory
+    segment that worker processes read without any IPC round trip.
+    """
+
+    def __init__(self, name=None, size=DEFAULT_SIZE):
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._version = 0
+        HEADER.pack_into(self._shm.buf, 0, 0, 0)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def attach(self, sampler):
+        sampler.add_listener(self.publish)
+
+    def detach(self, sampler):
+        sampler.remove_listener(self.publish)
+
+    def publish(self, snapshot):
+        data = pickle.dumps(snapshot, pickle.HIGHEST_PROTOCOL)
+        if HEADER.size + len(data) > self._shm.size:
+            raise ValueError(f"Snapshot of {len(data)} bytes does not fit the shared segment")
+        buf = self._shm.buf
+        # Seqlock: readers retry if the version is odd or changes under them
+        self._version += 1
+        HEADER.pack_into(buf, 0, self._version, 0)
+        buf[HEADER.size:HEADER.size + len(data)] = data
+        self._version += 1
+        HEADER.pack_into(buf, 0, self._version, len(data))
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedSnapshotSampler:
+    """
+    Worker side stand-in for ResourceSampler. get_snapshot() unpickles the
+    collector's latest snapshot at most once per tick; listeners (e.g. the
+    SSE stream) are driven by a thread that watches the version counter.
+    """
+
+    def __init__(self, name, poll_interval=0.05):
+        self._shm = shared_memory.SharedMemory(name=name)
+        # The collector owns the segment; stop this process's resource
+        # tracker from unlinking it when the worker exits
+        resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self.poll_interval = poll_interval
+        self._cached = (0, None)
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def interval(self):
+        return self.get_snapshot().interval
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._lock:
+            if self.is_running:
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='shared-snapshot-reader')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def add_listener(self, callback):
+        with self._lock:
+            if callback not in self._listeners:
+                self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def get_snapshot(self):
+        deadline = time.monotonic() + FIRST_SNAPSHOT_TIMEOUT
+        while True:
+            version = HEADER.unpack_from(self._shm.buf, 0)[0]
+            cached_version, snapshot = self._cached
+            if version == cached_version and snapshot is not None:
+                return snapshot
+            if version and not version % 2:
+                snapshot = self._read()
+                if snapshot is not None:
+                    return snapshot
+            if time.monotonic() > deadline:
+                raise RuntimeError("No snapshot published by the collector")
+            time.sleep(0.01)
+
+    def sample_now(self):
+        # Workers never collect; the freshest data is the collector's
+        return self.get_snapshot()
+
+    def _read(self):
+        buf = self._shm.buf
+        version, length = HEADER.unpack_from(buf, 0)
+        if version % 2:
+            return None
+        data = bytes(buf[HEADER.size:HEADER.size + length])
+        if HEADER.unpack_from(buf, 0)[0] != version:
+            return None
+        snapshot = pickle.loads(data)
+        self._cached = (version, snapshot)
+        return snapshot
+
+    def _run(self):
+        seen = None
+        while not self._stop_event.wait(self.poll_interval):
+            try:
+                snapshot = self_stats.call('sampler', 'shared_read', self.get_snapshot)
+            except Exception:
+                # Counted with the exception in self_stats
+                continue
+            if snapshot.seq == seen:
+                continue
+            seen = snapshot.seq
+            with self._lock:
+                listeners = list(self._listeners)
+            for callback in listeners:
+                try:
+                    self_stats.call('listeners', getattr(callback, '__qualname__', repr(callback)), callback, snapshot)
+                except Exception:
+                    # Counted with the exception in self_stats
+                    pass
+
+    def close(self):
+        self.stop()
+        self._shm.close()
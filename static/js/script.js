@@ -390,24 +390,36 @@ function updatePowerInfo(power) {
 document.getElementById('generate-report').addEventListener('click', function() {
     const statusElement = document.getElementById('report-status');
     statusElement.textContent = 'Generating report...';
-    
-    fetch('/api/generate_report')
+
+    fetch('/api/generate_report', { method: 'POST' })
         .then(response => response.json())
-        .then(data => {
-            if (data.status === 'success') {
-                statusElement.textContent = 'Report generated successfully!';
-                // Add to report history
-                updateReportHistory(data.filename, data.report.timestamp);
-            } else {
-                statusElement.textContent = 'Error generating report';
-            }
-        })
+        .then(job => pollReportJob(job, statusElement))
         .catch(error => {
             console.error('Error:', error);
             statusElement.textContent = 'Error generating report';
         });
 });
 
+// Reports are built in the background; check the job until it finishes
+function pollReportJob(job, statusElement) {
+    if (job.status === 'done') {
+        statusElement.textContent = 'Report generated successfully!';
+        updateReportHistory(job.filename, job.timestamp);
+    } else if (job.status === 'running') {
+        setTimeout(() => {
+            fetch(`/api/reports/jobs/${job.job_id}`)
+                .then(response => response.json())
+                .then(next => pollReportJob(next, statusElement))
+                .catch(error => {
+                    console.error('Error:', error);
+                    statusElement.textContent = 'Error generating report';
+                });
+        }, 500);
+    } else {
+        statusElement.textContent = 'Error generating report';
+    }
+}
+
 // Update report history
 function updateReportHistory(filename, timestamp) {
     const historyContainer = document.getElementById('report-history');
@@ -423,53 +435,120 @@ function updateReportHistory(filename, timestamp) {
     historyContainer.insertBefore(reportElement, historyContainer.firstChild);
 }
 
+// Latest value of every streamed section, patched in place by deltas
+const streamState = {};
+
+// Dashboard sections pushed by /api/stream
+const SECTION_RENDERERS = {
+    system: updateSystemInfo,
+    cpu: updateCpuInfo,
+    gpu: updateGpuInfo,
+    memory: updateMemoryInfo,
+    disk: updateDiskInfo,
+    network: updateNetworkInfo,
+    power: updatePowerInfo
+};
+
+// Merge one stream message into streamState and re-render what changed
+function applyStreamMessage(message) {
+    const changed = [];
+    
+    Object.entries(message.full).forEach(([name, value]) => {
+        streamState[name] = value;
+        changed.push(name);
+    });
+    
+    Object.entries(message.delta).forEach(([name, patch]) => {
+        if ('replace' in patch) {
+            streamState[name] = patch.replace;
+        } else {
+            const section = streamState[name] || {};
+            Object.assign(section, patch.set);
+            patch.unset.forEach(key => delete section[key]);
+            streamState[name] = section;
+        }
+        changed.push(name);
+    });
+    
+    changed.forEach(name => {
+        const render = SECTION_RENDERERS[name] || (ADVANCED_SECTIONS[name] && ADVANCED_SECTIONS[name].render);
+        if (!render) return;
+        try {
+            render(streamState[name]);
+        } catch (error) {
+            console.error(`Error rendering ${name}:`, error);
+        }
+    });
+}
+
+// Subscribe to the server push stream, falling back to polling
+function connectStream() {
+    if (!window.EventSource) {
+        fetchHardwareInfo();
+        setInterval(fetchHardwareInfo, 3000);
+        return;
+    }
+    
+    const sections = Object.keys(SECTION_RENDERERS);
+    Object.entries(ADVANCED_SECTIONS).forEach(([name, section]) => {
+        if (document.getElementById(section.element)) {
+            sections.push(name);
+        }
+    });
+    
+    const source = new EventSource(`/api/stream?sections=${sections.join(',')}`);
+    source.onmessage = event => applyStreamMessage(JSON.parse(event.data));
+    source.onerror = error => {
+        // EventSource reconnects on its own; the server resends full sections
+        console.error('Stream connection lost, reconnecting:', error);
+    };
+}
+
 // Initialize the application
 function initApp() {
     // Update the time immediately and then every second
     updateTime();
     setInterval(updateTime, 1000);
     
-    // Fetch hardware info immediately and then every 3 seconds
-    fetchHardwareInfo();
-    setInterval(fetchHardwareInfo, 3000);
+    // Receive hardware info as it is sampled instead of polling
+    connectStream();
 }
 
 // Start the application when the page loads
 document.addEventListener('DOMContentLoaded', initApp);
-document.addEventListener('DOMContentLoaded', initApp);
 
 // Advanced Monitoring Functions
-function updateNetworkMonitoring() {
-    fetch('/api/network/packets')
-        .then(response => response.json())
-        .then(data => {
-            const packetStats = document.getElementById('packet-stats');
-            packetStats.innerHTML = `
-                <div class="text-sm">
-                    <div class="flex justify-between">
-                        <span class="text-gray-400">Packets Sent:</span>
-                        <span>${data.packets_sent}</span>
-                    </div>
-                    <div class="flex justify-between">
-                        <span class="text-gray-400">Packets Received:</span>
-                        <span>${data.packets_recv}</span>
-                    </div>
-                    <div class="flex justify-between">
-                        <span class="text-gray-400">Errors In:</span>
-                        <span>${data.errin}</span>
-                    </div>
-                    <div class="flex justify-between">
-                        <span class="text-gray-400">Errors Out:</span>
-                        <span>${data.errout}</span>
-                    </div>
-                </div>
-            `;
-        });
+function renderPacketStats(data) {
+    const packetStats = document.getElementById('packet-stats');
+    if (!packetStats) return;
+    packetStats.innerHTML = `
+        <div class="text-sm">
+            <div class="flex justify-between">
+                <span class="text-gray-400">Packets Sent:</span>
+                <span>${data.packets_sent}</span>
+            </div>
+            <div class="flex justify-between">
+                <span class="text-gray-400">Packets Received:</span>
+                <span>${data.packets_recv}</span>
+            </div>
+            <div class="flex justify-between">
+                <span class="text-gray-400">Errors In:</span>
+                <span>${data.errin}</span>
+            </div>
+            <div class="flex justify-between">
+                <span class="text-gray-400">Errors Out:</span>
+                <span>${data.errout}</span>
+            </div>
+        </div>
+    `;
+}
 
+function updatePortScan() {
     fetch('/api/network/ports')
         .then(response => response.json())
         .then(data => {
             const portScan = document.getElementById('port-scan');
+            if (!portScan) return;
             portScan.innerHTML = `
                 <div class="text-sm">
                     ${data.map(port => `
@@ -483,38 +562,38 @@ function updateNetworkMonitoring() {
         });
 }
 
-function updateProcessManagement() {
-    fetch('/api/process/tree')
-        .then(response => response.json())
-        .then(data => {
-            const processTree = document.getElementById('process-tree');
-            processTree.innerHTML = `
-                <div class="text-sm">
-                    ${data.slice(0, 10).map(proc => `
-                        <div class="flex justify-between mb-1">
-                            <span class="text-gray-400">${proc.name}</span>
-                            <span>CPU: ${proc.cpu_percent.toFixed(1)}% | RAM: ${proc.memory_percent.toFixed(1)}%</span>
-                        </div>
-                    `).join('')}
+function renderProcessTree(data) {
+    const processTree = document.getElementById('process-tree');
+    if (!processTree) return;
+    processTree.innerHTML = `
+        <div class="text-sm">
+            ${data.slice(0, 10).map(proc => `
+                <div class="flex justify-between mb-1">
+                    <span class="text-gray-400">${proc.name}</span>
+                    <span>CPU: ${proc.cpu_percent.toFixed(1)}% | RAM: ${proc.memory_percent.toFixed(1)}%</span>
                 </div>
-            `;
-        });
+            `).join('')}
+        </div>
+    `;
+}
 
+function updateResourceHistory() {
     fetch('/api/system/resource-history')
         .then(response => response.json())
         .then(data => {
             const resourceHistory = document.getElementById('resource-history');
-            if (data.length > 0) {
-                const latest = data[data.length - 1];
+            if (!resourceHistory) return;
+            if (data.count > 0) {
+                const latest = data.count - 1;
                 resourceHistory.innerHTML = `
                     <div class="text-sm">
                         <div class="flex justify-between">
                             <span class="text-gray-400">CPU Usage:</span>
-                            <span>${latest.cpu.toFixed(1)}%</span>
+                            <span>${data.columns.cpu[latest].toFixed(1)}%</span>
                         </div>
                         <div class="flex justify-between">
                             <span class="text-gray-400">Memory Usage:</span>
-                            <span>${latest.memory.toFixed(1)}%</span>
+                            <span>${data.columns.mem[latest].toFixed(1)}%</span>
                         </div>
                     </div>
                 `;
@@ -522,153 +601,147 @@ function updateProcessManagement() {
         });
 }
 
-function updateSystemSecurity() {
-    fetch('/api/security/status')
-        .then(response => response.json())
-        .then(data => {
-            const securityStatus = document.getElementById('security-status');
-            securityStatus.innerHTML = `
-                <div class="text-sm">
-                    <div class="mb-2">
-                        <div class="text-gray-400 mb-1">Windows Defender</div>
-                        <div class="flex justify-between">
-                            <span>Antivirus:</span>
-                            <span class="${data.windows_defender.antivirus_enabled ? 'text-green-400' : 'text-red-400'}">
-                                ${data.windows_defender.antivirus_enabled ? 'Enabled' : 'Disabled'}
-                            </span>
-                        </div>
-                        <div class="flex justify-between">
-                            <span>Real-time Protection:</span>
-                            <span class="${data.windows_defender.real_time_protection ? 'text-green-400' : 'text-red-400'}">
-                                ${data.windows_defender.real_time_protection ? 'Enabled' : 'Disabled'}
-                            </span>
-                        </div>
-                    </div>
+function renderSecurityStatus(data) {
+    const securityStatus = document.getElementById('security-status');
+    if (!securityStatus) return;
+    securityStatus.innerHTML = `
+        <div class="text-sm">
+            <div class="mb-2">
+                <div class="text-gray-400 mb-1">Windows Defender</div>
+                <div class="flex justify-between">
+                    <span>Antivirus:</span>
+                    <span class="${data.windows_defender.antivirus_enabled ? 'text-green-400' : 'text-red-400'}">
+                        ${data.windows_defender.antivirus_enabled ? 'Enabled' : 'Disabled'}
+                    </span>
                 </div>
-            `;
-        });
-}
-
-function updateHardwareHealth() {
-    fetch('/api/hardware/disk-health')
-        .then(response => response.json())
-        .then(data => {
-            const diskHealth = document.getElementById('disk-health');
-            diskHealth.innerHTML = `
-                <div class="text-sm">
-                    ${data.map(disk => `
-                        <div class="mb-2">
-                            <div class="text-gray-400">${disk.model}</div>
-                            <div class="flex justify-between">
-                                <span>Status:</span>
-                                <span class="${disk.health === 'Healthy' ? 'text-green-400' : 'text-yellow-400'}">${disk.health}</span>
-                            </div>
-                        </div>
-                    `).join('')}
+                <div class="flex justify-between">
+                    <span>Real-time Protection:</span>
+                    <span class="${data.windows_defender.real_time_protection ? 'text-green-400' : 'text-red-400'}">
+                        ${data.windows_defender.real_time_protection ? 'Enabled' : 'Disabled'}
+                    </span>
                 </div>
-            `;
-        });
+            </div>
+        </div>
+    `;
+}
 
-    fetch('/api/hardware/fan-speed')
-        .then(response => response.json())
-        .then(data => {
-            const fanSpeed = document.getElementById('fan-speed');
-            fanSpeed.innerHTML = `
-                <div class="text-sm">
-                    ${data.map(fan => `
-                        <div class="mb-2">
-                            <div class="text-gray-400">${fan.name}</div>
-                            <div class="flex justify-between">
-                                <span>Temperature:</span>
-                                <span class="${fan.status === 'Normal' ? 'text-green-400' : 'text-yellow-400'}">${fan.temperature}°C</span>
-                            </div>
-                        </div>
-                    `).join('')}
+function renderDiskHealth(data) {
+    const diskHealth = document.getElementById('disk-health');
+    if (!diskHealth) return;
+    diskHealth.innerHTML = `
+        <div class="text-sm">
+            ${data.map(disk => `
+                <div class="mb-2">
+                    <div class="text-gray-400">${disk.model}</div>
+                    <div class="flex justify-between">
+                        <span>Status:</span>
+                        <span class="${disk.health === 'Healthy' ? 'text-green-400' : 'text-yellow-400'}">${disk.health}</span>
+                    </div>
                 </div>
-            `;
-        });
+            `).join('')}
+        </div>
+    `;
 }
 
-function updatePerformanceProfiling() {
-    fetch('/api/performance/cpu-profile')
-        .then(response => response.json())
-        .then(data => {
-            const cpuProfile = document.getElementById('cpu-profile');
-            cpuProfile.innerHTML = `
-                <div class="text-sm">
-                    <div class="mb-2">
-                        <div class="text-gray-400 mb-1">Core Usage</div>
-                        ${data.usage_per_core.map(core => `
-                            <div class="flex justify-between">
-                                <span>Core ${core.core}:</span>
-                                <span>${core.usage.toFixed(1)}%</span>
-                            </div>
-                        `).join('')}
+function renderFanSpeed(data) {
+    const fanSpeed = document.getElementById('fan-speed');
+    if (!fanSpeed) return;
+    fanSpeed.innerHTML = `
+        <div class="text-sm">
+            ${data.map(fan => `
+                <div class="mb-2">
+                    <div class="text-gray-400">${fan.name}</div>
+                    <div class="flex justify-between">
+                        <span>Temperature:</span>
+                        <span class="${fan.status === 'Normal' ? 'text-green-400' : 'text-yellow-400'}">${fan.temperature}°C</span>
                     </div>
                 </div>
-            `;
-        });
+            `).join('')}
+        </div>
+    `;
+}
 
-    fetch('/api/performance/memory-profile')
-        .then(response => response.json())
-        .then(data => {
-            const memoryProfile = document.getElementById('memory-profile');
-            memoryProfile.innerHTML = `
-                <div class="text-sm">
-                    <div class="mb-2">
-                        <div class="text-gray-400 mb-1">RAM Usage</div>
-                        <div class="flex justify-between">
-                            <span>Used:</span>
-                            <span>${(data.ram.used / 1024 / 1024 / 1024).toFixed(2)} GB</span>
-                        </div>
-                        <div class="flex justify-between">
-                            <span>Free:</span>
-                            <span>${(data.ram.free / 1024 / 1024 / 1024).toFixed(2)} GB</span>
-                        </div>
+function renderCpuProfile(data) {
+    const cpuProfile = document.getElementById('cpu-profile');
+    if (!cpuProfile) return;
+    cpuProfile.innerHTML = `
+        <div class="text-sm">
+            <div class="mb-2">
+                <div class="text-gray-400 mb-1">Core Usage</div>
+                ${data.usage_per_core.map(core => `
+                    <div class="flex justify-between">
+                        <span>Core ${core.core}:</span>
+                        <span>${core.usage.toFixed(1)}%</span>
                     </div>
-                </div>
-            `;
-        });
+                `).join('')}
+            </div>
+        </div>
+    `;
 }
 
-function updateSystemOptimization() {
-    fetch('/api/system/startup')
-        .then(response => response.json())
-        .then(data => {
-            const startupPrograms = document.getElementById('startup-programs');
-            startupPrograms.innerHTML = `
-                <div class="text-sm">
-                    ${data.map(program => `
-                        <div class="flex justify-between mb-1">
-                            <span class="text-gray-400">${program.name}</span>
-                        </div>
-                    `).join('')}
+function renderMemoryProfile(data) {
+    const memoryProfile = document.getElementById('memory-profile');
+    if (!memoryProfile) return;
+    memoryProfile.innerHTML = `
+        <div class="text-sm">
+            <div class="mb-2">
+                <div class="text-gray-400 mb-1">RAM Usage</div>
+                <div class="flex justify-between">
+                    <span>Used:</span>
+                    <span>${(data.ram.used / 1024 / 1024 / 1024).toFixed(2)} GB</span>
                 </div>
-            `;
-        });
+                <div class="flex justify-between">
+                    <span>Free:</span>
+                    <span>${(data.ram.free / 1024 / 1024 / 1024).toFixed(2)} GB</span>
+                </div>
+            </div>
+        </div>
+    `;
+}
 
-    fetch('/api/system/optimization')
-        .then(response => response.json())
-        .then(data => {
-            const optimizationTips = document.getElementById('optimization-tips');
-            optimizationTips.innerHTML = `
-                <div class="text-sm">
-                    ${data.map(tip => `
-                        <div class="text-yellow-400 mb-1">${tip}</div>
-                    `).join('')}
+function renderStartupPrograms(data) {
+    const startupPrograms = document.getElementById('startup-programs');
+    if (!startupPrograms) return;
+    startupPrograms.innerHTML = `
+        <div class="text-sm">
+            ${data.map(program => `
+                <div class="flex justify-between mb-1">
+                    <span class="text-gray-400">${program.name}</span>
                 </div>
-            `;
-        });
+            `).join('')}
+        </div>
+    `;
 }
 
-// Update all advanced monitoring sections
+function renderOptimizationTips(data) {
+    const optimizationTips = document.getElementById('optimization-tips');
+    if (!optimizationTips) return;
+    optimizationTips.innerHTML = `
+        <div class="text-sm">
+            ${data.map(tip => `
+                <div class="text-yellow-400 mb-1">${tip}</div>
+            `).join('')}
+        </div>
+    `;
+}
+
+// Advanced sections are streamed only when their panel is on the page
+const ADVANCED_SECTIONS = {
+    packets: { element: 'packet-stats', render: renderPacketStats },
+    process: { element: 'process-tree', render: renderProcessTree },
+    security: { element: 'security-status', render: renderSecurityStatus },
+    disk_health: { element: 'disk-health', render: renderDiskHealth },
+    fan_speed: { element: 'fan-speed', render: renderFanSpeed },
+    cpu_profile: { element: 'cpu-profile', render: renderCpuProfile },
+    memory_profile: { element: 'memory-profile', render: renderMemoryProfile },
+    startup: { element: 'startup-programs', render: renderStartupPrograms },
+    optimization: { element: 'optimization-tips', render: renderOptimizationTips }
+};
+
+// Advanced data that is not part of the stream is fetched on demand
 function updateAdvancedMonitoring() {
-    updateNetworkMonitoring();
-    updateProcessManagement();
-    updateSystemSecurity();
-    updateHardwareHealth();
-    updatePerformanceProfiling();
-    updateSystemOptimization();
+    updatePortScan();
+    updateResourceHistory();
 }
 
 // Add to the existing update function
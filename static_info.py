@@ -0,0 +1,83 @@
+import platform
+import threading
+from types import MappingProxyType
+
+import psutil
+import cpuinfo
+
+
+class StaticFacts:
+    """
+    Hardware and platform facts that do not change while the process runs.
+    They are collected once (py-cpuinfo alone can take hundreds of
+    milliseconds) and served from memory until explicitly invalidated.
+    GPU identity is not among them: it comes with every GPU reading of the
+    shared sampler (see hardware_info.get_gpu_info).
+    """
+
+    def __init__(self):
+        self._facts = None
+        self._lock = threading.Lock()
+        self._warm_thread = None
+
+    def warm(self, background=True):
+        # Fill the cache ahead of the first request
+        if not background:
+            return self.get()
+        if self._facts is None and (self._warm_thread is None or not self._warm_thread.is_alive()):
+            self._warm_thread = threading.Thread(target=self.get, name='static-facts-warmup')
+            self._warm_thread.daemon = True
+            self._warm_thread.start()
+        return None
+
+    def get(self):
+        facts = self._facts
+        if facts is None:
+            with self._lock:
+                if self._facts is None:
+                    self._facts = self._collect()
+                facts = self._facts
+        return facts
+
+    def invalidate(self, rewarm=True):
+        with self._lock:
+            self._facts = None
+        if rewarm:
+            self.warm()
+
+    def _collect(self):
+        facts = {}
+
+        # CPU identification (a single py-cpuinfo call)
+        try:
+            info = cpuinfo.get_cpu_info()
+        except Exception:
+            info = {}
+        facts["cpu_name"] = info.get('brand_raw') or platform.processor() or "N/A"
+        facts["architecture"] = info.get('arch', platform.machine())
+        facts["bits"] = info.get('bits')
+        facts["l2_cache_size"] = info.get('l2_cache_size')
+        facts["l3_cache_size"] = info.get('l3_cache_size')
+
+        # CPU topology
+        facts["physical_cores"] = psutil.cpu_count(logical=False)
+        facts["logical_cores"] = psutil.cpu_count(logical=True)
+
+        # Platform strings
+        facts["system"] = platform.system()
+        facts["node_name"] = platform.node()
+        facts["release"] = platform.release()
+        facts["version"] = platform.version()
+        facts["machine"] = platform.machine()
+        facts["processor"] = platform.processor()
+        facts["boot_time"] = psutil.boot_time()
+
+        return MappingProxyType(facts)
+
+
+# Shared instance used by the collectors and the Flask app
+static_facts = StaticFacts()
+
+
+def get_static_facts():
+    return static_facts.get()
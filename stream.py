@@ -0,0 +1,180 @@
+import json
+import queue
+import threading
+
+from sampler import resource_sampler
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+# Undelivered messages kept per subscriber before it is resynced
+SUBSCRIBER_QUEUE_SIZE = 8
+
+_MISSING = object()
+
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':'), default=str)
+
+
+def _diff_section(previous, current):
+    # Shallow key-level delta; anything that is not a dict is replaced whole
+    if not isinstance(previous, dict) or not isinstance(current, dict):
+        return None
+    changed = {key: value for key, value in current.items() if previous.get(key, _MISSING) != value}
+    removed = [key for key in previous if key not in current]
+    return {'set': changed, 'unset': removed}
+
+
+class _Subscriber:
+    def __init__(self, sections):
+        self.sections = frozenset(sections)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.needs_full = set(self.sections)
+
+
+class SnapshotStream:
+    """
+    Fans out sampler ticks to Server-Sent Events subscribers.
+
+    Each subscribed section is built and JSON-encoded once per tick,
+    whatever the number of viewers; subscribers then receive only the keys
+    that changed since the previous tick. The work runs on a stream thread
+    so the sampler only hands over the snapshot; if that thread falls
+    behind, it skips to the newest snapshot.
+    """
+
+    def __init__(self, sections, sampler=None, on_activity=None):
+        self.builders = dict(sections)
+        self.sampler = sampler or resource_sampler
+        # Called whenever a subscriber receives something, so an open
+        # stream counts as a watching client
+        self.on_activity = on_activity
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        # Newest snapshot the stream thread has not published yet
+        self._pending = None
+        # Bumped whenever the stream thread is started or stopped; a thread
+        # whose generation is out of date exits
+        self._generation = 0
+        self._listening = False
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, sections=None):
+        if sections:
+            unknown = set(sections) - set(self.builders)
+            if unknown:
+                raise ValueError(f"Unknown stream sections: {', '.join(sorted(unknown))}")
+        else:
+            sections = self.builders.keys()
+        subscriber = _Subscriber(sections)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if not self._listening:
+                self._generation += 1
+                thread = threading.Thread(target=self._run, args=(self._generation,), name='snapshot-stream')
+                thread.daemon = True
+                thread.start()
+                self.sampler.add_listener(self._on_snapshot)
+                self._listening = True
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers and self._listening:
+                # Nobody is watching: stop building sections on every tick
+                self.sampler.remove_listener(self._on_snapshot)
+                self._listening = False
+                self._generation += 1
+                self._pending = None
+                self._wake.notify_all()
+
+    def events(self, subscriber):
+        # Generator producing the text/event-stream body for one client
+        try:
+            yield f"retry: {int(self.sampler.interval * 1000)}\n\n"
+            while True:
+                try:
+                    message = subscriber.queue.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    message = None
+                if self.on_activity is not None:
+                    self.on_activity()
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def _on_snapshot(self, snapshot):
+        # Runs on the sampler thread: only hand the snapshot over
+        with self._lock:
+            self._pending = snapshot
+            self._wake.notify()
+
+    def _run(self, generation):
+        # Values last published per section, to diff the next tick against
+        last_values = {}
+        while True:
+            with self._lock:
+                while self._pending is None and self._generation == generation:
+                    self._wake.wait()
+                if self._generation != generation:
+                    return
+                snapshot, self._pending = self._pending, None
+                subscribers = list(self._subscribers)
+            if subscribers:
+                self._publish(snapshot, subscribers, last_values)
+
+    def _publish(self, snapshot, subscribers, last_values):
+        wanted = set()
+        for subscriber in subscribers:
+            wanted |= subscriber.sections
+
+        # Build and encode every requested section exactly once
+        full = {}
+        delta = {}
+        for name in wanted:
+            try:
+                value = self.builders[name]()
+            except Exception as e:
+                value = {'error': str(e)}
+            previous = last_values.get(name, _MISSING)
+            full[name] = _encode(value)
+            if previous is _MISSING:
+                delta[name] = _encode({'replace': value})
+            elif previous != value:
+                diff = _diff_section(previous, value)
+                delta[name] = _encode(diff if diff is not None else {'replace': value})
+            last_values[name] = value
+
+        for subscriber in subscribers:
+            self._deliver(subscriber, snapshot.seq, full, delta)
+
+    def _deliver(self, subscriber, seq, full, delta):
+        full_parts = []
+        delta_parts = []
+        for name in subscriber.sections:
+            if name in subscriber.needs_full:
+                full_parts.append(f'"{name}":{full[name]}')
+            elif name in delta:
+                delta_parts.append(f'"{name}":{delta[name]}')
+        if not full_parts and not delta_parts:
+            return
+        message = f'{{"seq":{seq},"full":{{{",".join(full_parts)}}},"delta":{{{",".join(delta_parts)}}}}}'
+        try:
+            subscriber.queue.put_nowait(message)
+            subscriber.needs_full.clear()
+        except queue.Full:
+            # Slow client: drop what is queued and send full sections next tick
+            while True:
+                try:
+                    subscriber.queue.get_nowait()
+                except queue.Empty:
+                    break
+            subscriber.needs_full = set(subscriber.sections)
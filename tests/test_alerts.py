@@ -0,0 +1,127 @@
+import math
+import random
+import unittest
+
+from alerts import AlertEngine
+
+
+def zscore_engine(window=300, min_samples=30):
+    return AlertEngine([{
+        'name': 'anomaly', 'type': 'zscore', 'metric': 'net.tx_bytes_per_sec', 'op': '>', 'value': 4,
+        'window': window, 'min_samples': min_samples, 'for': 0, 'clear': 2, 'severity': 'info'
+    }])
+
+
+def threshold_engine():
+    return AlertEngine([{
+        'name': 'cpu_high', 'type': 'threshold', 'metric': 'cpu.percent', 'op': '>', 'value': 90,
+        'for': 60, 'clear': 80, 'clear_for': 30, 'severity': 'warning'
+    }])
+
+
+class ThresholdTest(unittest.TestCase):
+    def feed(self, engine, value, start, end):
+        # One sample per second over [start, end)
+        for timestamp in range(start, end):
+            engine.evaluate(float(timestamp), {'cpu.percent': value})
+
+    def states(self, engine):
+        return [alert['state'] for alert in engine.active()]
+
+    def test_fires_after_for_duration(self):
+        engine = threshold_engine()
+        self.feed(engine, 95, 0, 60)
+        self.assertEqual(self.states(engine), ['pending'])
+        self.feed(engine, 95, 60, 61)
+        self.assertEqual(self.states(engine), ['firing'])
+        self.assertEqual([event['state'] for event in engine.events()], ['firing'])
+
+    def test_dip_restarts_for_duration(self):
+        engine = threshold_engine()
+        self.feed(engine, 95, 0, 50)
+        self.feed(engine, 85, 50, 51)
+        self.assertEqual(self.states(engine), [])
+        self.feed(engine, 95, 51, 110)
+        self.assertEqual(self.states(engine), ['pending'])
+        self.feed(engine, 95, 110, 112)
+        self.assertEqual(self.states(engine), ['firing'])
+
+    def test_hysteresis_between_clear_and_threshold(self):
+        engine = threshold_engine()
+        self.feed(engine, 95, 0, 61)
+        # Below the threshold but above "clear": keeps firing
+        self.feed(engine, 85, 61, 200)
+        self.assertEqual(self.states(engine), ['firing'])
+
+    def test_resolves_after_clear_for(self):
+        engine = threshold_engine()
+        self.feed(engine, 95, 0, 61)
+        self.feed(engine, 70, 100, 130)
+        self.assertEqual(self.states(engine), ['firing'])
+        self.feed(engine, 70, 130, 131)
+        self.assertEqual(self.states(engine), [])
+        self.assertEqual([event['state'] for event in engine.events()], ['resolved', 'firing'])
+
+    def test_rebreach_resets_clear_for(self):
+        engine = threshold_engine()
+        self.feed(engine, 95, 0, 61)
+        self.feed(engine, 70, 100, 120)
+        self.feed(engine, 85, 120, 121)
+        self.feed(engine, 70, 121, 150)
+        self.assertEqual(self.states(engine), ['firing'])
+        self.feed(engine, 70, 150, 152)
+        self.assertEqual(self.states(engine), [])
+
+
+class ZScoreTest(unittest.TestCase):
+    def feed(self, engine, values, start=0.0, step=1.0):
+        timestamp = start
+        for value in values:
+            engine.evaluate(timestamp, {'net.tx_bytes_per_sec': value})
+            timestamp += step
+        return timestamp
+
+    def state(self, engine):
+        return engine._states[('anomaly', 'net.tx_bytes_per_sec')]
+
+    def test_large_constant_never_fires(self):
+        engine = zscore_engine(window=60)
+        # Several window turnovers of a large, perfectly steady rate
+        self.feed(engine, [7.3e9] * 1000)
+        alert = self.state(engine)
+        self.assertEqual(alert.state, 'ok')
+        self.assertIsNone(alert.observed)
+        self.assertEqual(alert.m2, 0.0)
+
+    def test_step_on_large_baseline_fires(self):
+        engine = zscore_engine(window=60)
+        baseline = [5e9 + (1e3 if index % 2 else -1e3) for index in range(600)]
+        timestamp = self.feed(engine, baseline)
+        self.assertEqual(engine.active(), [])
+        # 100x the baseline's standard deviation
+        self.feed(engine, [5e9 + 1e5], start=timestamp)
+        alert = self.state(engine)
+        self.assertEqual(alert.state, 'firing')
+        self.assertAlmostEqual(alert.observed, 100.0, delta=0.05)
+
+    def test_window_statistics_do_not_drift(self):
+        engine = zscore_engine(window=30, min_samples=5)
+        rng = random.Random(7)
+        values = [1e10 + rng.uniform(-5e4, 5e4) for _ in range(5000)]
+        self.feed(engine, values, step=0.7)
+        alert = self.state(engine)
+        window = [value for _, value in alert.samples]
+        mean = math.fsum(window) / len(window)
+        m2 = math.fsum((value - mean) ** 2 for value in window)
+        self.assertAlmostEqual(alert.mean, mean, delta=1e-3)
+        self.assertAlmostEqual(alert.m2 / m2, 1.0, places=6)
+
+    def test_window_is_seconds(self):
+        engine = zscore_engine(window=10)
+        # Ticks 4 s apart: a 10 s window holds 3 samples, not 10
+        self.feed(engine, [1.0, 2.0, 3.0, 4.0, 5.0], step=4.0)
+        self.assertEqual([value for _, value in self.state(engine).samples], [3.0, 4.0, 5.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
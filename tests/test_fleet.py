@@ -0,0 +1,94 @@
+import os
+import socket
+import tempfile
+import time
+import unittest
+
+from fleet import FRAME, FRAME_HELLO, FleetAgent, FleetCollector
+from sampler import ResourceSampler
+
+TOKEN = 'fleet-test-token'
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class FleetTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.snapshot = ResourceSampler().sample_now()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.address = f"unix:{os.path.join(self.directory.name, 'fleet.sock')}"
+        self.collector = FleetCollector(self.address, token=TOKEN, timeout=0.5)
+        self.collector.start()
+        self.agents = []
+
+    def tearDown(self):
+        for agent in self.agents:
+            agent.stop()
+        self.collector.close()
+        self.directory.cleanup()
+
+    def start_agent(self, host_id, token=TOKEN, records=5):
+        agent = FleetAgent(self.address, host_id, batch_size=records, flush_interval=0.1, token=token)
+        self.agents.append(agent)
+        agent.start()
+        started = time.time()
+        for index in range(records):
+            agent.update(self.snapshot._replace(timestamp=started + index))
+        return agent
+
+    def test_two_agents(self):
+        self.start_agent('host-a')
+        self.start_agent('host-b')
+        self.assertTrue(wait_for(lambda: len(self.collector.get_hosts()['hosts']) == 2))
+        hosts = self.collector.get_hosts()
+        self.assertEqual([row['host'] for row in hosts['hosts']], ['host-a', 'host-b'])
+        self.assertEqual(hosts['online'], 2)
+        self.assertTrue(wait_for(lambda: self.collector.get_host_history('host-b')['count'] == 5))
+        self.assertEqual(self.collector.get_throughput()['hosts'], 2)
+
+    def test_wrong_token_is_rejected(self):
+        agent = self.start_agent('intruder', token='wrong')
+        self.start_agent('host-a')
+        self.assertTrue(wait_for(lambda: len(self.collector.get_hosts()['hosts']) == 1))
+        time.sleep(0.3)
+        self.assertEqual([row['host'] for row in self.collector.get_hosts()['hosts']], ['host-a'])
+        self.assertEqual(agent.sent, 0)
+
+    def test_host_limit_and_eviction(self):
+        self.collector.max_hosts = 1
+        self.start_agent('host-a')
+        self.assertTrue(wait_for(lambda: len(self.collector.get_hosts()['hosts']) == 1))
+        with self.assertRaises(ValueError):
+            self.collector.record('host-b', b'')
+        # A host silent for longer than evict_after makes room
+        self.collector.evict_after = 0
+        time.sleep(0.01)
+        self.collector.record('host-b', b'')
+        self.assertEqual(list(self.collector._hosts), ['host-b'])
+
+    def test_partial_frame_times_out(self):
+        family, path = socket.AF_UNIX, self.address[len('unix:'):]
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(path)
+            # Header announcing a HELLO that never arrives
+            sock.sendall(FRAME.pack(FRAME_HELLO, 100))
+            self.assertEqual(sock.recv(1), b'')
+
+    def test_remote_listener_needs_token(self):
+        with self.assertRaises(ValueError):
+            FleetCollector('0.0.0.0:0', token='')
+
+
+if __name__ == '__main__':
+    unittest.main()
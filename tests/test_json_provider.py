@@ -0,0 +1,69 @@
+import json
+import unittest
+from array import array
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import Flask
+
+import json_provider
+from json_provider import StdlibJSONProvider, to_columnar
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+Point = namedtuple('Point', ['x', 'y'])
+
+
+class ColumnarTest(unittest.TestCase):
+    def test_rows_become_columns(self):
+        result = to_columnar({'processes': [{'pid': 1, 'name': 'init'}, {'pid': 2, 'name': 'kthreadd'}], 'total': 2})
+        self.assertEqual(result, {
+            'processes': {'columns': {'pid': [1, 2], 'name': ['init', 'kthreadd']}, 'count': 2},
+            'total': 2
+        })
+
+    def test_missing_fields_are_null(self):
+        result = to_columnar({'rows': [{'a': 1}, {'b': 2}]})
+        self.assertEqual(result['rows']['columns'], {'a': [1, None], 'b': [None, 2]})
+        # Columns keep the order fields were first seen in
+        self.assertEqual(list(result['rows']['columns']), ['a', 'b'])
+
+    def test_other_values_are_kept(self):
+        result = {'empty': [], 'numbers': [1, 2], 'mixed': [{'a': 1}, 2], 'nested': {'rows': [{'a': 1}]}}
+        self.assertEqual(to_columnar(result), result)
+        self.assertEqual(to_columnar([{'a': 1}]), [{'a': 1}])
+
+
+class ProviderTest(unittest.TestCase):
+    def providers(self):
+        providers = [StdlibJSONProvider]
+        if json_provider.orjson is not None:
+            providers.append(json_provider.OrjsonProvider)
+        return providers
+
+    def dumps(self, provider_class, value):
+        return json.loads(provider_class(Flask(__name__)).dumps(value))
+
+    def test_monitor_types(self):
+        value = {'proxy': MappingProxyType({'a': 1}), 'point': Point(1, 2), 'samples': array('d', [0.5, 1.5])}
+        for provider_class in self.providers():
+            with self.subTest(provider=provider_class.__name__):
+                self.assertEqual(self.dumps(provider_class, value), {
+                    'proxy': {'a': 1}, 'point': [1, 2], 'samples': [0.5, 1.5]
+                })
+
+    @unittest.skipIf(np is None, 'numpy is not installed')
+    def test_numpy_values(self):
+        value = {'column': np.arange(3, dtype=np.float64), 'slice': np.arange(6.0)[::2], 'scalar': np.float64(2.5)}
+        for provider_class in self.providers():
+            with self.subTest(provider=provider_class.__name__):
+                self.assertEqual(self.dumps(provider_class, value), {
+                    'column': [0.0, 1.0, 2.0], 'slice': [0.0, 2.0, 4.0], 'scalar': 2.5
+                })
+
+
+if __name__ == '__main__':
+    unittest.main()
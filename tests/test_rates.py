@@ -0,0 +1,64 @@
+import unittest
+from collections import namedtuple
+
+from rates import COUNTER_32_MAX, COUNTER_64_MAX, CounterRates, counter_delta
+
+Counters = namedtuple('Counters', ['bytes_sent', 'bytes_recv'])
+
+
+class CounterDeltaTest(unittest.TestCase):
+    def test_increasing(self):
+        self.assertEqual(counter_delta(100, 250), 150)
+        self.assertEqual(counter_delta(100, 100), 0)
+
+    def test_32_bit_wrap(self):
+        self.assertEqual(counter_delta(COUNTER_32_MAX - 100, 50), 150)
+
+    def test_64_bit_wrap(self):
+        self.assertEqual(counter_delta(COUNTER_64_MAX - 10, 5), 15)
+
+    def test_reset(self):
+        # Far from either limit: the counter restarted from zero
+        self.assertEqual(counter_delta(1_000_000, 10), 10)
+        self.assertEqual(counter_delta(2 ** 40, 3), 3)
+
+
+class CounterRatesTest(unittest.TestCase):
+    def test_first_sample_has_no_rate(self):
+        rates = CounterRates(Counters._fields)
+        self.assertEqual(rates.update(0.0, {'eth0': Counters(100, 200)}), {})
+
+    def test_rate_across_wrap(self):
+        rates = CounterRates(Counters._fields)
+        rates.update(0.0, {'eth0': Counters(COUNTER_32_MAX - 1000, 0)})
+        result = rates.update(2.0, {'eth0': Counters(1000, 400)})
+        self.assertEqual(result['eth0']['per_second'], {'bytes_sent': 1000.0, 'bytes_recv': 200.0})
+
+    def test_rate_after_reset(self):
+        rates = CounterRates(Counters._fields)
+        rates.update(0.0, {'eth0': Counters(5_000_000, 5_000_000)})
+        result = rates.update(1.0, {'eth0': Counters(300, 0)})
+        self.assertEqual(result['eth0']['per_second'], {'bytes_sent': 300.0, 'bytes_recv': 0.0})
+
+    def test_ewma_starts_at_first_rate(self):
+        rates = CounterRates(Counters._fields)
+        rates.update(0.0, {'eth0': Counters(0, 0)})
+        result = rates.update(1.0, {'eth0': Counters(60, 0)})
+        for values in result['eth0']['ewma'].values():
+            self.assertEqual(values['bytes_sent'], 60.0)
+        # A later rate moves the shortest average the most
+        result = rates.update(2.0, {'eth0': Counters(60, 0)})
+        ewma = result['eth0']['ewma']
+        self.assertLess(ewma['1m']['bytes_sent'], ewma['5m']['bytes_sent'])
+        self.assertLess(ewma['5m']['bytes_sent'], ewma['15m']['bytes_sent'])
+
+    def test_vanished_key_starts_over(self):
+        rates = CounterRates(Counters._fields)
+        rates.update(0.0, {'eth0': Counters(0, 0)})
+        rates.update(1.0, {})
+        # eth0 came back: its old reading is gone, so no rate yet
+        self.assertEqual(rates.update(2.0, {'eth0': Counters(500, 0)}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import gzip
+import unittest
+from types import SimpleNamespace
+
+from flask import Flask, jsonify
+
+from response_cache import ResponseCache
+
+
+class FakeSampler:
+    interval = 1.0
+
+    def __init__(self):
+        self.seq = 1
+
+    def get_snapshot(self):
+        return SimpleNamespace(seq=self.seq)
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.sampler = FakeSampler()
+        self.cache = ResponseCache(self.sampler)
+        self.builds = 0
+        app = Flask(__name__)
+        self.cache.init_app(app)
+
+        @app.route('/values')
+        @self.cache.cached()
+        def values():
+            self.builds += 1
+            # Large enough to be compressed
+            return jsonify({'seq': self.sampler.seq, 'values': list(range(1000))})
+
+        @app.route('/missing')
+        @self.cache.cached()
+        def missing():
+            self.builds += 1
+            return jsonify({'error': 'missing'}), 404
+
+        self.client = app.test_client()
+
+    def get(self, path='/values', encoding='identity', etag=None):
+        headers = {'Accept-Encoding': encoding}
+        if etag:
+            headers['If-None-Match'] = etag
+        return self.client.get(path, headers=headers)
+
+    def test_built_once_per_tick(self):
+        first = self.get()
+        second = self.get()
+        self.assertEqual(self.builds, 1)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.sampler.seq = 2
+        self.assertEqual(self.get().get_json()['seq'], 2)
+        self.assertEqual(self.builds, 2)
+
+    def test_not_modified(self):
+        etag = self.get().headers['ETag']
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+
+    def test_changed_body_is_resent(self):
+        etag = self.get().headers['ETag']
+        self.sampler.seq = 2
+        response = self.get(etag=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_etag_per_encoding(self):
+        plain = self.get()
+        compressed = self.get(encoding='gzip')
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.data), plain.data)
+        self.assertNotEqual(compressed.headers['ETag'], plain.headers['ETag'])
+        self.assertIn('Accept-Encoding', compressed.headers['Vary'])
+        # A validator only matches the representation it was issued for
+        self.assertEqual(self.get(encoding='gzip', etag=compressed.headers['ETag']).status_code, 304)
+        self.assertEqual(self.get(etag=compressed.headers['ETag']).status_code, 200)
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.get('/missing').status_code, 404)
+        self.assertEqual(self.get('/missing').status_code, 404)
+        self.assertEqual(self.builds, 2)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import time
+import unittest
+from unittest import mock
+
+import sampler
+from gpu import NullGpuBackend
+from sampler import MAX_BACKOFF, METRIC_GROUPS, ResourceSampler
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class GroupScheduleTest(unittest.TestCase):
+    def setUp(self):
+        self.sampler = ResourceSampler(gpu_backend=NullGpuBackend())
+
+    def fresh(self, ticks):
+        return [self.sampler.sample_now().fresh for _ in range(ticks)]
+
+    def test_groups_follow_their_period(self):
+        fresh = self.fresh(11)
+        self.assertEqual(fresh[0], set(METRIC_GROUPS))
+        # sensors every 5 ticks, cgroup every 2
+        self.assertEqual([index for index, groups in enumerate(fresh) if 'sensors' in groups], [0, 5, 10])
+        self.assertEqual([index for index, groups in enumerate(fresh) if 'cgroup' in groups], [0, 2, 4, 6, 8, 10])
+        self.assertTrue(all('cpu' in groups for groups in fresh))
+
+    def test_boost_collects_every_tick(self):
+        self.fresh(1)
+        self.sampler.boost('partitions')
+        self.assertTrue(all('partitions' in groups for groups in self.fresh(3)))
+        self.assertGreater(self.sampler.get_schedule()['groups']['partitions']['boosted_for'], 0)
+
+    def test_boost_expires(self):
+        self.fresh(1)
+        self.sampler.boost('sensors', duration=0.05)
+        self.assertTrue(all('sensors' in groups for groups in self.fresh(2)))
+        time.sleep(0.1)
+        # Collected once more, then back to every 5 ticks
+        fresh = self.fresh(5)
+        self.assertEqual([index for index, groups in enumerate(fresh) if 'sensors' in groups], [0])
+
+    def test_unknown_group_is_ignored(self):
+        self.sampler.boost('no-such-group')
+        self.assertNotIn('no-such-group', self.sampler.get_schedule()['groups'])
+
+
+class BackoffTest(unittest.TestCase):
+    def start(self):
+        resource_sampler = ResourceSampler(interval=0.01, gpu_backend=NullGpuBackend())
+        resource_sampler.start()
+        self.addCleanup(resource_sampler.stop)
+        return resource_sampler
+
+    @mock.patch.multiple(sampler, IDLE_AFTER=0.5, IDLE_CPU_PERCENT=101.0)
+    def test_backs_off_when_idle(self):
+        resource_sampler = self.start()
+        self.assertTrue(wait_for(lambda: resource_sampler.backoff == MAX_BACKOFF))
+        self.assertEqual(resource_sampler.current_interval, resource_sampler.interval * MAX_BACKOFF)
+
+    @mock.patch.multiple(sampler, IDLE_AFTER=0.5, IDLE_CPU_PERCENT=101.0)
+    def test_touch_restores_base_rate(self):
+        resource_sampler = self.start()
+        self.assertTrue(wait_for(lambda: resource_sampler.backoff == MAX_BACKOFF))
+        resource_sampler.touch()
+        self.assertEqual(resource_sampler.backoff, 1)
+        # Once the client has gone quiet for IDLE_AFTER it backs off again
+        self.assertTrue(wait_for(lambda: resource_sampler.backoff == MAX_BACKOFF))
+
+    @mock.patch.multiple(sampler, IDLE_AFTER=0.5, IDLE_CPU_PERCENT=101.0)
+    def test_boost_restores_base_rate(self):
+        resource_sampler = self.start()
+        self.assertTrue(wait_for(lambda: resource_sampler.backoff == MAX_BACKOFF))
+        resource_sampler.boost('cpu', duration=0.5)
+        self.assertEqual(resource_sampler.backoff, 1)
+        time.sleep(0.2)
+        self.assertEqual(resource_sampler.backoff, 1)
+
+    @mock.patch.multiple(sampler, IDLE_AFTER=0.0, IDLE_CPU_PERCENT=-1.0)
+    def test_busy_host_never_backs_off(self):
+        resource_sampler = self.start()
+        self.assertTrue(wait_for(lambda: resource_sampler.get_snapshot().seq >= 10))
+        self.assertEqual(resource_sampler.backoff, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
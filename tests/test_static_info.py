@@ -0,0 +1,28 @@
+import unittest
+
+from static_info import StaticFacts
+
+
+class StaticFactsTest(unittest.TestCase):
+    def test_collected_once(self):
+        static_facts = StaticFacts()
+        facts = static_facts.get()
+        self.assertGreaterEqual(facts["logical_cores"], 1)
+        self.assertIs(static_facts.get(), facts)
+
+    def test_invalidate_collects_again(self):
+        static_facts = StaticFacts()
+        facts = static_facts.get()
+        static_facts.invalidate(rewarm=False)
+        refreshed = static_facts.get()
+        self.assertIsNot(refreshed, facts)
+        self.assertEqual(dict(refreshed), dict(facts))
+
+    def test_facts_are_read_only(self):
+        facts = StaticFacts().warm(background=False)
+        with self.assertRaises(TypeError):
+            facts["system"] = "changed"
+
+
+if __name__ == '__main__':
+    unittest.main()
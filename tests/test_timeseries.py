@@ -0,0 +1,69 @@
+import unittest
+
+from timeseries import RingBuffer, RollupTier, TieredHistory
+
+
+class RollupTierTest(unittest.TestCase):
+    def rows(self, tier):
+        return tier.buffer.to_lists()
+
+    def test_bucket_closes_on_its_edge(self):
+        tier = RollupTier(10, ('cpu',), 100)
+        tier.add(0.0, {'cpu': 1.0})
+        tier.add(9.999, {'cpu': 3.0})
+        # Still in the first bucket: nothing written yet
+        self.assertEqual(len(tier.buffer), 0)
+        tier.add(10.0, {'cpu': 8.0})
+        self.assertEqual(self.rows(tier), {
+            'timestamp': [0.0], 'cpu_min': [1.0], 'cpu_max': [3.0], 'cpu_avg': [2.0], 'cpu_last': [3.0]
+        })
+
+    def test_bucket_start_is_aligned(self):
+        tier = RollupTier(10, ('cpu',), 100)
+        tier.add(17.5, {'cpu': 4.0})
+        tier.add(19.5, {'cpu': 6.0})
+        tier.flush()
+        rows = self.rows(tier)
+        self.assertEqual(rows['timestamp'], [10.0])
+        self.assertEqual(rows['cpu_avg'], [5.0])
+
+    def test_gap_writes_no_empty_buckets(self):
+        tier = RollupTier(10, ('cpu',), 100)
+        tier.add(5.0, {'cpu': 1.0})
+        tier.add(45.0, {'cpu': 2.0})
+        tier.flush()
+        self.assertEqual(self.rows(tier)['timestamp'], [0.0, 40.0])
+
+    def test_flush_twice_writes_once(self):
+        tier = RollupTier(10, ('cpu',), 100)
+        tier.add(1.0, {'cpu': 1.0})
+        tier.flush()
+        tier.flush()
+        self.assertEqual(len(tier.buffer), 1)
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_range_is_inclusive_across_wrap(self):
+        buffer = RingBuffer(('timestamp', 'value'), capacity=5)
+        for second in range(8):
+            buffer.append((float(second), second * 10.0))
+        # 0-2 were overwritten; both ends of the range are included
+        self.assertEqual(buffer.to_lists(4.0, 6.0)['timestamp'], [4.0, 5.0, 6.0])
+        self.assertEqual(buffer.to_lists()['value'], [30.0, 40.0, 50.0, 60.0, 70.0])
+        self.assertEqual(buffer.first_timestamp(), 3.0)
+
+
+class TieredHistoryTest(unittest.TestCase):
+    def test_query_uses_rollup_past_point_budget(self):
+        history = TieredHistory(('timestamp', 'cpu'), raw_capacity=1000, tiers=((10, 100), (60, 100)))
+        for second in range(600):
+            history.append((float(second), float(second % 10)))
+        self.assertIsNone(history.query(max_points=1000)['stats'])
+        result = history.query(max_points=100)
+        self.assertEqual(result['resolution'], 10)
+        # Every full 10 second bucket averages 0..9
+        self.assertEqual(set(result['columns']['cpu_avg'].tolist()), {4.5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,337 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+# NumPy is optional; plain arrays are used when it is not installed
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Columns recorded for every sampler tick
+HISTORY_COLUMNS = ('timestamp', 'cpu', 'mem', 'disk', 'net_tx', 'net_rx')
+# One day of 1 Hz samples (about 4 MB for the default columns)
+DEFAULT_CAPACITY = 86400
+
+
+class RingBuffer:
+    """
+    Fixed-size columnar time series. Every column is a preallocated float64
+    array written in place, so a sample costs a handful of bytes instead of
+    a dict per point. The first column must be a monotonically increasing
+    timestamp; range queries binary-search it.
+    """
+
+    def __init__(self, columns=HISTORY_COLUMNS, capacity=DEFAULT_CAPACITY):
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self._time_column = self.columns[0]
+        if np is not None:
+            self._data = {name: np.zeros(capacity, dtype=np.float64) for name in self.columns}
+        else:
+            self._data = {name: array('d', bytes(8 * capacity)) for name in self.columns}
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return len(self.columns) * self.capacity * 8
+
+    def append(self, values):
+        # values is a sequence in column order or a mapping of column -> value
+        if isinstance(values, dict):
+            values = [values.get(name, 0.0) for name in self.columns]
+        with self._lock:
+            index = self._head
+            for name, value in zip(self.columns, values):
+                self._data[name][index] = value
+            self._head = (index + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def last(self):
+        with self._lock:
+            if not self._size:
+                return None
+            index = (self._head - 1) % self.capacity
+            return {name: float(self._data[name][index]) for name in self.columns}
+
+    def first_timestamp(self):
+        with self._lock:
+            if not self._size:
+                return None
+            return float(self._data[self._time_column][self._segments()[0][0]])
+
+    def range(self, start=None, end=None, columns=None):
+        """
+        Return {column: array} for samples with start <= timestamp <= end.
+        Arrays are NumPy arrays when available, otherwise array('d').
+        """
+        columns = self.columns if columns is None else tuple(columns)
+        with self._lock:
+            parts = []
+            for lo, hi in self._segments():
+                lo, hi = self._search(lo, hi, start, end)
+                if hi > lo:
+                    parts.append((lo, hi))
+            return {name: self._concat(self._data[name], parts) for name in columns}
+
+    def to_lists(self, start=None, end=None, columns=None):
+        return {name: values.tolist() for name, values in self.range(start, end, columns).items()}
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self._size = 0
+
+    def _segments(self):
+        # Physical index ranges in chronological order
+        if self._size < self.capacity:
+            return [(0, self._size)]
+        return [(self._head, self.capacity), (0, self._head)]
+
+    def _search(self, lo, hi, start, end):
+        times = self._data[self._time_column]
+        if np is not None:
+            segment = times[lo:hi]
+            first = lo + int(np.searchsorted(segment, start, 'left')) if start is not None else lo
+            last = lo + int(np.searchsorted(segment, end, 'right')) if end is not None else hi
+            return first, last
+        first = bisect_left(times, start, lo, hi) if start is not None else lo
+        last = bisect_right(times, end, lo, hi) if end is not None else hi
+        return first, last
+
+    @staticmethod
+    def _concat(column, parts):
+        if np is not None:
+            if not parts:
+                return np.empty(0, dtype=np.float64)
+            if len(parts) == 1:
+                lo, hi = parts[0]
+                return column[lo:hi].copy()
+            return np.concatenate([column[lo:hi] for lo, hi in parts])
+        result = array('d')
+        for lo, hi in parts:
+            result.extend(column[lo:hi])
+        return result
+
+
+# Statistics kept for every metric in a rollup bucket
+ROLLUP_STATS = ('min', 'max', 'avg', 'last')
+# (bucket seconds, buckets kept): 10 s for 2 days, 1 min for 14 days,
+# 10 min for 180 days
+DEFAULT_TIERS = ((10, 17280), (60, 20160), (600, 25920))
+
+
+class RollupTier:
+    """
+    Downsampled copy of a series. Samples are folded into the current bucket
+    as they arrive and the bucket is written out once a sample for the next
+    bucket shows up, so the cost per sample is constant.
+    """
+
+    def __init__(self, resolution, metrics, capacity):
+        self.resolution = resolution
+        self.metrics = tuple(metrics)
+        columns = ('timestamp',) + tuple(f'{metric}_{stat}' for metric in self.metrics for stat in ROLLUP_STATS)
+        self.buffer = RingBuffer(columns, capacity)
+        self._bucket_start = None
+        self._count = 0
+        self._min = {}
+        self._max = {}
+        self._sum = {}
+        self._last = {}
+
+    def add(self, timestamp, values):
+        bucket_start = timestamp - timestamp % self.resolution
+        if self._bucket_start is not None and bucket_start != self._bucket_start:
+            self.flush()
+        if self._count == 0:
+            self._bucket_start = bucket_start
+            self._min = dict(values)
+            self._max = dict(values)
+            self._sum = dict(values)
+        else:
+            for metric, value in values.items():
+                if value < self._min[metric]:
+                    self._min[metric] = value
+                if value > self._max[metric]:
+                    self._max[metric] = value
+                self._sum[metric] += value
+        self._last = values
+        self._count += 1
+
+    def flush(self):
+        if not self._count:
+            return
+        row = [self._bucket_start]
+        for metric in self.metrics:
+            row.extend((
+                self._min[metric],
+                self._max[metric],
+                self._sum[metric] / self._count,
+                self._last[metric]
+            ))
+        self.buffer.append(row)
+        self._count = 0
+
+
+class TieredHistory:
+    """
+    Raw samples plus rollup tiers. Queries with a max_points budget are
+    answered from the finest tier that fits, so a 24 h chart costs about
+    the same as a 5 minute one.
+    """
+
+    def __init__(self, columns=HISTORY_COLUMNS, raw_capacity=DEFAULT_CAPACITY,
+                 raw_resolution=1.0, tiers=DEFAULT_TIERS):
+        self.columns = tuple(columns)
+        self.metrics = self.columns[1:]
+        self.raw = RingBuffer(self.columns, raw_capacity)
+        self.raw_resolution = raw_resolution
+        self.tiers = [RollupTier(resolution, self.metrics, capacity) for resolution, capacity in tiers]
+
+    def __len__(self):
+        return len(self.raw)
+
+    def append(self, values):
+        if isinstance(values, dict):
+            values = [values.get(name, 0.0) for name in self.columns]
+        self.raw.append(values)
+        timestamp = values[0]
+        metrics = dict(zip(self.metrics, values[1:]))
+        for tier in self.tiers:
+            tier.add(timestamp, metrics)
+
+    def last(self):
+        return self.raw.last()
+
+    def range(self, start=None, end=None, columns=None):
+        return self.raw.range(start, end, columns)
+
+    def to_lists(self, start=None, end=None, columns=None):
+        return self.raw.to_lists(start, end, columns)
+
+    def oldest_timestamp(self):
+        # Oldest sample still held in memory by any source
+        oldest = [buffer.first_timestamp() for buffer in [self.raw] + [tier.buffer for tier in self.tiers]]
+        oldest = [timestamp for timestamp in oldest if timestamp is not None]
+        return min(oldest) if oldest else None
+
+    def select_source(self, start=None, end=None, max_points=None):
+        # Finest source that covers the window within the point budget
+        sources = [(self.raw_resolution, self.raw)] + [(tier.resolution, tier.buffer) for tier in self.tiers]
+        if not max_points:
+            return sources[0]
+        last = self.raw.last()
+        end = end if end is not None else (last['timestamp'] if last else 0.0)
+        for resolution, buffer in sources:
+            oldest = buffer.first_timestamp()
+            if oldest is None:
+                continue
+            window_start = start if start is not None else oldest
+            covers = start is None or oldest <= start + resolution
+            if covers and (end - window_start) / resolution <= max_points:
+                return resolution, buffer
+        # Nothing fits the budget: use the coarsest tier that has data
+        for resolution, buffer in reversed(sources):
+            if len(buffer):
+                return resolution, buffer
+        return sources[0]
+
+    def query(self, start=None, end=None, max_points=None):
+        resolution, buffer = self.select_source(start, end, max_points)
+        # Arrays are handed to the JSON provider as-is, no per-value list copy
+        columns = buffer.range(start, end)
+        if max_points and len(columns['timestamp']) > max_points:
+            # Keep the most recent points when the coarsest tier still overflows
+            columns = {name: values[-max_points:] for name, values in columns.items()}
+        return {
+            'resolution': resolution,
+            'stats': None if buffer is self.raw else list(ROLLUP_STATS),
+            'columns': columns
+        }
+
+
+# Statistics reported by summarize()
+SUMMARY_STATS = ('min', 'avg', 'max', 'p95', 'p99')
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_duration(text):
+    # "90", "90s", "30m", "1h", "7d" or "1w" -> seconds
+    text = str(text).strip().lower()
+    unit = DURATION_UNITS.get(text[-1:]) if text else None
+    number = text[:-1] if unit else text
+    try:
+        seconds = float(number) * (unit or 1)
+    except ValueError:
+        raise ValueError(f"Invalid duration: {text}")
+    if seconds <= 0:
+        raise ValueError(f"Invalid duration: {text}")
+    return seconds
+
+
+def summarize(data, metrics):
+    """
+    min/avg/max/p95/p99 of every metric column in data ({column: array}).
+    With NumPy the metrics are stacked into one matrix and each statistic
+    is a single reduction over it.
+    """
+    count = len(data[metrics[0]]) if metrics else 0
+    if not count:
+        return {name: {stat: None for stat in SUMMARY_STATS} for name in metrics}
+
+    if np is not None:
+        matrix = np.column_stack([np.asarray(data[name], dtype=np.float64) for name in metrics])
+        p95, p99 = np.percentile(matrix, [95, 99], axis=0)
+        stats = {
+            'min': matrix.min(axis=0),
+            'avg': matrix.mean(axis=0),
+            'max': matrix.max(axis=0),
+            'p95': p95,
+            'p99': p99
+        }
+        return {
+            name: {stat: float(values[index]) for stat, values in stats.items()}
+            for index, name in enumerate(metrics)
+        }
+
+    summary = {}
+    for name in metrics:
+        ordered = sorted(data[name])
+        summary[name] = {
+            'min': ordered[0],
+            'avg': sum(ordered) / count,
+            'max': ordered[-1],
+            'p95': _interpolated_percentile(ordered, 95),
+            'p99': _interpolated_percentile(ordered, 99)
+        }
+    return summary
+
+
+def covered_seconds(timestamps, max_gap):
+    """
+    Seconds between consecutive samples, leaving out gaps longer than
+    max_gap (the sampler was stopped or stalled). The tick period varies
+    with the sampler's backoff, so coverage cannot be derived from the
+    sample count.
+    """
+    if len(timestamps) < 2:
+        return 0.0
+    if np is not None:
+        gaps = np.diff(np.asarray(timestamps, dtype=np.float64))
+        return float(gaps[gaps <= max_gap].sum())
+    return sum(gap for gap in (b - a for a, b in zip(timestamps, timestamps[1:])) if gap <= max_gap)
+
+
+def _interpolated_percentile(ordered, pct):
+    # Linear interpolation between ranks, as numpy.percentile does by default
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)